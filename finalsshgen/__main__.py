@@ -0,0 +1,10 @@
+import os
+import sys
+
+# `python -m finalsshgen` z katalogu nadrzędnego: moduły aplikacji
+# importują się nawzajem po nazwie, więc ich katalog musi być na ścieżce
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main
+
+sys.exit(main())
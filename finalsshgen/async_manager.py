@@ -0,0 +1,242 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from core import KeyManager, KeyManagerError, remove_key_files
+from keygen import key_name_for, resolve_engine, generate_ed25519_inprocess
+from ssh_sync import apply_sync
+
+
+# Wersja KeyManager dla kodu na asyncio (narzędzia orkiestracji):
+#
+#   async with AsyncKeyManager(base_dir, concurrency=8) as manager:
+#       record = await manager.generate('jan@firma.pl', 'github.com', 'jan')
+#       records, errors = await manager.provision(rows)
+#
+# ssh-keygen działa przez asyncio.create_subprocess_exec, a blokująca praca
+# na plikach (metadane, fragmenty configu, usuwanie, kopiowanie do ~/.ssh)
+# idzie do własnej puli wątków menedżera. Wywołujący widzi tylko korutyny;
+# callbacki (progress) są wołane w pętli zdarzeń.
+#
+# Stan KeyManager nie jest bezpieczny wątkowo, więc operacje na nim
+# wykonuje pula pojedynczo (blokada asyncio), a semafor ogranicza, ile
+# generowań i operacji na plikach kluczy trwa naraz. Wątku puli nie da się
+# przerwać: anulowana korutyna trzyma blokadę, aż operacja w puli się
+# skończy, a close() czeka na wszystkie rozpoczęte operacje.
+#
+# tracing.span trzyma stos spanów w wątku, dlatego spany są tylko w kodzie
+# uruchamianym w puli - nie obejmują await.
+
+# Czeka na koniec future mimo kolejnych anulowań; jej wynik albo błąd
+# jest porzucany (wołający i tak kończy się CancelledError)
+async def _finish(future):
+    while not future.done():
+        try:
+            await asyncio.wait((future,))
+        except asyncio.CancelledError:
+            continue
+    if not future.cancelled():
+        future.exception()
+
+
+class AsyncKeyManager:
+    def __init__(self, base_dir=None, storage=None, concurrency=4, manager=None):
+        self.concurrency = max(1, concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency + 1, thread_name_prefix='sshgen-async')
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._lock = asyncio.Lock()
+        # Gotowy menedżer (np. współdzielony z daemon.py) albo nowy;
+        # KeyManager() czyta pliki, ale tylko raz przy starcie - patrz open()
+        self.manager = manager if manager is not None else KeyManager(base_dir, storage)
+
+    # Konstruktor bez blokowania pętli
+    @classmethod
+    async def open(cls, base_dir=None, storage=None, concurrency=4):
+        loop = asyncio.get_running_loop()
+        manager = await loop.run_in_executor(None, KeyManager, base_dir, storage)
+        return cls(concurrency=concurrency, manager=manager)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # Zapisuje eksport keys.json (dziennik/SQLite) i zamyka pulę, czekając
+    # na operacje, które już w niej trwają (w domyślnej puli, bez
+    # blokowania pętli)
+    async def close(self):
+        await self._locked(self.manager.export_json_if_changed)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._executor.shutdown, wait=True))
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    # Operacja na stanie menedżera - jedna naraz. Anulowanie nie zwalnia
+    # blokady, dopóki operacja w puli trwa (shield), bo następna weszłaby
+    # na stan menedżera równolegle z nią.
+    async def _locked(self, fn, *args, **kwargs):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                await _finish(future)
+                raise
+
+    # --- generowanie ---
+
+    async def run_ssh_keygen(self, email, key_path):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ssh-keygen", "-t", "ed25519", "-C", email, "-f", key_path, "-N", "",
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            raise RuntimeError("Nie znaleziono programu ssh-keygen.")
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            # Przerwane generowanie nie zostawia procesu ani połowy pary kluczy
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            await self._run(remove_key_files, [{'key_path': key_path}])
+            raise
+        if process.returncode != 0:
+            details = stderr.decode(errors='replace').strip()
+            raise RuntimeError(f"Nie udało się wygenerować klucza SSH. {details}".strip())
+        return key_path
+
+    # Jak keygen.generate_key; generowanie w procesie liczy w puli
+    async def generate_key(self, email, key_path, engine=None):
+        async with self._semaphore:
+            if resolve_engine(engine) == 'inprocess':
+                return await self.generate_inprocess(email, key_path)
+            return await self.run_ssh_keygen(email, key_path)
+
+    # Jak run_ssh_keygen: anulowanie czeka, aż pula skończy zapis pary
+    # kluczy, i dopiero wtedy ją usuwa
+    async def generate_inprocess(self, email, key_path):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, generate_ed25519_inprocess, email, key_path)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await _finish(future)
+            await self._run(remove_key_files, [{'key_path': key_path}])
+            raise
+
+    def _reserve(self, email, host, alias):
+        key_path = self.manager.prepare_key(email, host, alias)
+        self.manager.pending_aliases.add(alias)
+        return key_path
+
+    async def generate(self, email, host, alias, engine=None):
+        key_path = await self._locked(self._reserve, email, host, alias)
+        try:
+            await self.generate_key(email, key_path, engine)
+        except RuntimeError as e:
+            raise KeyManagerError(str(e))
+        finally:
+            self.manager.pending_aliases.discard(alias)
+        return await self._locked(self.manager.register_key, email, host, alias)
+
+    # Jak KeyManager.provision: walidacja, generowanie (najwyżej concurrency
+    # naraz), jeden zapis metadanych. progress(zrobione, wszystkie).
+    async def provision(self, rows, progress=None, engine=None):
+        valid, errors = await self._locked(self.manager.validate_manifest, rows)
+        keys_dir = self.manager.keys_dir
+        created = []
+        done = 0
+        total = len(valid)
+
+        async def one(row):
+            nonlocal done
+            key_path = os.path.join(keys_dir, key_name_for(row['alias']))
+            try:
+                await self.generate_key(row['email'], key_path, engine)
+            except Exception as e:
+                errors.append((row['row'], row['alias'], str(e)))
+            else:
+                created.append(row)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+
+        self.manager.pending_aliases.update(row['alias'] for row in valid)
+        try:
+            await asyncio.gather(*(one(row) for row in valid))
+        finally:
+            self.manager.pending_aliases.difference_update(row['alias'] for row in valid)
+        created.sort(key=lambda row: row['row'])
+        records = await self._locked(self.manager.commit_manifest_keys, created)
+        return records, sorted(errors)
+
+    # --- usuwanie ---
+
+    # Metadane i config pod blokadą, pliki kluczy potem, poza nią
+    async def delete_aliases(self, aliases, remove_files=True):
+        deleted, missing = await self._locked(self.manager.delete_aliases, aliases, remove_files=False)
+        if remove_files and deleted:
+            async with self._semaphore:
+                await self._run(remove_key_files, deleted)
+        return deleted, missing
+
+    async def delete_alias(self, alias):
+        if not alias:
+            raise KeyManagerError("Nie podano aliasu do usunięcia.")
+        deleted, missing = await self.delete_aliases([alias])
+        if missing:
+            raise KeyManagerError(f"Nie znaleziono aliasu {alias}.")
+        return deleted[0]
+
+    # Zwraca ścieżkę w koszu - do undo_delete_all albo purge_trash
+    async def delete_all(self):
+        return await self._locked(self.manager.delete_all)
+
+    async def undo_delete_all(self, trash_path):
+        return await self._locked(self.manager.undo_delete_all, trash_path)
+
+    async def purge_trash(self, trash_path=None):
+        async with self._semaphore:
+            return await self._run(self.manager.purge_trash, trash_path)
+
+    # --- odczyt ---
+
+    async def list_keys(self):
+        return await self._locked(self.manager.list_keys)
+
+    async def get(self, alias):
+        return await self._locked(self.manager.get, alias)
+
+    async def find_by_fingerprint(self, fingerprint):
+        return await self._locked(self.manager.find_by_fingerprint, fingerprint)
+
+    async def config_text(self):
+        return await self._locked(self.manager.config_text)
+
+    async def check_keys(self):
+        return await self._locked(self.manager.check_keys)
+
+    async def fsck(self):
+        return await self._locked(self.manager.fsck)
+
+    async def repair(self, report):
+        return await self._locked(self.manager.repair, report)
+
+    # --- ~/.ssh ---
+
+    # Plan pod blokadą; kopiowanie do ~/.ssh nie dotyka stanu menedżera
+    async def sync(self, aliases=None, dest_dir=None, dry_run=False):
+        plan = await self._locked(self.manager.plan_sync, aliases, dest_dir)
+        if not dry_run and not plan.empty():
+            async with self._semaphore:
+                await self._run(apply_sync, plan)
+        return plan
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import openssh_keys
+from keygen import run_ssh_keygen, generate_ed25519_inprocess
+
+
+# Porównanie szybkości generowania kluczy: ssh-keygen w podprocesie
+# kontra generowanie w procesie (cryptography i czysty Python).
+#
+#   python bench_keygen.py -n 200 -j 4
+
+def bench(name, generate, count, jobs):
+    work_dir = tempfile.mkdtemp(prefix='bench-keygen-')
+    try:
+        paths = [os.path.join(work_dir, f"id_ed25519_bench{i}") for i in range(count)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(lambda path: generate("bench@example.com", path), paths))
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir)
+    print(f"{name:<28} {count:>6} kluczy  {elapsed:8.3f} s  {count / elapsed:10.1f} kluczy/s")
+    return count / elapsed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark generowania kluczy Ed25519")
+    parser.add_argument('-n', '--count', type=int, default=100, help="liczba kluczy na silnik")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="liczba wątków")
+    args = parser.parse_args(argv)
+
+    results = {}
+    if shutil.which('ssh-keygen'):
+        results['subprocess'] = bench("ssh-keygen (podproces)", run_ssh_keygen, args.count, args.jobs)
+    else:
+        print("ssh-keygen niedostępny, pomijam")
+
+    if openssh_keys._cryptography_backend() is not None:
+        results['cryptography'] = bench("w procesie (cryptography)", generate_ed25519_inprocess, args.count, args.jobs)
+    else:
+        print("pakiet cryptography niedostępny, pomijam")
+
+    backend = openssh_keys.Ed25519PrivateKey
+    openssh_keys.Ed25519PrivateKey = None
+    try:
+        results['pure-python'] = bench("w procesie (czysty Python)", generate_ed25519_inprocess, args.count, args.jobs)
+    finally:
+        openssh_keys.Ed25519PrivateKey = backend
+
+    if 'subprocess' in results:
+        for name, rate in results.items():
+            if name != 'subprocess':
+                print(f"{name}: {rate / results['subprocess']:.1f}x względem ssh-keygen")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+# Model tabeli potrzebuje Qt - bez ekranu, jak w CI
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtWidgets import QApplication
+
+from core import KeyManager
+from key_store import open_store, STORAGE_MODES
+from keygen import key_name_for, config_entry_for, key_metadata_for, write_config_entries, remove_config_entries
+from config_fragments import fragment_name, fragment_text
+from key_model import KeyTableModel
+from search_index import SearchIndex
+
+
+# Benchmark operacji menedżera kluczy przy rosnącej liczbie kluczy.
+# Dla każdego rozmiaru budowany jest syntetyczny katalog aplikacji
+# (keys.json, keys/, fragmenty configu), a ssh-keygen zastępuje skrypt-atrapa
+# na PATH, więc mierzymy naszą logikę, a nie kryptografię.
+#
+#   python bench_manager.py --sizes 10,1000,100000 -r 20 -o wyniki.json
+#   python bench_manager.py --compare stare.json nowe.json
+#
+# Dla każdej operacji: percentyle czasu, szczyt alokacji (tracemalloc,
+# osobny przebieg, żeby nie psuć czasów) i pliki utworzone/zmienione/usunięte
+# w katalogu aplikacji i docelowym ~/.ssh.
+
+OPERATIONS = ('generate', 'delete_alias', 'update_table', 'config_add', 'config_remove', 'sync_full', 'sync_noop')
+
+STUB_SSH_KEYGEN = """#!/bin/sh
+# Atrapa ssh-keygen dla benchmarku: zapisuje pliki w formacie-zaślepce
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -f) key_path="$2"; shift ;;
+        -C) comment="$2"; shift ;;
+    esac
+    shift
+done
+umask 077
+printf 'stub private key\\n' > "$key_path"
+printf 'ssh-ed25519 AAAAstub %s\\n' "$comment" > "$key_path.pub"
+chmod 644 "$key_path.pub"
+"""
+
+
+def install_stub_ssh_keygen(work_dir):
+    bin_dir = os.path.join(work_dir, 'bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    stub_path = os.path.join(bin_dir, 'ssh-keygen')
+    with open(stub_path, 'w') as f:
+        f.write(STUB_SSH_KEYGEN)
+    os.chmod(stub_path, 0o755)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    os.environ['SSHGEN_KEYGEN'] = 'subprocess'
+
+
+# Katalog aplikacji z count kluczami, tak jak zostawiłby go main.py
+def build_inventory(base_dir, count):
+    keys_dir = os.path.join(base_dir, 'keys')
+    config_dir = os.path.join(keys_dir, 'config.d')
+    os.makedirs(config_dir)
+    records = []
+    for i in range(count):
+        alias = f"inv{i}"
+        host = f"host{i % 50}.example.com"
+        key_name = key_name_for(alias)
+        key_path = os.path.join(keys_dir, key_name)
+        with open(key_path, 'w') as f:
+            f.write("stub private key\n")
+        os.chmod(key_path, 0o600)
+        with open(f"{key_path}.pub", 'w') as f:
+            f.write(f"ssh-ed25519 AAAAstub {alias}@example.com\n")
+        records.append(key_metadata_for(f"{alias}@example.com", host, alias, key_name, key_path))
+        pattern, options = config_entry_for(host, alias, key_name)
+        with open(os.path.join(config_dir, fragment_name(pattern)), 'w') as f:
+            f.write(fragment_text(pattern, options))
+    with open(os.path.join(base_dir, 'keys.json'), 'w') as f:
+        json.dump(records, f, indent=4)
+
+
+# Stan plików: ścieżka -> (i-węzeł, mtime, rozmiar)
+def snapshot(*roots):
+    state = {}
+    pending = [root for root in roots if os.path.isdir(root)]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                else:
+                    st = entry.stat(follow_symlinks=False)
+                    state[entry.path] = (st.st_ino, st.st_mtime_ns, st.st_size)
+    return state
+
+
+def files_touched(before, after):
+    created = sum(1 for path in after if path not in before)
+    deleted = sum(1 for path in before if path not in after)
+    modified = sum(1 for path, sig in after.items() if path in before and before[path] != sig)
+    return {'created': created, 'modified': modified, 'deleted': deleted}
+
+
+def percentile(sorted_samples, p):
+    rank = max(1, math.ceil(p / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'samples': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 3),
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p90_ms': round(percentile(ordered, 90), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+class Bench:
+    def __init__(self, base_dir, storage, repeat):
+        self.base_dir = base_dir
+        self.ssh_dir = os.path.join(base_dir, 'home', '.ssh')
+        self.repeat = repeat
+        self.storage = storage
+        self.manager = KeyManager(base_dir, storage)
+        self.search_index = SearchIndex(self.manager.store)
+        self.table_model = KeyTableModel(self.manager.store, self.search_index)
+        # Drugi proces piszący do tego samego magazynu (dla update_table)
+        self.outside_store = None
+        self.generated = []
+        self.config_added = []
+        self.counter = 0
+
+    def next_alias(self, prefix):
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    # --- operacje; prepare() działa poza pomiarem czasu ---
+
+    def op_generate(self):
+        alias = self.next_alias('bench')
+        self.generated.append(alias)
+        return lambda: self.manager.generate(f"{alias}@example.com", 'bench.example.com', alias)
+
+    def op_delete_alias(self):
+        alias = self.generated.pop()
+        return lambda: self.manager.delete_alias(alias)
+
+    # Jak update_table() w main.py: zmiana magazynu z zewnątrz, potem
+    # wykrycie jej i odświeżenie modelu tabeli
+    def op_update_table(self):
+        if self.outside_store is None:
+            self.outside_store = open_store(self.base_dir, self.storage)
+        alias = self.next_alias('outside')
+        self.outside_store.add(key_metadata_for(f"{alias}@example.com", 'outside.example.com', alias,
+                                                key_name_for(alias), os.path.join(self.manager.keys_dir, key_name_for(alias))))
+        self.outside_store.flush()
+
+        def run():
+            self.manager.store.reload_if_changed()
+            self.table_model.rowCount()
+        return run
+
+    def op_config_add(self):
+        alias = self.next_alias('cfg')
+        self.config_added.append(alias)
+        entry = config_entry_for('edit.example.com', alias, key_name_for(alias))
+        return lambda: write_config_entries(self.manager.fragments, [entry])
+
+    def op_config_remove(self):
+        pattern = config_entry_for('edit.example.com', self.config_added.pop(), '')[0]
+        return lambda: remove_config_entries(self.manager.fragments, [pattern])
+
+    # Pierwsza synchronizacja kopiuje wszystko; kolejne powinny nic nie robić
+    def op_sync_full(self):
+        shutil.rmtree(self.ssh_dir, ignore_errors=True)
+        return lambda: self.manager.sync(dest_dir=self.ssh_dir)
+
+    def op_sync_noop(self):
+        return lambda: self.manager.sync(dest_dir=self.ssh_dir)
+
+    def run(self, name):
+        prepare = getattr(self, f"op_{name}")
+        repeat = 1 if name == 'sync_full' else self.repeat
+        before = snapshot(self.base_dir)
+        samples = []
+        for _ in range(repeat):
+            action = prepare()
+            start = time.perf_counter()
+            action()
+            samples.append((time.perf_counter() - start) * 1000)
+        after = snapshot(self.base_dir)
+        result = summarize(samples)
+        result['files'] = files_touched(before, after)
+        result['files_per_call'] = round(sum(result['files'].values()) / repeat, 2)
+
+        # Szczyt pamięci w osobnym wywołaniu - tracemalloc spowalnia wszystko
+        if name in ('generate', 'config_add', 'sync_noop', 'update_table'):
+            action = prepare()
+            tracemalloc.start()
+            action()
+            result['peak_alloc_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+        return result
+
+
+# Kolejność ma znaczenie: delete_alias usuwa klucze z generate,
+# config_remove bloki z config_add, sync_noop potrzebuje sync_full
+def run_size(count, operations, storage, repeat, keep):
+    work_dir = tempfile.mkdtemp(prefix=f'bench-manager-{count}-')
+    try:
+        install_stub_ssh_keygen(work_dir)
+        base_dir = os.path.join(work_dir, 'app')
+        os.makedirs(base_dir)
+
+        start = time.perf_counter()
+        build_inventory(base_dir, count)
+        print(f"[{count} kluczy] przygotowanie danych: {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+        start = time.perf_counter()
+        bench = Bench(base_dir, storage, repeat)
+        results = {'open_ms': round((time.perf_counter() - start) * 1000, 3)}
+        for name in OPERATIONS:
+            if name not in operations:
+                continue
+            if name == 'delete_alias' and len(bench.generated) < repeat:
+                for _ in range(repeat - len(bench.generated)):
+                    bench.op_generate()()
+            if name == 'config_remove' and len(bench.config_added) < repeat:
+                for _ in range(repeat - len(bench.config_added)):
+                    bench.op_config_add()()
+            if name == 'sync_noop' and not os.path.isdir(bench.ssh_dir):
+                bench.op_sync_full()()
+            results[name] = bench.run(name)
+            print_result(count, name, results[name])
+        return results
+    finally:
+        if keep:
+            print(f"[{count} kluczy] dane zostawione w {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_result(count, name, result):
+    files = result['files']
+    memory = f"  {result['peak_alloc_kb']:>9.1f} KiB" if 'peak_alloc_kb' in result else ''
+    print(f"{count:>7} {name:<14} p50 {result['p50_ms']:9.2f} ms  p90 {result['p90_ms']:9.2f} ms  "
+          f"p99 {result['p99_ms']:9.2f} ms  pliki +{files['created']} ~{files['modified']} -{files['deleted']}{memory}",
+          file=sys.stderr)
+
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux podaje KiB, macOS bajty
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+# Porównanie dwóch plików wyników: stosunek p50 nowy/stary
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    for size, operations in new['results'].items():
+        for name, result in operations.items():
+            previous = old['results'].get(size, {}).get(name)
+            if not isinstance(result, dict) or not isinstance(previous, dict):
+                continue
+            ratio = result['p50_ms'] / previous['p50_ms'] if previous['p50_ms'] else float('inf')
+            print(f"{size:>7} {name:<14} p50 {previous['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms  x{ratio:.2f}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark operacji menedżera kluczy")
+    parser.add_argument('--sizes', default='10,1000,100000', help="liczby kluczy, po przecinku")
+    parser.add_argument('-r', '--repeat', type=int, default=20, help="powtórzenia każdej operacji")
+    parser.add_argument('--ops', default=','.join(OPERATIONS), help=f"operacje (dostępne: {', '.join(OPERATIONS)})")
+    parser.add_argument('--storage', choices=STORAGE_MODES, default='json', help="tryb magazynu metadanych")
+    parser.add_argument('-o', '--output', help="plik JSON z wynikami (domyślnie bench-<data>.json)")
+    parser.add_argument('--keep', action='store_true', help="nie usuwaj danych testowych")
+    parser.add_argument('--compare', nargs=2, metavar=('STARY', 'NOWY'), help="porównaj dwa pliki wyników")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    operations = args.ops.split(',')
+    unknown = [name for name in operations if name not in OPERATIONS]
+    if unknown:
+        parser.error(f"nieznane operacje: {', '.join(unknown)}")
+
+    app = QApplication.instance() or QApplication([])
+    started = datetime.now()
+    report = {
+        'started': started.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'storage': args.storage,
+        'repeat': args.repeat,
+        'results': {},
+    }
+    for count in (int(size) for size in args.sizes.split(',')):
+        report['results'][str(count)] = run_size(count, operations, args.storage, args.repeat, args.keep)
+    report['peak_rss_kb'] = peak_rss_kb()
+
+    output = args.output or f"bench-{started.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wyniki zapisano w {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
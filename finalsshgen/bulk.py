@@ -0,0 +1,127 @@
+import os
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from keygen import key_name_for, config_entry_for, key_metadata_for, write_config_entries, generate_key
+
+
+MANIFEST_FIELDS = ('email', 'host', 'alias')
+
+
+class ManifestError(Exception):
+    pass
+
+
+# Wczytuje manifest: CSV z nagłówkiem email,host,alias albo JSON
+# z listą obiektów o tych samych polach
+def read_manifest(path):
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                rows = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ManifestError(f"Niepoprawny JSON w {path}: {e}")
+        if not isinstance(rows, list):
+            raise ManifestError("Manifest JSON musi być listą obiektów.")
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            missing = [field for field in MANIFEST_FIELDS if field not in (reader.fieldnames or [])]
+            if missing:
+                raise ManifestError(f"Brak kolumn w manifeście: {', '.join(missing)}")
+            rows = list(reader)
+
+    manifest = []
+    for row in rows:
+        if not isinstance(row, dict):
+            raise ManifestError("Każdy wpis manifestu musi być obiektem.")
+        manifest.append({field: str(row.get(field) or '').strip() for field in MANIFEST_FIELDS})
+    return manifest
+
+
+# Sprawdza cały manifest przed uruchomieniem czegokolwiek.
+# Zwraca (poprawne wiersze, błędy); błąd to (numer wiersza, alias, opis).
+# Poprawne wiersze dostają pole 'row' z numerem wiersza w manifeście.
+def validate_manifest(rows, store, keys_dir, taken_aliases=()):
+    valid = []
+    errors = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        alias = row['alias']
+        empty = [field for field in MANIFEST_FIELDS if not row[field]]
+        if empty:
+            errors.append((number, alias, f"puste pola: {', '.join(empty)}"))
+        elif alias in seen:
+            errors.append((number, alias, "alias powtórzony w manifeście"))
+        elif alias in store or alias in taken_aliases:
+            errors.append((number, alias, "alias już istnieje"))
+        elif os.path.exists(os.path.join(keys_dir, key_name_for(alias))):
+            errors.append((number, alias, f"plik {key_name_for(alias)} już istnieje"))
+        else:
+            valid.append(dict(row, row=number))
+        seen.add(alias)
+    return valid, errors
+
+
+# Generuje klucze równolegle (najwyżej concurrency naraz).
+# Nie dotyka metadanych ani configu - to robi commit_keys na końcu.
+# Wiersz z polem key_path (rotacja) dostaje klucz pod tą ścieżką.
+def generate_keys(rows, keys_dir, concurrency=4, progress=None, engine=None):
+    created = []
+    errors = []
+    total = len(rows)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {}
+        for row in rows:
+            key_path = row.get('key_path') or os.path.join(keys_dir, key_name_for(row['alias']))
+            futures[executor.submit(generate_key, row['email'], key_path, engine)] = row
+        for done, future in enumerate(as_completed(futures), start=1):
+            row = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((row['row'], row['alias'], str(e)))
+            else:
+                created.append(row)
+            if progress is not None:
+                progress(done, total)
+    # Zachowujemy kolejność z manifestu
+    created.sort(key=lambda row: row['row'])
+    return created, errors
+
+
+# Zapisuje metadane wszystkich nowych kluczy jedną transakcją
+# i fragmenty configu z ich blokami Host
+# Z indeksem odcisków (fingerprints.FingerprintIndex) rekordy dostają pole
+# fingerprint, a indeks - nowe pliki .pub bez ponownego skanowania katalogu
+def commit_keys(rows, store, keys_dir, fragments, fingerprints=None):
+    records = []
+    entries = []
+    for row in rows:
+        key_name = key_name_for(row['alias'])
+        key_path = os.path.join(keys_dir, key_name)
+        fingerprint = fingerprints.update(f"{key_path}.pub") if fingerprints is not None else None
+        records.append(key_metadata_for(row['email'], row['host'], row['alias'], key_name, key_path, fingerprint))
+        entries.append(config_entry_for(row['host'], row['alias'], key_name))
+
+    write_config_entries(fragments, entries)
+    store.reload_if_changed()
+    with store.batch():
+        for record in records:
+            store.add(record)
+    return records
+
+
+def provision(rows, store, keys_dir, fragments, concurrency=4, progress=None):
+    valid, errors = validate_manifest(rows, store, keys_dir)
+    created, keygen_errors = generate_keys(valid, keys_dir, concurrency, progress)
+    records = commit_keys(created, store, keys_dir, fragments)
+    return records, sorted(errors + keygen_errors)
+
+
+def format_errors(errors, limit=50):
+    lines = [f"Wiersz {number} ({alias or '-'}): {message}" for number, alias, message in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f"... i {len(errors) - limit} kolejnych")
+    return "\n".join(lines)
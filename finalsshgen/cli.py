@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import argparse
+
+from core import KeyManager, KeyManagerError, app_base_dir
+from bulk import ManifestError, read_manifest, format_errors
+from key_store import STORAGE_MODES
+from keygen import KEYGEN_ENGINES
+from tracing import write_metrics
+from fingerprints import format_check
+from rotation import DEFAULT_BATCH, DEFAULT_GRACE_DAYS
+from inventory import CHUNK_SIZE
+
+
+# Wiersz poleceń menedżera kluczy - bez PyQt6, do skryptów i CI:
+#
+#   python -m finalsshgen generate jan@firma.pl github.com jan
+#   python -m finalsshgen import zespol.csv -j 8
+#   python -m finalsshgen list --json
+#   python -m finalsshgen sync --dry-run
+#   python -m finalsshgen check
+#   python -m finalsshgen fsck --repair
+#   python -m finalsshgen rotate --days 90
+#   python -m finalsshgen export --with-keys -o kopia.tar.gz
+#   python -m finalsshgen import-inventory kopia.tar.gz
+#   python -m finalsshgen serve
+
+def cmd_generate(manager, args):
+    record = manager.generate(args.email, args.host, args.alias, args.engine)
+    print(f"Utworzono {record['key_name']} ({record['key_path']})")
+    return 0
+
+
+def cmd_import(manager, args):
+    try:
+        rows = read_manifest(args.manifest)
+    except (OSError, ManifestError) as e:
+        raise KeyManagerError(f"Nie udało się wczytać manifestu: {e}")
+
+    show_progress = not args.quiet and sys.stderr.isatty()
+
+    def progress(done, total):
+        if show_progress:
+            print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+
+    records, errors = manager.provision(rows, args.jobs, progress, args.engine)
+    if show_progress and rows:
+        print(file=sys.stderr)
+    print(f"Utworzono kluczy: {len(records)}")
+    if errors:
+        print(format_errors(errors, limit=len(errors)), file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_delete(manager, args):
+    aliases = list(args.aliases)
+    if args.host:
+        aliases += manager.aliases_for_host(args.host)
+    if not aliases:
+        raise KeyManagerError("Nie podano aliasów do usunięcia.")
+    deleted, missing = manager.delete_aliases(aliases)
+    for record in deleted:
+        print(f"Usunięto {record['alias']}")
+    for alias in missing:
+        print(f"Błąd: Nie znaleziono aliasu {alias}.", file=sys.stderr)
+    return 1 if missing else 0
+
+
+def cmd_delete_all(manager, args):
+    if not args.yes:
+        raise KeyManagerError("Usunięcie wszystkiego wymaga --yes.")
+    manager.purge_trash(manager.delete_all())
+    print("Wszystkie dane zostały usunięte.")
+    return 0
+
+
+def cmd_list(manager, args):
+    keys_data = manager.list_keys()
+    if args.json:
+        json.dump(keys_data, sys.stdout, indent=4)
+        print()
+        return 0
+    for key in keys_data:
+        print("\t".join((key['key_name'], key['hostname'], key['alias'], key['email'])))
+    return 0
+
+
+def cmd_show_config(manager, args):
+    print(manager.config_text().strip())
+    return 0
+
+
+def cmd_sync(manager, args):
+    plan = manager.sync(args.alias or None, args.dest, dry_run=args.dry_run)
+    if plan.empty():
+        print(f"{plan.dest_dir} jest aktualny.")
+    else:
+        print(plan.describe())
+        if args.dry_run:
+            print(plan.config_diff(), end='')
+    if plan.problems and plan.empty():
+        print(plan.describe(), file=sys.stderr)
+    return 0
+
+
+def cmd_check(manager, args):
+    report = manager.check_keys()
+    text = format_check(report)
+    if not text:
+        print("Nie znaleziono problemów.")
+        return 0
+    print(text)
+    return 1
+
+
+def cmd_find(manager, args):
+    records = manager.find_by_fingerprint(args.fingerprint)
+    for key in records:
+        print("\t".join((key['key_name'], key['hostname'], key['alias'], key['email'])))
+    return 0 if records else 1
+
+
+def cmd_fsck(manager, args):
+    report = manager.fsck()
+    if report.empty():
+        print("Metadane, klucze i bloki Host są spójne.")
+        return 0
+    print(report.describe())
+    if not args.repair:
+        return 1
+    repaired = manager.repair(report)
+    print(f"Naprawiono problemów: {repaired} z {len(report.problems)}")
+    return 0 if repaired == len(report.problems) else 1
+
+
+def _progress_printer(quiet):
+    show_progress = not quiet and sys.stderr.isatty()
+
+    def progress(done):
+        if show_progress:
+            print(f"\r{done}", end='', file=sys.stderr, flush=True)
+    return progress, show_progress
+
+
+# Dane idą na stdout, więc podsumowanie na stderr
+def cmd_export(manager, args):
+    compress = args.gzip or args.output.endswith(('.gz', '.tgz'))
+    progress, show_progress = _progress_printer(args.quiet)
+    if args.output == '-':
+        stats = manager.export_inventory(sys.stdout.buffer, args.with_keys, compress, progress)
+        sys.stdout.buffer.flush()
+    else:
+        try:
+            with open(args.output, 'wb') as out:
+                stats = manager.export_inventory(out, args.with_keys, compress, progress)
+        except BaseException:
+            if os.path.exists(args.output):
+                os.remove(args.output)
+            raise
+    if show_progress and stats.records:
+        print(file=sys.stderr)
+    print(stats.describe("Wyeksportowano"), file=sys.stderr)
+    if stats.errors:
+        print(stats.format_errors(), file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_import_inventory(manager, args):
+    progress, show_progress = _progress_printer(args.quiet)
+    if args.source == '-':
+        stats = manager.import_inventory(sys.stdin.buffer, args.chunk, progress)
+    else:
+        try:
+            source = open(args.source, 'rb')
+        except OSError as e:
+            raise KeyManagerError(f"Nie udało się otworzyć {args.source}: {e}")
+        with source:
+            stats = manager.import_inventory(source, args.chunk, progress)
+    if show_progress and stats.records:
+        print(file=sys.stderr)
+    print(stats.describe("Zaimportowano"))
+    if stats.errors:
+        print(stats.format_errors(), file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_rotate(manager, args):
+    if args.dry_run:
+        for key in manager.due_for_rotation(args.days):
+            print("\t".join((key['created'], key['alias'], key['hostname'], key['key_name'])))
+        return 0
+
+    show_progress = not args.quiet and sys.stderr.isatty()
+
+    def progress(done, total):
+        if show_progress:
+            print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+
+    records, errors = manager.rotate(args.days, args.batch, args.jobs, progress, args.engine)
+    if show_progress and records:
+        print(file=sys.stderr)
+    print(f"Zrotowano kluczy: {len(records)}")
+    purged = manager.purge_rotated(args.grace)
+    if purged:
+        print(f"Usunięto stare klucze po karencji (paczek: {purged})")
+    if errors:
+        print(format_errors(errors, limit=len(errors)), file=sys.stderr)
+        return 1
+    return 0
+
+
+# Usługa z gniazdem Unix (daemon.py) na tym samym menedżerze
+def cmd_serve(manager, args):
+    from daemon import KeyDaemon, DaemonError
+
+    daemon = KeyDaemon(manager, args.socket)
+    print(f"Nasłuchuję na {daemon.socket_path}", file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except DaemonError as e:
+        raise KeyManagerError(str(e))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='finalsshgen', description="Menedżer kluczy SSH bez interfejsu graficznego")
+    parser.add_argument('--base-dir', default=None, help=f"katalog aplikacji (domyślnie {app_base_dir()})")
+    parser.add_argument('--storage', choices=STORAGE_MODES, default=None, help="magazyn metadanych (domyślnie SSHGEN_STORAGE albo json)")
+    parser.add_argument('--metrics', default=None, metavar='PLIK', help="zapisz metryki operacji (format Prometheusa) do pliku")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('generate', help="wygeneruj jeden klucz")
+    p.add_argument('email')
+    p.add_argument('host')
+    p.add_argument('alias')
+    p.add_argument('--engine', choices=KEYGEN_ENGINES, default=None)
+    p.set_defaults(func=cmd_generate)
+
+    p = commands.add_parser('import', help="wygeneruj klucze z manifestu CSV/JSON")
+    p.add_argument('manifest')
+    p.add_argument('-j', '--jobs', type=int, default=4, help="ile kluczy generować równolegle")
+    p.add_argument('--engine', choices=KEYGEN_ENGINES, default=None)
+    p.add_argument('-q', '--quiet', action='store_true')
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser('delete', help="usuń klucze o podanych aliasach")
+    p.add_argument('aliases', nargs='*')
+    p.add_argument('--host', default=None, metavar='WZORZEC', help="także klucze hostów pasujących do wzorca, np. '*.firma.pl'")
+    p.set_defaults(func=cmd_delete)
+
+    p = commands.add_parser('delete-all', help="usuń wszystkie klucze i config")
+    p.add_argument('--yes', action='store_true')
+    p.set_defaults(func=cmd_delete_all)
+
+    p = commands.add_parser('list', help="wypisz klucze")
+    p.add_argument('--json', action='store_true', help="w formacie keys.json")
+    p.set_defaults(func=cmd_list)
+
+    p = commands.add_parser('show-config', help="wypisz config (wszystkie fragmenty)")
+    p.set_defaults(func=cmd_show_config)
+
+    p = commands.add_parser('sync', help="synchronizuj klucze i bloki Host z ~/.ssh")
+    p.add_argument('--dry-run', action='store_true', help="tylko pokaż, co by się zmieniło")
+    p.add_argument('--dest', default=None, help="katalog docelowy (domyślnie ~/.ssh)")
+    p.add_argument('--alias', action='append', help="tylko wybrane aliasy (można powtarzać)")
+    p.set_defaults(func=cmd_sync)
+
+    p = commands.add_parser('check', help="znajdź zduplikowane klucze, pliki .pub bez metadanych i brakujące pliki")
+    p.set_defaults(func=cmd_check)
+
+    p = commands.add_parser('fsck', help="sprawdź spójność metadanych, plików kluczy i bloków Host")
+    p.add_argument('--repair', action='store_true', help="napraw wszystko, co się da, w jednym przebiegu")
+    p.set_defaults(func=cmd_fsck)
+
+    p = commands.add_parser('rotate', help="wymień klucze starsze niż --days dni")
+    p.add_argument('--days', type=float, required=True, help="maksymalny wiek klucza w dniach")
+    p.add_argument('--batch', type=int, default=DEFAULT_BATCH, help="ile kluczy w jednej paczce (jeden zapis metadanych)")
+    p.add_argument('-j', '--jobs', type=int, default=4, help="ile kluczy generować równolegle")
+    p.add_argument('--grace', type=float, default=DEFAULT_GRACE_DAYS, help="po ilu dniach kasować stare klucze")
+    p.add_argument('--engine', choices=KEYGEN_ENGINES, default=None)
+    p.add_argument('--dry-run', action='store_true', help="tylko wypisz klucze do rotacji")
+    p.add_argument('-q', '--quiet', action='store_true')
+    p.set_defaults(func=cmd_rotate)
+
+    p = commands.add_parser('export', help="zapisz spis kluczy jako JSON Lines (z --with-keys: tar z plikami kluczy)")
+    p.add_argument('-o', '--output', default='-', help="plik wynikowy (domyślnie stdout)")
+    p.add_argument('--with-keys', action='store_true', help="dołącz pliki kluczy (strumień tar)")
+    p.add_argument('--gzip', action='store_true', help="kompresuj (domyślnie dla plików .gz/.tgz)")
+    p.add_argument('-q', '--quiet', action='store_true')
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser('import-inventory', help="wczytaj spis kluczy z eksportu (JSON Lines albo tar, także gzip)")
+    p.add_argument('source', help="plik eksportu albo - dla stdin")
+    p.add_argument('--chunk', type=int, default=CHUNK_SIZE, help="ile rekordów w jednej transakcji")
+    p.add_argument('-q', '--quiet', action='store_true')
+    p.set_defaults(func=cmd_import_inventory)
+
+    p = commands.add_parser('serve', help="uruchom usługę z API JSON na gnieździe Unix")
+    p.add_argument('--socket', default=None, help="ścieżka gniazda (domyślnie SSHGEN_SOCKET albo sshgen.sock w katalogu aplikacji)")
+    p.set_defaults(func=cmd_serve)
+
+    p = commands.add_parser('find', help="znajdź klucz po odcisku (SHA256:..., jak ssh-keygen -l)")
+    p.add_argument('fingerprint')
+    p.set_defaults(func=cmd_find)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        manager = KeyManager(args.base_dir, args.storage)
+        if manager.store_warning:
+            print(f"Uwaga: {manager.store_warning}", file=sys.stderr)
+        status = args.func(manager, args)
+        manager.export_json_if_changed()
+        return status
+    except KeyManagerError as e:
+        print(f"Błąd: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.metrics:
+            write_metrics(args.metrics)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import os
+import bisect
+import locale
+import itertools
+
+from ssh_config import SshConfig, write_text_atomic
+from tracing import count
+
+
+# Config SSH jako katalog fragmentów: każdy alias ma własny plik
+# config.d/<wzorzec Host>.conf z jednym blokiem Host. Dodanie albo usunięcie
+# klucza dotyka dokładnie jednego małego pliku, a ~/.ssh/config dostaje
+# tylko linię Include (patrz ssh_sync).
+#
+# Widok całości (text(), config()) jest składany z fragmentów i trzymany
+# w pamięci; przy każdym odczycie sprawdzamy tylko stat fragmentów i
+# wczytujemy ponownie te, których mtime/rozmiar/i-węzeł się zmienił.
+# Gdy katalog obserwuje file_watcher (watched = True), odczyt ufa pamięci
+# podręcznej, a stat fragmentów idzie dopiero po zgłoszonej zmianie
+# (changed()); własne zapisy i usunięcia poprawiają pamięć podręczną od razu.
+# Podgląd (view()) w ogóle nie skleja tekstu - patrz FragmentsView.
+
+FRAGMENT_SUFFIX = '.conf'
+
+
+def fragment_name(pattern):
+    if not pattern or os.sep in pattern or (os.altsep and os.altsep in pattern) or pattern.startswith('.'):
+        raise ValueError(f"Nieprawidłowa nazwa bloku Host: {pattern!r}")
+    return pattern + FRAGMENT_SUFFIX
+
+
+def fragment_text(pattern, options):
+    config = SshConfig()
+    config.add_block(pattern, options)
+    return config.text()
+
+
+class ConfigFragments:
+    def __init__(self, path):
+        self.path = path
+        # nazwa pliku -> (sygnatura, tekst)
+        self._fragments = {}
+        # Nazwy plików po kolei i ich rozmiary w bajtach z końcem linii
+        # (rozmiar + 1) - view() nie musi ich sortować ani liczyć
+        self._names = []
+        self._spans = []
+        # Złożony tekst i widok; None - do złożenia po zmianie fragmentów
+        self._text = None
+        self._config = None
+        self._view = None
+        self.watched = False
+        self._stale = True
+
+    def fragment_path(self, pattern):
+        return os.path.join(self.path, fragment_name(pattern))
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    # Zapisuje fragment tylko wtedy, gdy jego treść się zmienia
+    def write(self, pattern, options):
+        path = self.fragment_path(pattern)
+        text = fragment_text(pattern, options)
+        try:
+            with open(path, 'r', newline='') as f:
+                if f.read() == text:
+                    return False
+        except FileNotFoundError:
+            os.makedirs(self.path, exist_ok=True)
+        write_text_atomic(path, text)
+        if self.watched and not self._stale:
+            st = os.stat(path)
+            self._put(os.path.basename(path), (st.st_ino, st.st_mtime_ns, st.st_size), text)
+        return True
+
+    def remove(self, pattern):
+        path = self.fragment_path(pattern)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        self._drop(os.path.basename(path))
+        count('files_removed')
+        return True
+
+    # Katalog zmieniony poza write()/remove() (inny program, ręczna edycja,
+    # podmiana całego katalogu) - następny odczyt porówna go z dyskiem
+    def changed(self):
+        self._stale = True
+
+    def patterns(self):
+        self._refresh()
+        return [name[:-len(FRAGMENT_SUFFIX)] for name in sorted(self._fragments)]
+
+    # Wszystkie fragmenty jako jeden tekst configu (w kolejności nazw plików)
+    def text(self):
+        self._refresh()
+        if self._text is None:
+            fragments = self._fragments
+            self._text = '\n'.join(fragments[name][1] for name in self._names)
+        return self._text
+
+    # Ten sam widok sparsowany - do wyszukiwania bloków po wzorcu
+    def config(self):
+        text = self.text()
+        if self._config is None:
+            self._config = SshConfig(text)
+        return self._config
+
+    # Ten sam tekst jako bufor bajtów dla podglądu (text_viewer.PagedText)
+    def view(self):
+        self._refresh()
+        if self._view is None:
+            self._view = FragmentsView(self._names, self._spans, self._fragments)
+        return self._view
+
+    def _refresh(self):
+        if not self.watched or self._stale:
+            self._stale = False
+            self._scan()
+
+    def _put(self, name, signature, text):
+        index = bisect.bisect_left(self._names, name)
+        if name in self._fragments:
+            self._spans[index] = signature[2] + 1
+        else:
+            self._names.insert(index, name)
+            self._spans.insert(index, signature[2] + 1)
+        self._fragments[name] = (signature, text)
+        self._invalidate()
+
+    def _drop(self, name):
+        if self._fragments.pop(name, None) is None:
+            return
+        index = bisect.bisect_left(self._names, name)
+        del self._names[index]
+        del self._spans[index]
+        self._invalidate()
+
+    def _invalidate(self):
+        self._text = None
+        self._config = None
+        self._view = None
+
+    def _scan(self):
+        try:
+            entries = [entry for entry in os.scandir(self.path) if entry.name.endswith(FRAGMENT_SUFFIX) and entry.is_file()]
+        except FileNotFoundError:
+            entries = []
+
+        fragments = {}
+        changed = False
+        for entry in entries:
+            st = entry.stat()
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+            cached = self._fragments.get(entry.name)
+            if cached is not None and cached[0] == signature:
+                fragments[entry.name] = cached
+                continue
+            try:
+                with open(entry.path, 'r', newline='') as f:
+                    text = f.read()
+            except FileNotFoundError:
+                continue
+            count('bytes_read', len(text))
+            count('files_read')
+            fragments[entry.name] = (signature, text)
+            changed = True
+        if changed or fragments.keys() != self._fragments.keys():
+            self._invalidate()
+            self._names = sorted(fragments)
+            self._spans = [fragments[name][0][2] + 1 for name in self._names]
+        self._fragments = fragments
+
+    # Jednorazowe przejście ze starego, wspólnego pliku config na fragmenty
+    def migrate_from(self, shared_config_path):
+        if not os.path.exists(shared_config_path):
+            return 0
+        migrated = 0
+        for block in SshConfig.load(shared_config_path).blocks:
+            if block.keyword != 'host' or not block.patterns:
+                continue
+            self.write(block.patterns[0], block.options)
+            migrated += 1
+        os.remove(shared_config_path)
+        return migrated
+
+
+# Tekst text() jako bufor bajtów (len, wycinki, find/rfind, search), którego
+# nikt nie skleja: przesunięcie fragmentu wynika z rozmiarów plików
+# z sygnatur, a bajty fragmentu powstają dopiero, gdy podgląd go pokazuje
+# albo przeszukuje. Otwarcie podglądu to kopie list nazw i rozmiarów (bez
+# pętli w Pythonie), więc późniejsze zmiany katalogu widoku nie psują.
+class FragmentsView:
+    def __init__(self, names, spans, fragments):
+        # Pliki czytane i pisane są w kodowaniu domyślnym (open() bez encoding)
+        self._encoding = locale.getpreferredencoding(False)
+        self._names = list(names)
+        self._fragments = dict(fragments)
+        self._starts = [0]
+        self._starts += itertools.accumulate(spans)
+        # Ostatni fragment nie ma końca linii
+        self.size = max(0, self._starts[-1] - 1)
+
+    def __len__(self):
+        return self.size
+
+    def _piece(self, index):
+        data = self._fragments[self._names[index]][1].encode(self._encoding)
+        return data if index == len(self._names) - 1 else data + b'\n'
+
+    # Numer fragmentu, w którym leży offset
+    def _index(self, offset):
+        return bisect.bisect_right(self._starts, offset) - 1
+
+    def __getitem__(self, key):
+        start, end, _ = key.indices(self.size)
+        if start >= end:
+            return b''
+        parts = []
+        index = self._index(start)
+        while index < len(self._names) and self._starts[index] < end:
+            base = self._starts[index]
+            parts.append(self._piece(index)[max(0, start - base):end - base])
+            index += 1
+        return b''.join(parts)
+
+    # Jak bytes.find/rfind, fragment po fragmencie; zakładka długości sub
+    # łapie też wystąpienia na styku fragmentów
+    def find(self, sub, start=0, end=None):
+        end = self.size if end is None else min(end, self.size)
+        index = self._index(start)
+        while index < len(self._names) and self._starts[index] < end:
+            window = max(start, self._starts[index])
+            found = self[window:min(end, self._starts[index + 1] + len(sub) - 1)].find(sub)
+            if found >= 0:
+                return window + found
+            index += 1
+        return -1
+
+    def rfind(self, sub, start=0, end=None):
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return -1
+        index = self._index(end - 1)
+        while index >= 0 and self._starts[index + 1] > start:
+            window = max(start, self._starts[index])
+            found = self[window:min(end, self._starts[index + 1] + len(sub) - 1)].rfind(sub)
+            if found >= 0:
+                return window + found
+            index -= 1
+        return -1
+
+    # (początek, koniec) pierwszego dopasowania wyrażenia od pos albo None.
+    # Każdy fragment to cały blok Host zaczynający się od nowej linii, więc
+    # dopasowania w obrębie linii (jak w podglądzie) nie przechodzą między nimi.
+    def search(self, pattern, pos=0):
+        index = self._index(pos) if pos < self.size else len(self._names)
+        while index < len(self._names):
+            base = self._starts[index]
+            match = pattern.search(self._piece(index), max(0, pos - base))
+            if match is not None:
+                return base + match.start(), base + match.end()
+            index += 1
+        return None
@@ -0,0 +1,395 @@
+import os
+import sys
+import json
+import shutil
+import fnmatch
+from datetime import datetime
+
+from key_store import KeyStoreError, open_store, export_json, write_json_atomic
+from keygen import key_name_for, host_alias_for, config_entry_for, key_metadata_for, write_config_entries, remove_config_entries, generate_key
+from bulk import validate_manifest, generate_keys, commit_keys
+from ssh_sync import plan_sync, apply_sync
+from config_fragments import ConfigFragments
+from fingerprints import FingerprintIndex
+from fsck import FragmentSummaries, plan_fsck, apply_fsck, broken_copies
+from inventory import InventoryError, CHUNK_SIZE, export_inventory, import_inventory
+from rotation import RotationSchedule, DEFAULT_BATCH, DEFAULT_GRACE_DAYS, plan_rotation, commit_rotation, purge_rotated
+from tracing import span, count, configure_log
+
+
+# Logika menedżera kluczy bez Qt: wyniki zwracane są wartościami, błędy
+# wyjątkiem KeyManagerError. Z tej klasy korzysta GUI (main.py) i CLI (cli.py).
+
+class KeyManagerError(Exception):
+    pass
+
+
+# Usuwa pliki kluczy (prywatny i .pub) podanych rekordów; bez dostępu do
+# magazynu, więc GUI może to robić w wątku roboczym. Zwraca liczbę plików.
+def remove_key_files(records):
+    removed = 0
+    with span('remove_key_files', keys=len(records)):
+        for record in records:
+            for path in (record['key_path'], f"{record['key_path']}.pub"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+        count('files_removed', removed)
+    return removed
+
+
+# Katalog aplikacji: obok .exe w wersji spakowanej, obok skryptu w pozostałych
+def app_base_dir():
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.realpath(__file__))
+
+
+class KeyManager:
+    def __init__(self, base_dir=None, storage=None):
+        self.base_dir = base_dir or app_base_dir()
+        self.keys_dir = os.path.join(self.base_dir, 'keys')
+        self.keys_json_path = os.path.join(self.base_dir, 'keys.json')
+        # Bloki Host: jeden fragment na alias w keys/config.d
+        self.config_dir = os.path.join(self.keys_dir, 'config.d')
+        self.fragments = ConfigFragments(self.config_dir)
+        # Kosz: katalogi kluczy i metadane odłożone przez delete_all
+        self.trash_dir = os.path.join(self.base_dir, '.trash')
+        # Stare klucze po rotacji, trzymane przez okres karencji
+        self.rotated_dir = os.path.join(self.base_dir, '.rotated')
+        # Odciski plików .pub z keys/, z pamięcią podręczną w fingerprints.json
+        self.fingerprints = FingerprintIndex(self.keys_dir, os.path.join(self.base_dir, 'fingerprints.json'))
+        # Streszczenia fragmentów configu dla fsck, tak samo w fragments.json
+        self.fragment_summaries = FragmentSummaries(self.fragments, os.path.join(self.base_dir, 'fragments.json'))
+        # Aliasy, dla których klucz jest właśnie generowany w tle
+        self.pending_aliases = set()
+        # Dziennik operacji (JSON, rotowany) - logs/operations.log
+        self.trace_log_path = os.path.join(self.base_dir, 'logs', 'operations.log')
+        configure_log(self.trace_log_path)
+
+        if not os.path.exists(self.keys_dir):
+            os.makedirs(self.keys_dir)
+        # Starsze wersje trzymały wszystkie bloki w jednym keys/config
+        self.fragments.migrate_from(os.path.join(self.keys_dir, 'config'))
+
+        if not os.path.exists(self.keys_json_path):
+            with open(self.keys_json_path, 'w') as f:
+                json.dump([], f)
+
+        # Uszkodzony plik odkładamy na bok zamiast go nadpisywać
+        self.store_warning = None
+        try:
+            self.store = open_store(self.base_dir, storage)
+        except KeyStoreError as e:
+            broken_path = f"{e.path}.uszkodzony-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            os.replace(e.path, broken_path)
+            self.store_warning = f"{e}\n\nUszkodzony plik przeniesiono do {broken_path}."
+            self.store = open_store(self.base_dir, storage)
+
+        # Kolejka rotacji po wieku kluczy - budowana przy pierwszym użyciu
+        self.rotation = RotationSchedule(self.store)
+
+        # Przy dzienniku i SQLite: czy magazyn zmienił się od ostatniego
+        # eksportu keys.json. Eksport to zapis wszystkich wpisów, więc robimy
+        # go tylko po zmianach (także tych wczytanych z innej instancji).
+        self.json_outdated = False
+        self.store.subscribe(self._store_changed)
+
+    # --- generowanie ---
+
+    # Sprawdza dane nowego klucza i zwraca ścieżkę, pod którą powstanie
+    def prepare_key(self, email, host, alias):
+        if not email or not host or not alias:
+            raise KeyManagerError("Wszystkie pola muszą być wypełnione!")
+
+        key_name = key_name_for(alias)
+        key_path = os.path.join(self.keys_dir, key_name)
+
+        self.store.reload_if_changed()
+        if os.path.exists(key_path) or alias in self.pending_aliases or alias in self.store:
+            raise KeyManagerError(f"Klucz o nazwie {key_name} już istnieje!")
+        return key_path
+
+    # Po wygenerowaniu plików klucza: blok Host i metadane
+    def register_key(self, email, host, alias):
+        with span('register_key', alias=alias):
+            key_name = key_name_for(alias)
+            key_path = os.path.join(self.keys_dir, key_name)
+            write_config_entries(self.fragments, [config_entry_for(host, alias, key_name)])
+            fingerprint = self.fingerprints.update(f"{key_path}.pub")
+            record = key_metadata_for(email, host, alias, key_name, key_path, fingerprint)
+            self.store.reload_if_changed()
+            self.store.add(record)
+            return record
+
+    def generate(self, email, host, alias, engine=None):
+        with span('generate', alias=alias):
+            key_path = self.prepare_key(email, host, alias)
+            try:
+                generate_key(email, key_path, engine)
+            except RuntimeError as e:
+                raise KeyManagerError(str(e))
+            return self.register_key(email, host, alias)
+
+    def validate_manifest(self, rows):
+        self.store.reload_if_changed()
+        return validate_manifest(rows, self.store, self.keys_dir, self.pending_aliases)
+
+    def generate_manifest_keys(self, rows, concurrency=4, progress=None, engine=None):
+        return generate_keys(rows, self.keys_dir, concurrency, progress, engine)
+
+    def commit_manifest_keys(self, rows):
+        return commit_keys(rows, self.store, self.keys_dir, self.fragments, self.fingerprints)
+
+    # Cały import manifestu naraz; zwraca (utworzone rekordy, błędy wierszy)
+    def provision(self, rows, concurrency=4, progress=None, engine=None):
+        with span('provision', rows=len(rows)):
+            valid, errors = self.validate_manifest(rows)
+            created, keygen_errors = self.generate_manifest_keys(valid, concurrency, progress, engine)
+            records = self.commit_manifest_keys(created)
+            return records, sorted(errors + keygen_errors)
+
+    # --- usuwanie ---
+
+    def delete_alias(self, alias):
+        if not alias:
+            raise KeyManagerError("Nie podano aliasu do usunięcia.")
+
+        deleted, missing = self.delete_aliases([alias])
+        if missing:
+            raise KeyManagerError(f"Nie znaleziono aliasu {alias}.")
+        return deleted[0]
+
+    # Usuwa wiele kluczy naraz: po jednym fragmencie configu na klucz,
+    # jeden zapis metadanych.
+    # Z remove_files=False pliki kluczy zostają do usunięcia przez
+    # remove_key_files (GUI robi to w tle). Zwraca (usunięte rekordy,
+    # aliasy, których nie było).
+    def delete_aliases(self, aliases, remove_files=True):
+        with span('delete_aliases', aliases=len(aliases)):
+            self.store.reload_if_changed()
+            found, missing = [], []
+            for alias in dict.fromkeys(aliases):
+                if alias in self.store:
+                    found.append(alias)
+                else:
+                    missing.append(alias)
+            if not found:
+                return [], missing
+
+            records = [self.store.get(alias) for alias in found]
+            remove_config_entries(self.fragments, [host_alias_for(record['hostname'], record['alias']) for record in records])
+            deleted = self.store.remove_many(found)
+            for record in deleted:
+                self.fingerprints.forget(f"{record['key_path']}.pub")
+            if remove_files:
+                remove_key_files(deleted)
+            return deleted, missing
+
+    # Aliasy kluczy, których host pasuje do wzorca (np. "*.firma.pl")
+    def aliases_for_host(self, pattern):
+        return [record['alias'] for record in self.list_keys() if fnmatch.fnmatchcase(record['hostname'], pattern)]
+
+    # Usuwa wszystko w stałym czasie: pliki magazynu (keys.json, migawka
+    # z dziennikiem albo baza) i cały katalog kluczy (razem z fragmentami
+    # configu) trafiają do kosza po jednym rename, bez zapisu rekordów.
+    # Zwraca ścieżkę wpisu w koszu - do undo_delete_all albo purge_trash.
+    def delete_all(self):
+        with span('delete_all'):
+            self.store.reload_if_changed()
+            trash_path = os.path.join(self.trash_dir, datetime.now().strftime('%Y%m%d%H%M%S%f'))
+            os.makedirs(trash_path)
+            self.store.move_to(trash_path)
+            # Awaria w tym miejscu zostawia pliki kluczy bez metadanych,
+            # ale niczego nie traci - metadane są już w koszu
+            os.rename(self.keys_dir, os.path.join(trash_path, 'keys'))
+            os.makedirs(self.keys_dir)
+            self.fingerprints.invalidate()
+            self.fragments.changed()
+            return trash_path
+
+    # Przywraca stan sprzed delete_all, o ile od tego czasu nic nie dodano
+    def undo_delete_all(self, trash_path):
+        with span('undo_delete_all'):
+            trashed_keys_dir = os.path.join(trash_path, 'keys')
+            if not os.path.isdir(trashed_keys_dir):
+                raise KeyManagerError("Usuniętych danych nie ma już w koszu.")
+            self.store.reload_if_changed()
+            if len(self.store) or os.listdir(self.keys_dir):
+                raise KeyManagerError("Nie można cofnąć usuwania - od tego czasu dodano nowe klucze.")
+
+            if not self.store.restore_from(trash_path):
+                raise KeyManagerError("Usuniętych danych nie ma już w koszu.")
+            os.rmdir(self.keys_dir)
+            os.rename(trashed_keys_dir, self.keys_dir)
+            self.fingerprints.invalidate()
+            self.fragments.changed()
+            shutil.rmtree(trash_path, ignore_errors=True)
+            return self.store.all()
+
+    # Właściwe kasowanie plików - może trwać, więc GUI woła to w tle.
+    # Bez argumentu opróżnia cały kosz.
+    def purge_trash(self, trash_path=None):
+        with span('purge_trash'):
+            if trash_path is not None:
+                paths = [trash_path]
+            elif os.path.isdir(self.trash_dir):
+                paths = [os.path.join(self.trash_dir, name) for name in os.listdir(self.trash_dir)]
+            else:
+                paths = []
+            for path in paths:
+                shutil.rmtree(path, ignore_errors=True)
+            return len(paths)
+
+    # --- odczyt ---
+
+    def list_keys(self):
+        self.store.reload_if_changed()
+        return self.store.all()
+
+    def get(self, alias):
+        self.store.reload_if_changed()
+        return self.store.get(alias)
+
+    # Rekordy kluczy o danym odcisku (SHA256:...) - zwykle jeden,
+    # więcej oznacza ten sam klucz publiczny pod kilkoma aliasami
+    def find_by_fingerprint(self, fingerprint):
+        self.store.reload_if_changed()
+        records = []
+        for pub_path in self.fingerprints.find(fingerprint):
+            record = self.store.find_by_key_name(os.path.basename(pub_path)[:-len('.pub')])
+            if record is not None:
+                records.append(record)
+        return records
+
+    # Metody wołane przez GUI w wątku roboczym (check_keys, fsck, plan_sync,
+    # current_keys_json) przyjmują records - kopię store.all() zrobioną
+    # w wątku GUI. Bez niej same wczytują zmiany magazynu, a tego nie wolno
+    # robić poza wątkiem GUI: zdarzenia magazynu trafiają do modelu tabeli.
+    def _records(self, records):
+        return self.list_keys() if records is None else records
+
+    # Jeden równoległy przegląd keys/: duplikaty kluczy publicznych, pliki
+    # .pub bez metadanych, metadane bez plików (fingerprints.format_check)
+    def check_keys(self, records=None):
+        with span('check_keys'):
+            return self.fingerprints.check(self._records(records))
+
+    # Spójność metadanych, plików kluczy i bloków Host (fsck.plan_fsck);
+    # uszkodzone kopie metadanych służą do odzyskania zgubionych wpisów
+    def fsck(self, records=None):
+        with span('fsck'):
+            return plan_fsck(self._records(records), self.keys_dir, self.fragment_summaries, self.fingerprints, broken_copies(self.base_dir))
+
+    def repair(self, report):
+        try:
+            return apply_fsck(report, self.store, self.fragments, self.trash_dir)
+        finally:
+            self.fingerprints.invalidate()
+            self.fragments.changed()
+
+    # Złożony widok fragmentów, odświeżany tylko dla zmienionych plików
+    def config_text(self):
+        if not self.fragments.exists():
+            raise KeyManagerError("Plik config nie istnieje.")
+        return self.fragments.text()
+
+    # Ten sam config jako bufor dla podglądu (text_viewer.PagedText)
+    # - bez sklejania fragmentów w jeden tekst
+    def config_view(self):
+        if not self.fragments.exists():
+            raise KeyManagerError("Plik config nie istnieje.")
+        return self.fragments.view()
+
+    # --- rotacja ---
+
+    # Klucze starsze niż max_age_days, od najstarszego
+    def due_for_rotation(self, max_age_days, limit=None, exclude=()):
+        self.store.reload_if_changed()
+        return self.rotation.due(max_age_days, limit=limit, exclude=exclude)
+
+    # Najwyżej limit kluczy do rotacji jako wiersze dla generate_rotation_keys
+    def plan_rotation(self, max_age_days, limit=DEFAULT_BATCH, exclude=()):
+        return plan_rotation(self.due_for_rotation(max_age_days, limit, exclude), self.keys_dir)
+
+    # Tylko pliki nowych kluczy - GUI woła to w wątku roboczym
+    def generate_rotation_keys(self, rows, concurrency=4, progress=None, engine=None):
+        return generate_keys(rows, self.keys_dir, concurrency, progress, engine)
+
+    def commit_rotation(self, rows):
+        return commit_rotation(rows, self.store, self.fragments, self.fingerprints, self.rotated_dir)
+
+    # Wszystkie klucze do rotacji, paczkami po batch_size; klucz, którego
+    # nie udało się wygenerować, nie wraca w kolejnych paczkach.
+    # Zwraca (nowe rekordy, błędy).
+    def rotate(self, max_age_days, batch_size=DEFAULT_BATCH, concurrency=4, progress=None, engine=None):
+        with span('rotate', max_age_days=max_age_days):
+            records, errors = [], []
+            failed = set()
+            while True:
+                rows = self.plan_rotation(max_age_days, batch_size, failed)
+                if not rows:
+                    return records, errors
+                created, batch_errors = self.generate_rotation_keys(rows, concurrency, progress, engine)
+                records += self.commit_rotation(created)
+                errors += batch_errors
+                failed.update(alias for _, alias, _ in batch_errors)
+
+    def purge_rotated(self, grace_days=DEFAULT_GRACE_DAYS):
+        return purge_rotated(self.rotated_dir, grace_days)
+
+    # --- ~/.ssh ---
+
+    def plan_sync(self, aliases=None, dest_dir=None, records=None):
+        return plan_sync(self._records(records), self.fragments, dest_dir, aliases)
+
+    def apply_sync(self, plan):
+        return apply_sync(plan)
+
+    def sync(self, aliases=None, dest_dir=None, dry_run=False):
+        with span('sync', dry_run=dry_run):
+            plan = self.plan_sync(aliases, dest_dir)
+            if not dry_run and not plan.empty():
+                apply_sync(plan)
+            return plan
+
+    # --- eksport i import ---
+
+    # Strumień JSON Lines (albo tar z plikami kluczy) do out; zwraca
+    # inventory.TransferStats
+    def export_inventory(self, out, with_keys=False, compress=False, progress=None):
+        self.store.reload_if_changed()
+        return export_inventory(self.store, out, with_keys, compress, progress)
+
+    def import_inventory(self, stream, chunk_size=CHUNK_SIZE, progress=None):
+        try:
+            return import_inventory(stream, self.store, self.keys_dir, self.fragments, self.fingerprints, chunk_size, progress)
+        except InventoryError as e:
+            raise KeyManagerError(str(e))
+
+    # keys.json do podglądu: przy dzienniku i SQLite najpierw świeży eksport
+    def current_keys_json(self, records=None):
+        if self.exports_json():
+            self.json_outdated = False
+            write_json_atomic(self.keys_json_path, self._records(records))
+        return self.keys_json_path
+
+    # keys.json jako eksport, gdy metadane trzymane są w dzienniku albo SQLite
+    def export_json(self, path=None):
+        if path is None:
+            self.json_outdated = False
+        export_json(self.store, path or self.keys_json_path)
+
+    # Po poleceniu CLI, przy zamknięciu GUI i usługi - tylko po zmianach
+    def export_json_if_changed(self):
+        if self.json_outdated:
+            self.export_json()
+
+    def exports_json(self):
+        return self.store.path != self.keys_json_path
+
+    def _store_changed(self, event, record, row):
+        if self.exports_json():
+            self.json_outdated = True
@@ -0,0 +1,399 @@
+import os
+import json
+import queue
+import hashlib
+import socket
+import threading
+
+from core import KeyManagerError, remove_key_files
+from keygen import generate_key
+from bulk import validate_manifest
+from key_store import KeyStoreError
+from daemon_client import DaemonError, default_socket_path
+from tracing import span
+
+
+# Usługa lokalna: jeden proces trzyma magazyn metadanych, fragmenty configu
+# i indeks odcisków w pamięci, a skrypty (i GUI) rozmawiają z nim przez
+# gniazdo Unix. Protokół to linie JSON w obie strony:
+#
+#   -> {"id": 1, "method": "generate", "params": {"email": ..., "host": ..., "alias": ...}}
+#   <- {"id": 1, "result": {...rekord...}}
+#   <- {"id": 2, "error": {"type": "KeyManagerError", "message": "..."}}
+#
+# Klient może wysłać wiele żądań bez czekania na odpowiedzi (pipelining);
+# odpowiedzi przychodzą w kolejności żądań. Po "subscribe" połączenie
+# dostaje też zdarzenia magazynu: {"event": "add", "record": {...}, "row": 3}
+# ('add', 'remove', 'update', 'reset' - jak słuchacze KeyStore); 'reset'
+# niesie całą listę w "records", więc klient nie musi o nią pytać.
+#
+# Stan menedżera chroni jedna blokada; ssh-keygen działa poza nią, więc
+# kilka generowań z różnych połączeń idzie równolegle.
+
+PROTOCOL_VERSION = 1
+# Co ile sekund sprawdzać, czy magazyn zmienił ktoś spoza usługi
+POLL_SECONDS = 1.0
+# Ile czekać przy zatrzymaniu na dosłanie odpowiedzi do klientów
+SHUTDOWN_TIMEOUT = 2.0
+
+
+def _plan_to_dict(plan):
+    describe = plan.describe()
+    config_diff = plan.config_diff()
+    return {
+        'dest_dir': plan.dest_dir,
+        'empty': plan.empty(),
+        'describe': describe,
+        'config_diff': config_diff,
+        'problems': list(plan.problems),
+        'digest': _plan_digest(describe, config_diff),
+    }
+
+
+# Skrót planu pokazanego w podglądzie - sync sprawdza nim, że wykonuje
+# dokładnie to, co użytkownik zatwierdził
+def _plan_digest(describe, config_diff):
+    return hashlib.sha256(f"{describe}\0{config_diff}".encode('utf-8')).hexdigest()
+
+
+def _fsck_to_dict(report):
+    return {
+        'problems': [
+            {'kind': problem.kind, 'subject': problem.subject, 'message': problem.message, 'repair': problem.repair}
+            for problem in report.problems
+        ],
+    }
+
+
+class _Connection:
+    def __init__(self, daemon, sock):
+        self.daemon = daemon
+        self.sock = sock
+        self.subscribed = False
+        # Odpowiedzi i zdarzenia wysyła osobny wątek - wolny klient nie
+        # blokuje usługi, która trzyma blokadę menedżera
+        self.outbox = queue.Queue()
+
+    def send(self, message):
+        self.outbox.put(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def _writer(self):
+        while True:
+            data = self.outbox.get()
+            if data is None:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                return
+
+    def serve(self):
+        writer = threading.Thread(target=self._writer, daemon=True)
+        writer.start()
+        try:
+            with self.sock.makefile('rb') as reader:
+                for line in reader:
+                    if line.strip():
+                        self.send(self.daemon.handle(self, line))
+                    # Po "shutdown" odpowiedź jest już w kolejce, więc dotrze do klienta
+                    if self.daemon.stopping():
+                        self.daemon.stop()
+                        break
+        except OSError:
+            pass
+        finally:
+            self.outbox.put(None)
+            writer.join()
+            self.sock.close()
+            self.daemon.disconnected(self)
+
+
+class KeyDaemon:
+    def __init__(self, manager, socket_path=None):
+        self.manager = manager
+        self.socket_path = socket_path or default_socket_path(manager.base_dir)
+        self.lock = threading.RLock()
+        self._connections = set()
+        self._stopping = threading.Event()
+        self._server = None
+        manager.store.subscribe(self._store_changed)
+
+        self.methods = {
+            'ping': self.ping,
+            'subscribe': self.subscribe,
+            'list': self.list,
+            'get': self.get,
+            'find': self.find,
+            'generate': self.generate,
+            'register': self.register,
+            'validate_manifest': self.validate_manifest,
+            'commit': self.commit,
+            'delete': self.delete,
+            'delete_all': self.delete_all,
+            'undo_delete_all': self.undo_delete_all,
+            'purge_trash': self.purge_trash,
+            'config': self.config,
+            'keys_json': self.keys_json,
+            'sync': self.sync,
+            'check': self.check,
+            'fsck': self.fsck,
+            'repair': self.repair,
+            'plan_rotation': self.plan_rotation,
+            'commit_rotation': self.commit_rotation,
+            'purge_rotated': self.purge_rotated,
+            'shutdown': self.shutdown,
+        }
+
+    # --- gniazdo ---
+
+    # Działająca usługa na tej samej ścieżce to błąd; plik po usłudze,
+    # która się wysypała, jest usuwany
+    def _bind(self):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+        else:
+            raise DaemonError(f"Usługa już działa: {self.socket_path}")
+        finally:
+            probe.close()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Tylko właściciel może się połączyć
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        server.listen(16)
+        return server
+
+    def serve_forever(self):
+        self._server = self._bind()
+        poller = threading.Thread(target=self._poll_store, daemon=True)
+        poller.start()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    sock, _ = self._server.accept()
+                except OSError:
+                    break
+                connection = _Connection(self, sock)
+                connection.thread = threading.Thread(target=connection.serve, daemon=True)
+                with self.lock:
+                    self._connections.add(connection)
+                connection.thread.start()
+        finally:
+            self._stopping.set()
+            self._server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            # Koniec czytania żądań; wysłane już odpowiedzi zdążą wyjść
+            with self.lock:
+                connections = list(self._connections)
+            for connection in connections:
+                try:
+                    connection.sock.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass
+            for connection in connections:
+                connection.thread.join(SHUTDOWN_TIMEOUT)
+            self.manager.export_json_if_changed()
+
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def stop(self):
+        self._stopping.set()
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._server.close()
+
+    def disconnected(self, connection):
+        with self.lock:
+            self._connections.discard(connection)
+
+    # Zmiany zrobione poza usługą (CLI, ręczna edycja) też trafiają do subskrybentów
+    def _poll_store(self):
+        while not self._stopping.wait(POLL_SECONDS):
+            with self.lock:
+                try:
+                    self.manager.store.reload_if_changed()
+                except KeyStoreError:
+                    continue
+
+    def _store_changed(self, event, record, row):
+        message = {'event': event}
+        if record is not None:
+            message['record'] = record
+            message['row'] = row
+        elif event == 'reset':
+            message['records'] = self.manager.store.all()
+        for connection in list(self._connections):
+            if connection.subscribed:
+                connection.send(message)
+
+    # --- żądania ---
+
+    def handle(self, connection, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            method = self.methods.get(request.get('method'))
+            if method is None:
+                raise DaemonError(f"Nieznana metoda: {request.get('method')}")
+            params = request.get('params') or {}
+            with span('daemon_request', method=request['method']):
+                if method == self.subscribe:
+                    result = method(connection)
+                else:
+                    result = method(**params)
+            return {'id': request_id, 'result': result}
+        except (KeyManagerError, DaemonError, KeyStoreError, KeyError, ValueError, TypeError, OSError) as e:
+            return {'id': request_id, 'error': {'type': type(e).__name__, 'message': str(e)}}
+        except Exception as e:
+            # Nieprzewidziany błąd (np. sqlite3.Error) kończy tylko to żądanie -
+            # połączenie i czekające na nim żądania działają dalej
+            return {'id': request_id, 'error': {'type': type(e).__name__, 'message': f"Błąd wewnętrzny usługi: {e}"}}
+
+    def ping(self):
+        return {'version': PROTOCOL_VERSION, 'pid': os.getpid(), 'base_dir': self.manager.base_dir}
+
+    # Od tej chwili połączenie dostaje zdarzenia magazynu. Zwraca stan
+    # startowy - klient buduje z niego kopię, którą potem poprawiają zdarzenia.
+    def subscribe(self, connection):
+        with self.lock:
+            self.manager.store.reload_if_changed()
+            connection.subscribed = True
+            return {
+                'records': self.manager.store.all(),
+                'base_dir': self.manager.base_dir,
+                'keys_dir': self.manager.keys_dir,
+                'config_dir': self.manager.config_dir,
+                'trace_log_path': self.manager.trace_log_path,
+                'store_warning': self.manager.store_warning,
+            }
+
+    def list(self):
+        with self.lock:
+            return self.manager.list_keys()
+
+    def get(self, alias):
+        with self.lock:
+            return self.manager.get(alias)
+
+    def find(self, fingerprint):
+        with self.lock:
+            return self.manager.find_by_fingerprint(fingerprint)
+
+    def generate(self, email, host, alias, engine=None):
+        with self.lock:
+            key_path = self.manager.prepare_key(email, host, alias)
+            self.manager.pending_aliases.add(alias)
+        try:
+            generate_key(email, key_path, engine)
+        except RuntimeError as e:
+            raise KeyManagerError(str(e))
+        finally:
+            with self.lock:
+                self.manager.pending_aliases.discard(alias)
+        with self.lock:
+            return self.manager.register_key(email, host, alias)
+
+    # Klient sam wygenerował pliki klucza (np. GUI w wątku roboczym)
+    def register(self, email, host, alias):
+        with self.lock:
+            return self.manager.register_key(email, host, alias)
+
+    def validate_manifest(self, rows, taken_aliases=()):
+        with self.lock:
+            self.manager.store.reload_if_changed()
+            pending = self.manager.pending_aliases | set(taken_aliases)
+            valid, errors = validate_manifest(rows, self.manager.store, self.manager.keys_dir, pending)
+            return {'valid': valid, 'errors': errors}
+
+    def commit(self, rows):
+        with self.lock:
+            return self.manager.commit_manifest_keys(rows)
+
+    def delete(self, aliases, remove_files=True):
+        with self.lock:
+            deleted, missing = self.manager.delete_aliases(aliases, remove_files=False)
+        if remove_files:
+            remove_key_files(deleted)
+        return {'deleted': deleted, 'missing': missing}
+
+    def delete_all(self):
+        with self.lock:
+            return self.manager.delete_all()
+
+    def undo_delete_all(self, trash_path):
+        with self.lock:
+            return self.manager.undo_delete_all(trash_path)
+
+    def purge_trash(self, trash_path=None):
+        return self.manager.purge_trash(trash_path)
+
+    def config(self):
+        with self.lock:
+            return self.manager.config_text()
+
+    def keys_json(self):
+        with self.lock:
+            return self.manager.current_keys_json()
+
+    # Z digest (z podglądu) plan jest wykonywany tylko wtedy, gdy liczony
+    # od nowa jest taki sam jak ten, który użytkownik zobaczył
+    def sync(self, aliases=None, dest_dir=None, dry_run=False, digest=None):
+        with self.lock:
+            plan = self.manager.plan_sync(aliases, dest_dir)
+            result = _plan_to_dict(plan)
+            if digest is not None and result['digest'] != digest:
+                raise KeyManagerError("Stan kluczy albo ~/.ssh zmienił się od podglądu - sprawdź plan synchronizacji jeszcze raz.")
+            result['applied'] = 0
+            if not dry_run and not plan.empty():
+                result['applied'] = self.manager.apply_sync(plan)
+            return result
+
+    def check(self):
+        with self.lock:
+            return self.manager.check_keys()
+
+    def fsck(self):
+        with self.lock:
+            return _fsck_to_dict(self.manager.fsck())
+
+    # Plan liczony od nowa - stan mógł się zmienić od czasu "fsck"
+    def repair(self):
+        with self.lock:
+            report = self.manager.fsck()
+            repaired = self.manager.repair(report) if report.repairable() else 0
+            result = _fsck_to_dict(report)
+            result['repaired'] = repaired
+            return result
+
+    # Rotacja jak import manifestu: klient generuje pliki, usługa zapisuje
+    def plan_rotation(self, max_age_days, limit=None, exclude=()):
+        with self.lock:
+            return self.manager.plan_rotation(max_age_days, limit, set(exclude))
+
+    def commit_rotation(self, rows):
+        with self.lock:
+            return self.manager.commit_rotation(rows)
+
+    def purge_rotated(self, grace_days=None):
+        if grace_days is None:
+            return self.manager.purge_rotated()
+        return self.manager.purge_rotated(grace_days)
+
+    # Samo zatrzymanie robi połączenie, które wysłało żądanie, po odpowiedzi
+    def shutdown(self):
+        self._stopping.set()
+        return True
+
@@ -0,0 +1,153 @@
+import os
+import json
+import socket
+import itertools
+import threading
+from concurrent.futures import Future
+
+
+# Klient usługi z daemon.py - bez zależności od reszty aplikacji, do
+# skryptów automatyzujących:
+#
+#   with DaemonClient('/opt/sshgen/sshgen.sock') as client:
+#       client.generate('jan@firma.pl', 'github.com', 'jan')
+#       records = client.pipeline([('get', {'alias': a}) for a in aliases])
+#
+# Jedno połączenie można dzielić między wątki. Odpowiedzi czyta osobny
+# wątek i przypisuje je do żądań po id, więc kolejne żądania można wysyłać
+# bez czekania na poprzednie (submit / pipeline).
+
+SOCKET_NAME = 'sshgen.sock'
+
+
+class DaemonError(Exception):
+    def __init__(self, message, kind=None):
+        super().__init__(message)
+        # Nazwa wyjątku po stronie usługi, np. KeyManagerError
+        self.kind = kind
+
+
+def default_socket_path(base_dir):
+    return os.environ.get('SSHGEN_SOCKET') or os.path.join(base_dir, SOCKET_NAME)
+
+
+class DaemonClient:
+    # on_event(wiadomość) - zdarzenia magazynu po subscribe, wołane w wątku czytającym
+    def __init__(self, socket_path, on_event=None):
+        self.socket_path = socket_path
+        self.on_event = on_event
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(socket_path)
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+    # --- żądania ---
+
+    # Wysyła wiele żądań jednym zapisem; zwraca listę Future w tej samej kolejności
+    def submit_many(self, calls):
+        futures = []
+        lines = []
+        with self._lock:
+            if self._closed:
+                raise DaemonError("Połączenie z usługą jest zamknięte.")
+            for method, params in calls:
+                request_id = next(self._ids)
+                future = Future()
+                self._pending[request_id] = future
+                futures.append(future)
+                lines.append(json.dumps({'id': request_id, 'method': method, 'params': params or {}}, ensure_ascii=False))
+            try:
+                self._sock.sendall(('\n'.join(lines) + '\n').encode('utf-8'))
+            except OSError as e:
+                for future in futures:
+                    future.set_exception(DaemonError(f"Nie udało się wysłać żądania: {e}"))
+        return futures
+
+    def submit(self, method, **params):
+        return self.submit_many([(method, params)])[0]
+
+    def call(self, method, timeout=None, **params):
+        return self.submit(method, **params).result(timeout)
+
+    # Wyniki wszystkich wywołań; pierwszy błąd przerywa zbieranie wyników
+    def pipeline(self, calls, timeout=None):
+        return [future.result(timeout) for future in self.submit_many(calls)]
+
+    def _read(self):
+        try:
+            with self._sock.makefile('rb') as reader:
+                for line in reader:
+                    message = json.loads(line)
+                    if 'event' in message:
+                        if self.on_event is not None:
+                            self.on_event(message)
+                        continue
+                    with self._lock:
+                        future = self._pending.pop(message.get('id'), None)
+                    if future is None:
+                        continue
+                    if 'error' in message:
+                        error = message['error']
+                        future.set_exception(DaemonError(error.get('message', ''), error.get('type')))
+                    else:
+                        future.set_result(message.get('result'))
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._closed = True
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(DaemonError("Połączenie z usługą zostało zamknięte."))
+
+    # --- skróty ---
+
+    def ping(self):
+        return self.call('ping')
+
+    def generate(self, email, host, alias, engine=None):
+        return self.call('generate', email=email, host=host, alias=alias, engine=engine)
+
+    def get(self, alias):
+        return self.call('get', alias=alias)
+
+    def find(self, fingerprint):
+        return self.call('find', fingerprint=fingerprint)
+
+    def list_keys(self):
+        return self.call('list')
+
+    def delete(self, aliases, remove_files=True):
+        result = self.call('delete', aliases=list(aliases), remove_files=remove_files)
+        return result['deleted'], result['missing']
+
+    def sync(self, aliases=None, dest_dir=None, dry_run=False):
+        return self.call('sync', aliases=aliases, dest_dir=dest_dir, dry_run=dry_run)
+
+
+# Klient, jeśli usługa dla tego katalogu działa, inaczej None
+def connect(base_dir, socket_path=None, on_event=None):
+    try:
+        return DaemonClient(socket_path or default_socket_path(base_dir), on_event)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
@@ -0,0 +1,78 @@
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTreeWidget, QTreeWidgetItem, QFileDialog, QLabel
+
+import tracing
+
+
+# Panel diagnostyczny: najwolniejsze z ostatnich operacji z rozbiciem na
+# kroki (wczytanie JSON, ssh-keygen, zapis configu, kopiowanie...).
+# Dane z modułu tracing - ten sam zapis trafia do logs/operations.log.
+
+COLUMNS = ("Operacja", "Czas [ms]", "Odczyt [B]", "Zapis [B]", "Pliki", "Start")
+
+
+def _files(counters):
+    return sum(value for key, value in counters.items() if key.startswith('files_'))
+
+
+def _item(data):
+    counters = data.get('counters', {})
+    name = data['name']
+    if 'attrs' in data:
+        name += " (" + ", ".join(f"{key}={value}" for key, value in data['attrs'].items()) + ")"
+    if 'error' in data:
+        name += f" - {data['error']}"
+    item = QTreeWidgetItem([
+        name,
+        f"{data['duration_ms']:.1f}",
+        str(counters.get('bytes_read', '')),
+        str(counters.get('bytes_written', '')),
+        str(_files(counters) or ''),
+        data['start'],
+    ])
+    for step in data.get('steps', ()):
+        item.addChild(_item(step))
+    return item
+
+
+class DebugPanel(QDialog):
+    def __init__(self, log_path=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostyka")
+        self.resize(800, 400)
+
+        layout = QVBoxLayout(self)
+        if log_path:
+            layout.addWidget(QLabel(f"Dziennik operacji: {log_path}"))
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(COLUMNS)
+        layout.addWidget(self.tree)
+
+        buttons = QHBoxLayout()
+        refresh_button = QPushButton("Odśwież")
+        refresh_button.clicked.connect(self.refresh)
+        buttons.addWidget(refresh_button)
+        metrics_button = QPushButton("Zapisz metryki")
+        metrics_button.clicked.connect(self.save_metrics)
+        buttons.addWidget(metrics_button)
+        clear_button = QPushButton("Wyczyść")
+        clear_button.clicked.connect(self.clear)
+        buttons.addWidget(clear_button)
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self):
+        self.tree.clear()
+        for data in tracing.slowest(50):
+            self.tree.addTopLevelItem(_item(data))
+        self.tree.resizeColumnToContents(0)
+
+    def save_metrics(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Zapisz metryki", "metrics.prom", "Prometheus (*.prom *.txt)")
+        if path:
+            tracing.write_metrics(path)
+
+    def clear(self):
+        tracing.reset()
+        self.refresh()
@@ -0,0 +1,84 @@
+import os
+
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer
+
+
+# Obserwuje pliki magazynu metadanych, katalog kluczy i fragmenty configu,
+# żeby zmiany z innej instancji, skryptu albo ręcznej edycji od razu
+# trafiały do tabeli i pamięci podręcznych menedżera. Seria zdarzeń (zapis
+# atomowy to kilka zdarzeń katalogu) zwija się w jedno odświeżenie po
+# DEBOUNCE_MS.
+#
+# Magazyn: store.reload_if_changed() - własne zapisy aplikacji nie zmieniają
+# sygnatury pliku zapamiętanej przez magazyn, więc nic się nie dzieje,
+# a cudze zmiany trafiają do modelu jako pojedyncze wiersze.
+# keys/: indeks odcisków dopisuje nowe i zapomina usunięte pliki .pub.
+# config.d: fragmenty są oznaczane jako zmienione, a następny odczyt
+# configu wczytuje ponownie tylko zmienione pliki. Dopóki nic się nie
+# zmieni, odczyt configu nie robi nawet stat fragmentów.
+#
+# Klient usługi (remote_manager) nie ma własnych pamięci podręcznych plików
+# - katalogi obserwuje wtedy usługa.
+
+DEBOUNCE_MS = 250
+
+
+class StoreWatcher(QObject):
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self._store_dirty = False
+        self._keys_dirty = False
+        self._config_dirty = False
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self._flush)
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._path_changed)
+        self._watcher.directoryChanged.connect(self._path_changed)
+        self._store_paths = {os.path.abspath(path) for path in manager.store.watched_paths()}
+        self._store_dirs = {os.path.dirname(path) for path in self._store_paths}
+        self._dirs = set()
+        self._keys_dir = self._config_dir = None
+        if hasattr(manager, 'fragments'):
+            self._keys_dir = os.path.abspath(manager.keys_dir)
+            self._config_dir = os.path.abspath(manager.config_dir)
+            self._dirs = {self._keys_dir, self._config_dir}
+            manager.fragments.watched = True
+        self._watch()
+
+    # Zapis atomowy (rename) zdejmuje plik z obserwacji - po każdej serii
+    # zdarzeń dopinamy ścieżki, które znowu istnieją. Zwraca dopięte ścieżki.
+    def _watch(self):
+        wanted = self._store_paths | self._store_dirs | self._dirs
+        watched = set(self._watcher.files()) | set(self._watcher.directories())
+        missing = [path for path in wanted - watched if os.path.exists(path)]
+        if missing:
+            self._watcher.addPaths(missing)
+        return missing
+
+    def _path_changed(self, path):
+        if path in self._store_paths or path in self._store_dirs:
+            self._store_dirty = True
+        if path == self._keys_dir:
+            self._keys_dirty = True
+        if path == self._config_dir:
+            self._config_dirty = True
+        self._timer.start()
+
+    def _flush(self):
+        # config.d powstał albo został podmieniony - zmian w nim nie widzieliśmy
+        if self._config_dir in self._watch():
+            self._config_dirty = True
+        if self._store_dirty:
+            self._store_dirty = False
+            self.manager.store.reload_if_changed()
+        if self._config_dirty:
+            self._config_dirty = False
+            self.manager.fragments.changed()
+        if self._keys_dirty:
+            self._keys_dirty = False
+            self.manager.fingerprints.refresh_listing()
@@ -0,0 +1,299 @@
+import os
+import json
+import base64
+import struct
+import hashlib
+import binascii
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from key_store import write_json_atomic
+from tracing import span, count
+
+
+# Odciski kluczy publicznych (SHA256:..., jak `ssh-keygen -l`) liczone
+# z plików .pub w procesie, bez uruchamiania ssh-keygen dla każdego klucza.
+#
+# FingerprintIndex trzyma odcisk każdego pliku .pub z katalogu kluczy
+# razem z jego sygnaturą (i-węzeł, mtime, rozmiar); przy ponownym
+# skanowaniu czytane są tylko pliki, których sygnatura się zmieniła.
+# Indeks zapisuje się do pliku, więc następne uruchomienie też nie musi
+# czytać wszystkiego od nowa.
+
+CACHE_VERSION = 1
+SCAN_CHUNK = 512
+
+
+def fingerprint_of_blob(blob):
+    digest = hashlib.sha256(blob).digest()
+    return "SHA256:" + base64.b64encode(digest).decode('ascii').rstrip('=')
+
+
+# (odcisk, typ klucza, komentarz) z linii "typ base64 [komentarz]";
+# ValueError, jeśli to nie jest klucz publiczny OpenSSH
+def parse_public_key(line):
+    parts = line.strip().split(None, 2)
+    if len(parts) < 2:
+        raise ValueError("to nie jest klucz publiczny OpenSSH")
+    key_type, data = parts[0], parts[1]
+    try:
+        blob = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("niepoprawne base64")
+    # Blob zaczyna się od nazwy typu - ta sama co w pierwszym polu linii
+    if len(blob) < 4:
+        raise ValueError("za krótki klucz")
+    (name_length,) = struct.unpack('>I', blob[:4])
+    if blob[4:4 + name_length].decode('ascii', 'replace') != key_type:
+        raise ValueError("typ klucza nie zgadza się z zawartością")
+    return fingerprint_of_blob(blob), key_type, parts[2] if len(parts) > 2 else ''
+
+
+def public_key_fingerprint(pub_path):
+    with open(pub_path, 'r') as f:
+        return parse_public_key(f.readline())[0]
+
+
+def _signature(st):
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+class FingerprintIndex:
+    def __init__(self, keys_dir, cache_path=None, workers=8):
+        self.keys_dir = keys_dir
+        self.cache_path = cache_path
+        self.workers = workers
+        # nazwa pliku .pub -> [i-węzeł, mtime, rozmiar, odcisk albo None, typ, komentarz/błąd]
+        self._entries = {}
+        self._by_fingerprint = {}
+        # Nazwy wszystkich plików z ostatniego skanu (też kluczy prywatnych)
+        self._names = set()
+        self._scanned = False
+        self._lock = threading.Lock()
+        self._load_cache()
+
+    # --- pamięć podręczna na dysku ---
+
+    def _load_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get('version') != CACHE_VERSION:
+            return
+        self._entries = data.get('entries', {})
+        self._reindex()
+
+    def save(self):
+        if self.cache_path:
+            with self._lock:
+                entries = dict(self._entries)
+            write_json_atomic(self.cache_path, {'version': CACHE_VERSION, 'entries': entries}, indent=None)
+
+    def _reindex(self):
+        self._by_fingerprint = {}
+        for name, entry in self._entries.items():
+            if entry[3] is not None:
+                self._by_fingerprint.setdefault(entry[3], set()).add(name)
+
+    # --- aktualizacja ---
+
+    def _read_entry(self, name, st):
+        path = os.path.join(self.keys_dir, name)
+        try:
+            with open(path, 'r', errors='replace') as f:
+                line = f.readline()
+            fingerprint, key_type, comment = parse_public_key(line)
+            return _signature(st) + [fingerprint, key_type, comment]
+        except ValueError as e:
+            return _signature(st) + [None, None, str(e)]
+
+    # Jeden fragment listy plików: stat każdego i odczyt tylko zmienionych .pub
+    def _scan_chunk(self, names):
+        results = []
+        reads = 0
+        for name in names:
+            if not name.endswith('.pub'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.keys_dir, name))
+            except FileNotFoundError:
+                continue
+            cached = self._entries.get(name)
+            if cached is not None and cached[:3] == _signature(st):
+                results.append((name, cached))
+                continue
+            try:
+                results.append((name, self._read_entry(name, st)))
+                reads += 1
+            except FileNotFoundError:
+                continue
+        return results, reads
+
+    # Pełny, równoległy przegląd katalogu kluczy; zwraca liczbę wczytanych plików
+    def scan(self):
+        with span('fingerprint_scan'):
+            try:
+                names = os.listdir(self.keys_dir)
+            except FileNotFoundError:
+                names = []
+            chunks = [names[i:i + SCAN_CHUNK] for i in range(0, len(names), SCAN_CHUNK)]
+            entries = {}
+            reads = 0
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for results, chunk_reads in executor.map(self._scan_chunk, chunks):
+                    entries.update(results)
+                    reads += chunk_reads
+            count('files_read', reads)
+
+            with self._lock:
+                changed = reads or entries.keys() != self._entries.keys()
+                self._entries = entries
+                self._names = set(names)
+                self._scanned = True
+                if changed:
+                    self._reindex()
+            if changed:
+                self.save()
+            return reads
+
+    def _ensure_scanned(self):
+        if not self._scanned:
+            self.scan()
+
+    # Po podmianie całego katalogu (delete_all, cofnięcie) - następny
+    # odczyt przeskanuje go od nowa, sygnatury odrzucą nieaktualne wpisy
+    def invalidate(self):
+        with self._lock:
+            self._scanned = False
+
+    # Pojedynczy plik po wygenerowaniu klucza - bez skanowania katalogu
+    def update(self, pub_path):
+        name = os.path.basename(pub_path)
+        entry = self._read_entry(name, os.stat(pub_path))
+        with self._lock:
+            self.forget(pub_path, lock=False)
+            self._entries[name] = entry
+            self._names.update((name, name[:-len('.pub')]))
+            if entry[3] is not None:
+                self._by_fingerprint.setdefault(entry[3], set()).add(name)
+        return entry[3]
+
+    # Zmiana katalogu zgłoszona przez file_watcher: listdir bez stat, odczyt
+    # tylko nowych plików .pub i zapomnienie usuniętych. Plik podmieniony
+    # pod tą samą nazwą wychwyci dopiero pełny skan (check, fsck).
+    def refresh_listing(self):
+        if not self._scanned:
+            return
+        try:
+            names = set(os.listdir(self.keys_dir))
+        except FileNotFoundError:
+            names = set()
+        with self._lock:
+            added = names - self._names
+            removed = self._names - names
+        for name in removed:
+            if name.endswith('.pub'):
+                self.forget(os.path.join(self.keys_dir, name))
+        for name in added:
+            if name.endswith('.pub'):
+                try:
+                    self.update(os.path.join(self.keys_dir, name))
+                except FileNotFoundError:
+                    names.discard(name)
+        with self._lock:
+            self._names = names
+        count('files_read', sum(1 for name in added if name.endswith('.pub')))
+
+    def forget(self, pub_path, lock=True):
+        name = os.path.basename(pub_path)
+        if lock:
+            with self._lock:
+                return self.forget(pub_path, lock=False)
+        entry = self._entries.pop(name, None)
+        self._names.discard(name)
+        self._names.discard(name[:-len('.pub')])
+        if entry is not None and entry[3] is not None:
+            names = self._by_fingerprint.get(entry[3])
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._by_fingerprint[entry[3]]
+
+    # --- odczyt ---
+
+    # Ścieżki plików .pub z danym odciskiem (słownik - stały czas)
+    def find(self, fingerprint):
+        self._ensure_scanned()
+        with self._lock:
+            names = sorted(self._by_fingerprint.get(fingerprint, ()))
+        return [os.path.join(self.keys_dir, name) for name in names]
+
+    # Nazwy wszystkich plików z ostatniego skanu katalogu kluczy
+    def names(self):
+        self._ensure_scanned()
+        with self._lock:
+            return set(self._names)
+
+    def fingerprint(self, pub_path):
+        self._ensure_scanned()
+        entry = self._entries.get(os.path.basename(pub_path))
+        return entry[3] if entry is not None else None
+
+    # Odcisk -> nazwy plików .pub, dla kluczy zapisanych w kilku plikach
+    def duplicates(self):
+        self._ensure_scanned()
+        with self._lock:
+            return {fingerprint: sorted(names) for fingerprint, names in self._by_fingerprint.items() if len(names) > 1}
+
+    # (nazwa, błąd) plików .pub, których nie da się odczytać
+    def invalid(self):
+        self._ensure_scanned()
+        with self._lock:
+            return sorted((name, entry[5]) for name, entry in self._entries.items() if entry[3] is None)
+
+    # Czy plik istnieje według ostatniego skanu; ścieżki spoza katalogu
+    # kluczy sprawdzane są na dysku
+    def exists(self, path, names=None):
+        prefix = os.path.join(self.keys_dir, '')
+        name = path[len(prefix):]
+        if path.startswith(prefix) and os.sep not in name:
+            return name in (names if names is not None else self._names)
+        return os.path.exists(path)
+
+    # Po świeżym skanie: duplikaty kluczy publicznych, pliki .pub bez
+    # metadanych, metadane wskazujące nieistniejące pliki i nieczytelne .pub
+    def check(self, records):
+        self.scan()
+        names = self.names()
+        known_pubs = set()
+        missing = []
+        for record in records:
+            key_path = record['key_path']
+            for path in (key_path, f"{key_path}.pub"):
+                if not self.exists(path, names):
+                    missing.append((record['alias'], path))
+            known_pubs.add(os.path.basename(key_path) + '.pub')
+
+        return {
+            'duplicates': self.duplicates(),
+            'orphans': sorted(name for name in names if name.endswith('.pub') and name not in known_pubs),
+            'missing': missing,
+            'invalid': self.invalid(),
+        }
+
+
+def format_check(report):
+    lines = []
+    for fingerprint, names in sorted(report['duplicates'].items()):
+        lines.append(f"duplikat {fingerprint}: {', '.join(names)}")
+    for name in report['orphans']:
+        lines.append(f"bez metadanych: {name}")
+    for alias, path in report['missing']:
+        lines.append(f"brak pliku: {path} (alias {alias})")
+    for name, error in report['invalid']:
+        lines.append(f"nieczytelny klucz publiczny: {name} ({error})")
+    return "\n".join(lines)
@@ -0,0 +1,394 @@
+import os
+import json
+import glob
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import openssh_keys
+from keygen import key_name_for, alias_for_key_name, host_alias_for, config_entry_for
+from config_fragments import FRAGMENT_SUFFIX
+from key_store import write_json_atomic
+from ssh_config import SshConfig, write_text_atomic
+from tracing import span, count
+
+
+# Sprawdzanie spójności trzech źródeł prawdy: metadanych (magazyn),
+# plików kluczy w keys/ i fragmentów configu (keys/config.d).
+#
+# plan_fsck tylko czyta: równoległy przegląd keys/ (FingerprintIndex) i
+# config.d (FragmentSummaries), oba z pamięcią podręczną po sygnaturze pliku,
+# więc przy kolejnych uruchomieniach czytane są tylko zmienione pliki, oraz
+# strumieniowe czytanie kopii uszkodzonych plików metadanych, z których da
+# się odzyskać wpisy zgubionych kluczy. Wynik to raport z listą problemów
+# i planem naprawy; apply_fsck wykonuje cały plan albo nic.
+
+# Pliki, które odkłada KeyManager, gdy magazyn nie daje się wczytać
+BROKEN_SUFFIX = '.uszkodzony-*'
+KEY_PREFIX = key_name_for('')
+CHUNK_SIZE = 1 << 16
+SCAN_CHUNK = 512
+SUMMARY_VERSION = 1
+
+
+# Rekordy z pliku keys.json (tablica) albo dziennika (linie JSON) czytane
+# kawałkami; przy uszkodzonym pliku zwraca wszystko do pierwszego błędu
+def iter_json_records(path):
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        buffer = f.read(CHUNK_SIZE)
+        eof = not buffer
+        stripped = buffer.lstrip()
+        journal = not stripped.startswith('[')
+        pos = len(buffer) - len(stripped) + (0 if journal else 1)
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    return
+                chunk = f.read(CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            # Obiekt tuż przy końcu bufora mógł zostać ucięty w środku liczby
+            if end == len(buffer) and not eof:
+                chunk = f.read(CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            pos = end
+            if journal:
+                if isinstance(value, dict) and value.get('op') == 'add':
+                    yield value['record']
+            elif isinstance(value, dict) and 'alias' in value:
+                yield value
+
+
+# HostName i IdentityFile bloku Host z każdego fragmentu configu.
+# Parsowany jest tylko fragment, którego (i-węzeł, mtime, rozmiar) się
+# zmienił; wyniki zapisują się do pliku między uruchomieniami.
+class FragmentSummaries:
+    def __init__(self, fragments, cache_path=None, workers=8):
+        self.fragments = fragments
+        self.cache_path = cache_path
+        self.workers = workers
+        # nazwa fragmentu -> [i-węzeł, mtime, rozmiar, HostName, IdentityFile]
+        self._entries = {}
+        if cache_path:
+            try:
+                with open(cache_path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == SUMMARY_VERSION:
+                    self._entries = data.get('entries', {})
+            except (FileNotFoundError, ValueError):
+                pass
+
+    def _summarize(self, name, st):
+        with open(os.path.join(self.fragments.path, name), 'r', errors='replace') as f:
+            config = SshConfig(f.read())
+        block = config.find(name[:-len(FRAGMENT_SUFFIX)])
+        if block is None:
+            return [st.st_ino, st.st_mtime_ns, st.st_size, None, None]
+        return [st.st_ino, st.st_mtime_ns, st.st_size, block.get('HostName'), block.get('IdentityFile')]
+
+    def _scan_chunk(self, names):
+        results = []
+        reads = 0
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.fragments.path, name))
+                cached = self._entries.get(name)
+                if cached is not None and cached[:3] == [st.st_ino, st.st_mtime_ns, st.st_size]:
+                    results.append((name, cached))
+                    continue
+                results.append((name, self._summarize(name, st)))
+                reads += 1
+            except FileNotFoundError:
+                continue
+        return results, reads
+
+    # wzorzec Host -> (HostName, IdentityFile); (None, None) dla fragmentu bez bloku
+    def scan(self):
+        with span('fragment_scan'):
+            try:
+                names = [name for name in os.listdir(self.fragments.path) if name.endswith(FRAGMENT_SUFFIX)]
+            except FileNotFoundError:
+                names = []
+            chunks = [names[i:i + SCAN_CHUNK] for i in range(0, len(names), SCAN_CHUNK)]
+            entries = {}
+            reads = 0
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for results, chunk_reads in executor.map(self._scan_chunk, chunks):
+                    entries.update(results)
+                    reads += chunk_reads
+            count('files_read', reads)
+
+            changed = reads or entries.keys() != self._entries.keys()
+            self._entries = entries
+            if changed and self.cache_path:
+                write_json_atomic(self.cache_path, {'version': SUMMARY_VERSION, 'entries': entries}, indent=None)
+            return {name[:-len(FRAGMENT_SUFFIX)]: (entry[3], entry[4]) for name, entry in entries.items()}
+
+
+class FsckProblem:
+    def __init__(self, kind, subject, message, repair=None):
+        self.kind = kind
+        self.subject = subject
+        self.message = message
+        # Opis naprawy albo None, gdy problem wymaga decyzji użytkownika
+        self.repair = repair
+
+    def describe(self):
+        line = f"{self.subject}: {self.message}"
+        if self.repair:
+            line += f" -> {self.repair}"
+        return line
+
+
+class FsckReport:
+    def __init__(self):
+        self.problems = []
+        # Plan naprawy
+        self.trash = []
+        self.fragment_removes = []
+        self.fragment_writes = []
+        self.pub_writes = []
+        self.store_removes = []
+        self.store_updates = []
+        self.store_adds = []
+
+    def add(self, kind, subject, message, repair=None):
+        self.problems.append(FsckProblem(kind, subject, message, repair))
+
+    def empty(self):
+        return not self.problems
+
+    def repairable(self):
+        return any(problem.repair for problem in self.problems)
+
+    def describe(self):
+        return "\n".join(problem.describe() for problem in self.problems)
+
+
+def _read_comment(pub_path):
+    try:
+        with open(pub_path, 'r', errors='replace') as f:
+            parts = f.readline().split(None, 2)
+    except FileNotFoundError:
+        return ''
+    return parts[2].strip() if len(parts) > 2 else ''
+
+
+def broken_copies(base_dir):
+    return sorted(glob.glob(os.path.join(glob.escape(base_dir), '*' + BROKEN_SUFFIX)))
+
+
+# Wpisy z uszkodzonych kopii metadanych, nowsze kopie mają pierwszeństwo
+def _recoverable_records(paths):
+    records = {}
+    for path in paths:
+        try:
+            for record in iter_json_records(path):
+                if isinstance(record.get('alias'), str) and isinstance(record.get('key_name'), str):
+                    records[record['alias']] = (record, path)
+        except OSError:
+            continue
+    return records
+
+
+def plan_fsck(records, keys_dir, summaries, fingerprints, backups=()):
+    with span('fsck_plan', keys=len(records)):
+        return _plan_fsck(records, keys_dir, summaries, fingerprints, backups)
+
+
+def _plan_fsck(records, keys_dir, summaries, fingerprints, backups):
+    report = FsckReport()
+    fingerprints.scan()
+    names = fingerprints.names()
+    blocks = summaries.scan()
+    recoverable = _recoverable_records(backups)
+
+    def exists(path):
+        return fingerprints.exists(path, names)
+
+    aliases = set()
+    expected_patterns = set()
+    known_key_names = set()
+
+    # Metadane -> pliki i bloki Host
+    for record in records:
+        alias = record['alias']
+        key_path = record['key_path']
+        pattern = host_alias_for(record['hostname'], alias)
+        aliases.add(alias)
+        expected_patterns.add(pattern)
+        known_key_names.add(record['key_name'])
+        # Poprawki wpisu (ścieżka, odcisk) - jedna aktualizacja na rekord
+        fixed = record
+
+        # Katalog aplikacji przeniesiony (albo keys.json z innej maszyny):
+        # klucz leży w keys/ pod swoją nazwą, nieaktualna jest tylko ścieżka
+        local_path = os.path.join(keys_dir, record['key_name'])
+        if not exists(key_path) and local_path != key_path and exists(local_path):
+            report.add('moved_key', alias, f"brak pliku klucza {key_path}, klucz jest w {local_path}", "popraw ścieżkę klucza")
+            fixed = dict(fixed, key_path=local_path)
+            key_path = local_path
+        pub_path = f"{key_path}.pub"
+
+        if not exists(key_path):
+            report.add('missing_key', alias, f"brak pliku klucza {key_path}", "usuń wpis i blok Host")
+            report.store_removes.append(alias)
+            if pattern in blocks:
+                report.fragment_removes.append(pattern)
+            if exists(pub_path):
+                report.trash.append(pub_path)
+            continue
+
+        if not exists(pub_path):
+            try:
+                line = openssh_keys.public_key_line_from_private(key_path, record['email'])
+                report.add('missing_pub', alias, f"brak pliku {pub_path}", "odtwórz z klucza prywatnego")
+                report.pub_writes.append((pub_path, line))
+            except (OSError, ValueError) as e:
+                report.add('missing_pub', alias, f"brak pliku {pub_path}, nie da się go odtworzyć: {e}")
+        elif record.get('fingerprint'):
+            fingerprint = fingerprints.fingerprint(pub_path)
+            if fingerprint and fingerprint != record['fingerprint']:
+                report.add('fingerprint', alias, f"odcisk {pub_path} ({fingerprint}) różni się od zapisanego", "zapisz aktualny odcisk")
+                fixed = dict(fixed, fingerprint=fingerprint)
+        if fixed is not record:
+            report.store_updates.append(fixed)
+
+        expected_pattern, expected_options = config_entry_for(record['hostname'], alias, record['key_name'])
+        block = blocks.get(pattern)
+        if block is None:
+            report.add('missing_block', alias, f"brak bloku Host {pattern}", "dopisz blok Host")
+            report.fragment_writes.append((expected_pattern, expected_options))
+        elif block != (record['hostname'], dict(expected_options)['IdentityFile']):
+            report.add('stale_block', alias, f"blok Host {pattern} wskazuje inny klucz albo host", "popraw blok Host")
+            report.fragment_writes.append((expected_pattern, expected_options))
+
+    # Bloki Host bez metadanych - pozostałość po przerwanym generowaniu albo usuwaniu
+    for pattern, (hostname, identity) in sorted(blocks.items()):
+        if pattern in expected_patterns:
+            continue
+        key_name = os.path.basename(identity or '')
+        alias = alias_for_key_name(key_name)
+        if (key_name.startswith(KEY_PREFIX) and key_name not in known_key_names and key_name in names
+                and alias not in aliases and hostname and host_alias_for(hostname, alias) == pattern):
+            record = _recover_record(alias, key_name, hostname, keys_dir, fingerprints, recoverable)
+            report.add('orphan_block', pattern, f"blok Host i klucz {key_name} bez metadanych", "odtwórz wpis")
+            report.store_adds.append(record)
+            aliases.add(alias)
+            known_key_names.add(key_name)
+            continue
+        report.add('orphan_block', pattern, "blok Host bez klucza w metadanych", "usuń blok Host")
+        report.fragment_removes.append(pattern)
+
+    # Pliki kluczy bez metadanych i bez bloku Host
+    orphans = {}
+    for name in names:
+        base = name[:-len('.pub')] if name.endswith('.pub') else name
+        if base.startswith(KEY_PREFIX) and base not in known_key_names:
+            orphans.setdefault(base, []).append(name)
+    for key_name, files in sorted(orphans.items()):
+        alias = alias_for_key_name(key_name)
+        found = recoverable.get(alias)
+        if found is not None and found[0]['key_name'] == key_name and key_name in names and alias not in aliases:
+            record = _recover_record(alias, key_name, found[0]['hostname'], keys_dir, fingerprints, recoverable)
+            report.add('orphan_key', key_name, "klucz bez metadanych i bloku Host", f"odtwórz wpis z {os.path.basename(found[1])}")
+            report.store_adds.append(record)
+            report.fragment_writes.append(config_entry_for(record['hostname'], alias, key_name))
+            aliases.add(alias)
+            continue
+        report.add('orphan_key', key_name, f"pliki bez metadanych: {', '.join(sorted(files))}", "przenieś do kosza")
+        report.trash += [os.path.join(keys_dir, name) for name in sorted(files)]
+
+    for fingerprint, paths in sorted(fingerprints.duplicates().items()):
+        report.add('duplicate', ', '.join(paths), f"ten sam klucz publiczny ({fingerprint})")
+    for name, error in fingerprints.invalid():
+        report.add('invalid_pub', name, f"nieczytelny klucz publiczny ({error})")
+
+    count('problems', len(report.problems))
+    return report
+
+
+# Wpis dla klucza, który ma pliki (i może blok Host), ale zgubił metadane:
+# z uszkodzonej kopii metadanych, jeśli tam jest, inaczej z pliku .pub
+def _recover_record(alias, key_name, hostname, keys_dir, fingerprints, recoverable):
+    key_path = os.path.join(keys_dir, key_name)
+    found = recoverable.get(alias)
+    if found is not None and found[0]['key_name'] == key_name:
+        record = dict(found[0], key_path=key_path, hostname=hostname)
+    else:
+        record = {
+            "key_name": key_name,
+            "email": _read_comment(f"{key_path}.pub"),
+            "hostname": hostname,
+            "alias": alias,
+            "key_path": key_path,
+            "created": datetime.fromtimestamp(os.path.getmtime(key_path)).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    fingerprint = fingerprints.fingerprint(f"{key_path}.pub")
+    if fingerprint:
+        record['fingerprint'] = fingerprint
+    else:
+        record.pop('fingerprint', None)
+    return record
+
+
+# Wykonuje cały plan naprawy albo nic: pliki do usunięcia trafiają do
+# kosza, nadpisywane fragmenty są zapamiętywane, a metadane zmieniane są
+# na końcu jednym batch(). Przy błędzie wszystko wraca na miejsce.
+# Zwraca liczbę naprawionych problemów.
+def apply_fsck(report, store, fragments, trash_dir):
+    with span('fsck_repair', problems=len(report.problems)):
+        trash_path = os.path.join(trash_dir, 'fsck-' + datetime.now().strftime('%Y%m%d%H%M%S%f'))
+        moved = []
+        written = []
+        try:
+            for path in report.trash + [fragments.fragment_path(pattern) for pattern in report.fragment_removes]:
+                dest = os.path.join(trash_path, os.path.relpath(path, os.path.dirname(os.path.dirname(path))))
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.replace(path, dest)
+                moved.append((path, dest))
+            count('files_removed', len(moved))
+
+            for pattern, options in report.fragment_writes:
+                path = fragments.fragment_path(pattern)
+                try:
+                    with open(path, 'r', newline='') as f:
+                        previous = f.read()
+                except FileNotFoundError:
+                    previous = None
+                if fragments.write(pattern, options):
+                    written.append((path, previous))
+
+            for pub_path, line in report.pub_writes:
+                fd = os.open(pub_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(line)
+                written.append((pub_path, None))
+
+            with store.batch():
+                store.remove_many(report.store_removes)
+                for record in report.store_updates:
+                    store.update(record)
+                for record in report.store_adds:
+                    store.add(record)
+        except BaseException:
+            for path, previous in reversed(written):
+                if previous is None:
+                    os.remove(path)
+                else:
+                    write_text_atomic(path, previous)
+            for path, dest in reversed(moved):
+                os.replace(dest, path)
+            raise
+        return sum(1 for problem in report.problems if problem.repair)
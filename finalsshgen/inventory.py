@@ -0,0 +1,343 @@
+import os
+import io
+import gzip
+import json
+import time
+import zlib
+import tarfile
+
+from keygen import key_name_for, config_entry_for, write_config_entries
+from tracing import span, count
+
+
+# Strumieniowy eksport i import spisu kluczy - kopia zapasowa albo
+# przeniesienie na inną maszynę bez ręcznego kopiowania keys.json i keys/.
+#
+# Format podstawowy to JSON Lines: jeden rekord w linii, więc ani eksport,
+# ani import nie trzyma całej listy w pamięci. Z plikami kluczy powstaje
+# strumień tar (opcjonalnie gzip), w którym po każdym rekordzie
+# records/<nazwa klucza>.json idą jego pliki keys/<nazwa klucza>[.pub].
+#
+# Import zapisuje rekordy paczkami po chunk_size: fragmenty configu i jedna
+# transakcja magazynu (batch()) na paczkę. Magazyn, który przy każdym zapisie
+# przepisuje cały plik (keys.json), dostaje paczki tylko do pamięci, a plik
+# jest zapisywany raz na końcu - także po błędzie, żeby zatwierdzone paczki
+# nie przepadły. Aliasy, które już istnieją, są pomijane, a pliki kluczy
+# nigdy nie są nadpisywane.
+
+# key_path jest zawsze ustawiany na nowo - katalog kluczy bywa gdzie indziej
+REQUIRED_FIELDS = ('key_name', 'email', 'hostname', 'alias', 'created')
+CHUNK_SIZE = 500
+RECORDS_PREFIX = 'records/'
+KEYS_PREFIX = 'keys/'
+KEY_PREFIX = key_name_for('')
+
+
+class InventoryError(Exception):
+    pass
+
+
+# Liczniki jednego eksportu/importu z przepustowością w rekordach na sekundę
+class TransferStats:
+    def __init__(self):
+        self.records = 0
+        self.skipped = 0
+        self.files = 0
+        self.bytes = 0
+        # (alias albo nazwa, opis)
+        self.errors = []
+        self._start = time.perf_counter()
+        self.seconds = 0.0
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._start
+        return self
+
+    def rate(self):
+        seconds = self.seconds or (time.perf_counter() - self._start)
+        return self.records / seconds if seconds > 0 else 0.0
+
+    def describe(self, verb):
+        text = f"{verb} rekordów: {self.records} w {self.seconds:.2f} s ({self.rate():.0f} rek./s)"
+        if self.files:
+            text += f", plików kluczy: {self.files}"
+        if self.skipped:
+            text += f", pominięto istniejących: {self.skipped}"
+        return text
+
+    def format_errors(self, limit=50):
+        lines = [f"{subject}: {message}" for subject, message in self.errors[:limit]]
+        if len(self.errors) > limit:
+            lines.append(f"... i {len(self.errors) - limit} kolejnych")
+        return "\n".join(lines)
+
+
+# --- eksport ---
+
+def _record_line(record):
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+# Rekordy magazynu do strumienia binarnego out: JSON Lines albo z plikami
+# kluczy tar. progress(wyeksportowane) co CHUNK_SIZE rekordów.
+def export_inventory(store, out, with_keys=False, compress=False, progress=None):
+    stats = TransferStats()
+    with span('export_inventory', with_keys=with_keys):
+        if with_keys:
+            with tarfile.open(fileobj=out, mode='w|gz' if compress else 'w|') as tar:
+                for record in store:
+                    _export_record(tar, record, stats)
+                    tar.members = []
+                    if progress is not None and stats.records % CHUNK_SIZE == 0:
+                        progress(stats.records)
+        else:
+            target = gzip.GzipFile(fileobj=out, mode='wb') if compress else out
+            try:
+                for record in store:
+                    line = _record_line(record)
+                    target.write(line)
+                    stats.records += 1
+                    stats.bytes += len(line)
+                    if progress is not None and stats.records % CHUNK_SIZE == 0:
+                        progress(stats.records)
+            finally:
+                if compress:
+                    target.close()
+        count('bytes_written', stats.bytes)
+        count('records', stats.records)
+    return stats.finish()
+
+
+def _export_record(tar, record, stats):
+    data = json.dumps(record, ensure_ascii=False).encode('utf-8')
+    info = tarfile.TarInfo(f"{RECORDS_PREFIX}{record['key_name']}.json")
+    info.size = len(data)
+    info.mtime = int(time.time())
+    info.mode = 0o600
+    tar.addfile(info, io.BytesIO(data))
+    stats.bytes += len(data)
+    for path in (record['key_path'], f"{record['key_path']}.pub"):
+        try:
+            tar.add(path, arcname=KEYS_PREFIX + os.path.basename(path), recursive=False)
+        except FileNotFoundError:
+            stats.errors.append((record['alias'], f"brak pliku {path}"))
+            continue
+        stats.files += 1
+        stats.bytes += os.path.getsize(path)
+    stats.records += 1
+
+
+# --- import ---
+
+# Strumień wejściowy: gzip rozpoznawany po nagłówku, JSON Lines po
+# pierwszym znaku '{', wszystko inne czytane jako tar
+def _open_input(stream):
+    if not hasattr(stream, 'peek'):
+        stream = io.BufferedReader(stream)
+    if stream.peek(2)[:2] == b'\x1f\x8b':
+        stream = io.BufferedReader(gzip.GzipFile(fileobj=stream, mode='rb'))
+    head = stream.peek(64).lstrip()
+    return stream, (not head or head.startswith(b'{'))
+
+
+def _check_record(record):
+    if not isinstance(record, dict):
+        raise InventoryError("wpis nie jest obiektem")
+    missing = [field for field in REQUIRED_FIELDS if not isinstance(record.get(field), str) or not record[field]]
+    if missing:
+        raise InventoryError(f"brak pól: {', '.join(missing)}")
+    key_name = record['key_name']
+    if not key_name.startswith(KEY_PREFIX) or os.path.basename(key_name) != key_name or key_name.endswith('.pub'):
+        raise InventoryError(f"nieprawidłowa nazwa klucza {key_name!r}")
+
+
+class _Importer:
+    def __init__(self, store, keys_dir, fragments, fingerprints, chunk_size, progress):
+        self.store = store
+        self.keys_dir = keys_dir
+        self.fragments = fragments
+        self.fingerprints = fingerprints
+        self.chunk_size = max(1, chunk_size)
+        self.progress = progress
+        # Jeden zapis magazynu na cały import zamiast jednego na paczkę
+        self.deferred = getattr(store, 'REWRITES_ALL', False)
+        self.stats = TransferStats()
+        self.chunk = []
+        # Pliki zapisane dla bieżącej paczki - usuwane, gdy jej zapis się nie uda
+        self.written = []
+        # Aliasy bieżącej paczki (powtórzenia w samym pliku)
+        self.seen = set()
+
+    # Rekord z pliku: None, gdy jest pomijany (błąd albo istniejący alias)
+    def accept(self, record, subject):
+        try:
+            _check_record(record)
+        except InventoryError as e:
+            self.stats.errors.append((subject, str(e)))
+            return None
+        alias = record['alias']
+        if alias in self.seen or alias in self.store:
+            self.stats.skipped += 1
+            return None
+        self.seen.add(alias)
+        return dict(record, key_path=os.path.join(self.keys_dir, record['key_name']))
+
+    def write_key_file(self, name, source, mode):
+        path = os.path.join(self.keys_dir, name)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+        self.written.append(path)
+        with os.fdopen(fd, 'wb') as f:
+            size = 0
+            while True:
+                block = source.read(1 << 16)
+                if not block:
+                    break
+                f.write(block)
+                size += len(block)
+        self.stats.files += 1
+        self.stats.bytes += size
+        count('files_written')
+
+    # Usuwa pliki rekordu zapisane przez ten import (nigdy istniejących wcześniej)
+    def drop_files(self, record):
+        paths = (record['key_path'], f"{record['key_path']}.pub")
+        for path in paths:
+            if path in self.written:
+                os.remove(path)
+        self.written = [path for path in self.written if path not in paths]
+
+    def add(self, record):
+        if not os.path.exists(record['key_path']):
+            self.stats.errors.append((record['alias'], f"brak pliku klucza {record['key_name']}"))
+            self.drop_files(record)
+            return
+        self.chunk.append(record)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def discard_written(self):
+        for path in self.written:
+            if os.path.exists(path):
+                os.remove(path)
+        self.written = []
+
+    # Jedna paczka: fragmenty configu i jedna transakcja magazynu
+    def flush(self):
+        if not self.chunk:
+            self.written = []
+            return
+        records, self.chunk = self.chunk, []
+        added = []
+        try:
+            with span('import_chunk', records=len(records)):
+                for record in records:
+                    fingerprint = self.fingerprints.update(f"{record['key_path']}.pub") if self.fingerprints is not None else None
+                    if fingerprint:
+                        record['fingerprint'] = fingerprint
+                    else:
+                        record.pop('fingerprint', None)
+                write_config_entries(self.fragments, [config_entry_for(r['hostname'], r['alias'], r['key_name']) for r in records])
+                # Przy odłożonym zapisie przeładowanie zgubiłoby wcześniejsze paczki
+                if not self.deferred:
+                    self.store.reload_if_changed()
+                with self.store.batch():
+                    for record in records:
+                        self.store.add(record)
+                        added.append(record['alias'])
+        except BaseException:
+            # Odłożona paczka jest już w pamięci magazynu - wycofujemy ją ręcznie
+            if self.deferred and added:
+                self.store.remove_many(added)
+            self.discard_written()
+            raise
+        self.written = []
+        # Zapisane aliasy są już w magazynie
+        self.seen = set()
+        self.stats.records += len(records)
+        if self.progress is not None:
+            self.progress(self.stats.records)
+
+    def read_lines(self, stream):
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                self.stats.errors.append((f"linia {number}", f"niepoprawny JSON: {e}"))
+                continue
+            record = self.accept(record, f"linia {number}")
+            if record is not None:
+                self.add(record)
+
+    # Całe wczytywanie; przy odłożonym zapisie w jednej transakcji magazynu,
+    # zapisywanej także wtedy, gdy wczytywanie przerwał błąd
+    def run(self, read, stream):
+        if not self.deferred:
+            read(stream)
+            self.flush()
+            return
+        self.store.reload_if_changed()
+        error = None
+        with self.store.batch():
+            try:
+                read(stream)
+                self.flush()
+            except BaseException as e:
+                error = e
+        if error is not None:
+            raise error
+
+    def read_tar(self, stream):
+        current = None
+        with tarfile.open(fileobj=stream, mode='r|') as tar:
+            while True:
+                member = tar.next()
+                if member is None:
+                    break
+                # TarFile pamięta wszystkie nagłówki - przy strumieniu niepotrzebnie
+                tar.members = []
+                name = member.name
+                if name.startswith(RECORDS_PREFIX) and member.isfile():
+                    if current is not None:
+                        self.add(current)
+                    try:
+                        record = json.loads(tar.extractfile(member).read())
+                    except ValueError as e:
+                        self.stats.errors.append((name, f"niepoprawny JSON: {e}"))
+                        current = None
+                        continue
+                    current = self.accept(record, name)
+                elif name.startswith(KEYS_PREFIX) and member.isfile():
+                    file_name = name[len(KEYS_PREFIX):]
+                    # Tylko pliki bieżącego rekordu - nic spoza keys/, nic cudzego
+                    if current is None or file_name not in (current['key_name'], f"{current['key_name']}.pub"):
+                        continue
+                    try:
+                        self.write_key_file(file_name, tar.extractfile(member), 0o644 if file_name.endswith('.pub') else 0o600)
+                    except FileExistsError:
+                        self.stats.errors.append((current['alias'], f"plik {file_name} już istnieje"))
+                        self.drop_files(current)
+                        current = None
+                    except OSError:
+                        self.discard_written()
+                        raise
+        if current is not None:
+            self.add(current)
+
+
+# Wczytuje eksport ze strumienia binarnego (plik, stdin). Zwraca TransferStats.
+def import_inventory(stream, store, keys_dir, fragments, fingerprints=None, chunk_size=CHUNK_SIZE, progress=None):
+    importer = _Importer(store, keys_dir, fragments, fingerprints, chunk_size, progress)
+    with span('import_inventory'):
+        try:
+            stream, lines = _open_input(stream)
+            importer.run(importer.read_lines if lines else importer.read_tar, stream)
+        except tarfile.TarError as e:
+            importer.discard_written()
+            raise InventoryError(f"Uszkodzony strumień tar: {e}")
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+            importer.discard_written()
+            raise InventoryError(f"Uszkodzony strumień gzip: {e}")
+        count('records', importer.stats.records)
+    return importer.stats.finish()
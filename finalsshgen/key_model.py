@@ -0,0 +1,205 @@
+import itertools
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from tracing import span
+
+
+COLUMNS = (
+    ("Nazwa Klucza", 'key_name'),
+    ("Host", 'hostname'),
+    ("Alias", 'alias'),
+    ("Email", 'email'),
+)
+
+# Ile wyników wyszukiwania pobierać naraz (reszta przy przewijaniu, fetchMore)
+PAGE_SIZE = 128
+# Ile ostatnio czytanych wierszy magazynu trzymać bez filtra
+CACHE_ROWS = 512
+
+
+# Model tabeli kluczy dla QTableView. Widok pyta tylko o widoczne komórki,
+# więc nic nie jest tworzone dla wierszy poza ekranem. Model słucha zmian
+# magazynu: dodanie/usunięcie/zmiana klucza to wstawienie/usunięcie/
+# odświeżenie jednego wiersza, a pełny reset tylko wtedy, gdy magazyn
+# nie potrafi podać różnic.
+#
+# Z search_index model może pokazywać tylko wyniki wyszukiwania. Indeks musi
+# być zapisany do zdarzeń magazynu przed modelem, żeby przy resecie model
+# pytał już przebudowany indeks.
+#
+# Bez filtra model nie kopiuje magazynu - pamięta tylko liczbę wierszy
+# i czyta rekordy przez store.record_at. Wyniki wyszukiwania są pobierane
+# stronami po PAGE_SIZE (canFetchMore/fetchMore), więc zapytanie pasujące
+# do większości kluczy nie buduje listy wszystkich wyników przy każdym
+# naciśnięciu klawisza.
+#
+# Model może powstać bez magazynu (pusta tabela przy starcie) i dostać go
+# później przez attach().
+class KeyTableModel(QAbstractTableModel):
+    def __init__(self, store=None, search_index=None, parent=None):
+        super().__init__(parent)
+        self._store = None
+        self._index = None
+        self._query = ''
+        # Pobrane wyniki wyszukiwania; None - wiersze prosto z magazynu
+        self._rows = []
+        # Dalsze wyniki do pobrania przez fetchMore albo None
+        self._more = None
+        self._count = 0
+        self._cache = {}
+        # (wiersz, przesunięcie, usunięty rekord) na czas begin*Rows bez filtra
+        self._shift = None
+        if store is not None:
+            self.attach(store, search_index)
+
+    def attach(self, store, search_index=None):
+        if self._store is not None:
+            self._store.unsubscribe(self._store_changed)
+        self.beginResetModel()
+        self._store = store
+        self._index = search_index
+        self._load_rows()
+        self.endResetModel()
+        store.subscribe(self._store_changed)
+
+    def set_query(self, query):
+        self._query = query.strip()
+        self.beginResetModel()
+        self._load_rows()
+        self.endResetModel()
+
+    def _filtered(self):
+        return self._rows is not None
+
+    def _load_rows(self):
+        self._cache = {}
+        self._more = None
+        self._rows = []
+        if self._store is None:
+            return
+        if self._query and self._index is not None:
+            self._more = self._index.iter_records(self._query)
+        if self._more is None:
+            self._rows = None
+            self._count = len(self._store)
+            return
+        self._rows = list(itertools.islice(self._more, PAGE_SIZE))
+        if len(self._rows) < PAGE_SIZE:
+            self._more = None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._more is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._more is None:
+            return
+        rows = list(itertools.islice(self._more, PAGE_SIZE))
+        if len(rows) < PAGE_SIZE:
+            self._more = None
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._count if self._rows is None else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        return self.record_at(index.row()).get(COLUMNS[index.column()][1], '')
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section][0]
+        return section + 1
+
+    def record_at(self, row):
+        if self._rows is not None:
+            return self._rows[row]
+        # Magazyn zgłasza zmianę już po niej, a widok w begin*Rows może
+        # jeszcze pytać o stary układ wierszy
+        if self._shift is not None:
+            at, delta, removed = self._shift
+            if row == at and removed is not None:
+                return removed
+            if row >= at:
+                row += delta
+        record = self._cache.get(row)
+        if record is None:
+            if len(self._cache) >= CACHE_ROWS:
+                self._cache = {}
+            record = self._cache[row] = self._store.record_at(row)
+        return record
+
+    def _store_changed(self, event, record, row):
+        self._cache = {}
+        if not self._filtered():
+            if event == 'add':
+                self._shift = (row, 1, None)
+                self.beginInsertRows(QModelIndex(), row, row)
+                self._shift = None
+                self._count += 1
+                self.endInsertRows()
+            elif event == 'remove':
+                self._shift = (row, -1, record)
+                self.beginRemoveRows(QModelIndex(), row, row)
+                self._shift = None
+                self._count -= 1
+                self.endRemoveRows()
+            elif event == 'update':
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+            else:
+                with span('table_refresh'):
+                    self.beginResetModel()
+                    self._load_rows()
+                    self.endResetModel()
+            return
+
+        if event == 'update':
+            # Zmieniony rekord mógł wejść do wyników wyszukiwania albo z nich wypaść
+            row = next((i for i, r in enumerate(self._rows) if r['alias'] == record['alias']), None)
+            visible = self._index.matches(record, self._query)
+            if row is None:
+                # Jeszcze niepobrany wynik przyjdzie z fetchMore
+                if not visible or self._more is not None:
+                    return
+                event, row = 'add', len(self._rows)
+            elif not visible:
+                event = 'remove'
+        elif event in ('add', 'remove'):
+            # Przy aktywnym filtrze numer wiersza z magazynu nie pasuje do widoku
+            if event == 'add':
+                if not self._index.matches(record, self._query):
+                    return
+                row = len(self._rows)
+            else:
+                # Po aliasie - SQLite przy każdym odczycie buduje nowy słownik
+                row = next((i for i, r in enumerate(self._rows) if r['alias'] == record['alias']), None)
+                if row is None:
+                    return
+
+        if event == 'add':
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._rows.insert(row, record)
+            self.endInsertRows()
+        elif event == 'remove':
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[row]
+            self.endRemoveRows()
+        elif event == 'update':
+            self._rows[row] = record
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+        else:
+            with span('table_refresh'):
+                self.beginResetModel()
+                self._load_rows()
+                self.endResetModel()
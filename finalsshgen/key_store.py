@@ -0,0 +1,552 @@
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from tracing import span, count
+
+
+class KeyStoreError(Exception):
+    def __init__(self, message, path=None):
+        super().__init__(message)
+        self.path = path
+
+
+# Zapis atomowy: plik tymczasowy w tym samym katalogu + rename
+def write_json_atomic(path, data, indent=4):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.keys-', suffix='.tmp')
+    try:
+        with span('json_write'), os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+            count('bytes_written', f.tell())
+            count('files_written')
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Eksport dowolnego magazynu do formatu keys.json
+def export_json(store, path):
+    write_json_atomic(path, store.all())
+
+
+# Magazyn metadanych kluczy: keys.json wczytywany raz, trzymany w pamięci
+# z indeksami po aliasie, nazwie klucza i hoście. Zmiany trafiają najpierw
+# do pamięci, a na dysk zapisywane są jednym atomowym zapisem.
+class KeyStore:
+    # Każdy zapis to cała lista rekordów (patrz _persist)
+    REWRITES_ALL = True
+
+    def __init__(self, path):
+        self.path = path
+        self._records = []
+        self._by_alias = {}
+        self._by_key_name = {}
+        self._by_hostname = {}
+        self._signature = None
+        self._batch_depth = 0
+        self._pending = []
+        self._listeners = []
+        self.reload()
+
+    # Słuchacz dostaje (zdarzenie, rekord, wiersz): 'add', 'remove' i 'update'
+    # (nowa treść rekordu o tym samym aliasie) dotyczą jednego wiersza,
+    # 'reset' oznacza, że zmieniło się wszystko
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event, record=None, row=None):
+        for listener in list(self._listeners):
+            listener(event, record, row)
+
+    # --- odczyt ---
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __contains__(self, alias):
+        return alias in self._by_alias
+
+    def all(self):
+        return list(self._records)
+
+    def record_at(self, row):
+        return self._records[row]
+
+    def get(self, alias):
+        return self._by_alias.get(alias)
+
+    def find_by_key_name(self, key_name):
+        return self._by_key_name.get(key_name)
+
+    def find_by_hostname(self, hostname):
+        return list(self._by_hostname.get(hostname, ()))
+
+    # --- zmiany ---
+
+    def add(self, record):
+        if record['alias'] in self._by_alias:
+            raise KeyError(f"Alias {record['alias']} już istnieje")
+        self._records.append(record)
+        self._index(record)
+        self._changed(('add', record))
+        self._notify('add', record, len(self._records) - 1)
+
+    # Nowa treść rekordu o istniejącym aliasie; wiersz zostaje na miejscu
+    def update(self, record):
+        old = self._by_alias.get(record['alias'])
+        if old is None:
+            raise KeyError(f"Alias {record['alias']} nie istnieje")
+        row = next(i for i, r in enumerate(self._records) if r is old)
+        self._unindex(old)
+        self._records[row] = record
+        self._index(record)
+        self._changed(('update', record))
+        self._notify('update', record, row)
+        return old
+
+    def remove(self, alias):
+        record = self._by_alias.get(alias)
+        if record is None:
+            return None
+        row = next(i for i, r in enumerate(self._records) if r is record)
+        del self._records[row]
+        self._unindex(record)
+        self._changed(('remove', alias))
+        self._notify('remove', record, row)
+        return record
+
+    # Usuwa wiele aliasów jednym przejściem po liście i jednym zapisem;
+    # słuchacze dostają 'remove' od końca, więc numery wierszy się zgadzają
+    def remove_many(self, aliases):
+        doomed = {alias for alias in aliases if alias in self._by_alias}
+        if not doomed:
+            return []
+        removed = [(row, record) for row, record in enumerate(self._records) if record['alias'] in doomed]
+        self._records = [record for record in self._records if record['alias'] not in doomed]
+        with self.batch():
+            for row, record in reversed(removed):
+                self._unindex(record)
+                self._changed(('remove', record['alias']))
+                self._notify('remove', record, row)
+        return [record for _, record in removed]
+
+    def clear(self):
+        self._records = []
+        self._rebuild_indexes()
+        self._changed(('clear',))
+        self._notify('reset')
+
+    # Przenosi pliki magazynu do katalogu directory (po jednym rename na
+    # plik) i zaczyna od pustego magazynu - bez serializacji rekordów.
+    # restore_from() odkłada je z powrotem; tak działa kosz delete_all.
+    def move_to(self, directory):
+        for path in self.watched_paths():
+            if os.path.exists(path):
+                os.replace(path, os.path.join(directory, os.path.basename(path)))
+        self._start_empty()
+        self._notify('reset')
+
+    # Zwraca False, gdy w katalogu nie ma plików magazynu
+    def restore_from(self, directory):
+        paths = self.watched_paths()
+        if not os.path.exists(os.path.join(directory, os.path.basename(paths[0]))):
+            return False
+        for path in paths:
+            moved = os.path.join(directory, os.path.basename(path))
+            if os.path.exists(moved):
+                os.replace(moved, path)
+            elif os.path.exists(path):
+                os.remove(path)
+        self.reload()
+        return True
+
+    def _start_empty(self):
+        write_json_atomic(self.path, [])
+        self._records = []
+        self._pending = []
+        self._rebuild_indexes()
+        self._signature = self._file_signature()
+
+    # Grupuje kilka zmian w jeden zapis pliku. Przy wyjątku zmiany
+    # z pamięci są porzucane i stan wraca do tego z dysku.
+    @contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._pending = []
+                self.reload()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0 and self._pending:
+            self.flush()
+
+    def flush(self):
+        self._persist(self._pending)
+        self._pending = []
+        self._signature = self._file_signature()
+
+    # --- synchronizacja z plikiem ---
+
+    # Przeładowanie tylko wtedy, gdy plik zmienił ktoś inny (mtime/inode/rozmiar)
+    def reload_if_changed(self):
+        if self._file_signature() != self._signature:
+            self.reload()
+            return True
+        return False
+
+    def reload(self):
+        with span('store_reload'):
+            self._signature = self._file_signature()
+            self._apply_records(self._read_records())
+
+    # Pliki, których zmiana oznacza zmianę magazynu (dla obserwatora plików)
+    def watched_paths(self):
+        return [self.path]
+
+    # Przechodzi do nowej listy rekordów, zgłaszając słuchaczom tylko różnice:
+    # usunięte wiersze, zmienione rekordy i wiersze dopisane na końcu - tak
+    # zmienia plik inna instancja aplikacji. Gdy kolejność się rozjechała albo
+    # zmian jest więcej niż połowa listy, taniej jest zgłosić 'reset'.
+    def _apply_records(self, records):
+        old = self._records
+        new_aliases = {record['alias'] for record in records}
+        kept = [record for record in old if record['alias'] in new_aliases]
+        in_order = all(a['alias'] == b['alias'] for a, b in zip(kept, records))
+        changes = len(old) - len(kept) + len(records) - len(kept)
+        if not old or not in_order or changes * 2 > max(len(old), len(records)):
+            self._records = records
+            self._rebuild_indexes()
+            self._notify('reset')
+            return
+
+        for row in range(len(old) - 1, -1, -1):
+            record = old[row]
+            if record['alias'] not in new_aliases:
+                del self._records[row]
+                self._unindex(record)
+                self._notify('remove', record, row)
+
+        for row, record in enumerate(records[:len(kept)]):
+            if record != self._records[row]:
+                self._unindex(self._records[row])
+                self._records[row] = record
+                self._index(record)
+                self._notify('update', record, row)
+
+        for record in records[len(kept):]:
+            self._records.append(record)
+            self._index(record)
+            self._notify('add', record, len(self._records) - 1)
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read_records(self):
+        try:
+            with open(self.path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return []
+        count('bytes_read', len(content))
+        count('files_read')
+        # Pusty plik (tak zapisują go starsze wersje aplikacji) to pusta lista
+        if not content.strip():
+            return []
+        try:
+            with span('json_load'):
+                return json.loads(content)
+        except json.JSONDecodeError as e:
+            # Uszkodzonego pliku nie traktujemy jak pustego - następny zapis
+            # skasowałby całą listę kluczy
+            raise KeyStoreError(f"Plik {self.path} jest uszkodzony: {e}", self.path)
+
+    # JSON-owy magazyn przy każdej zmianie zapisuje całą listę
+    def _persist(self, ops):
+        write_json_atomic(self.path, self._records)
+
+    def _changed(self, op):
+        self._pending.append(op)
+        if self._batch_depth == 0:
+            self.flush()
+
+    # --- indeksy ---
+
+    def _rebuild_indexes(self):
+        self._by_alias = {}
+        self._by_key_name = {}
+        self._by_hostname = {}
+        for record in self._records:
+            self._index(record)
+
+    def _index(self, record):
+        self._by_alias[record['alias']] = record
+        self._by_key_name[record['key_name']] = record
+        self._by_hostname.setdefault(record['hostname'], []).append(record)
+
+    def _unindex(self, record):
+        self._by_alias.pop(record['alias'], None)
+        self._by_key_name.pop(record['key_name'], None)
+        same_host = self._by_hostname.get(record['hostname'])
+        if same_host is not None:
+            same_host.remove(record)
+            if not same_host:
+                del self._by_hostname[record['hostname']]
+
+
+# Magazyn w trybie dziennika: każda zmiana to jedna linia JSON dopisana
+# (z fsync) na koniec pliku dziennika, a co jakiś czas w tle dziennik jest
+# zwijany do migawki. Stan po starcie = migawka + ogon dziennika.
+#
+# Operacje w dzienniku nadpisują stan (add ustawia rekord, remove go usuwa,
+# clear czyści wszystko), więc ponowne odtworzenie już zwiniętych wpisów na
+# nowszej migawce daje ten sam wynik - awaria między zapisem migawki
+# a przycięciem dziennika nie psuje danych.
+#
+# Zakłada jednego piszącego; odczyty z innych procesów są bezpieczne.
+class JournalKeyStore(KeyStore):
+    REWRITES_ALL = False
+
+    def __init__(self, snapshot_path, journal_path, compact_every=500):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self._journal_entries = 0
+        # Do tego miejsca dziennik jest już wczytany
+        self._journal_offset = 0
+        self._lock = threading.RLock()
+        self._compactor = None
+        super().__init__(snapshot_path)
+
+    def _file_signature(self):
+        signatures = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                signatures.append(None)
+                continue
+            signatures.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(signatures)
+
+    def reload(self):
+        with self._lock:
+            super().reload()
+
+    # Paczka trzyma blokadę do końca: migawka nie może złapać jej zmian,
+    # bo wycofanie paczki nie cofnęłoby ich z keys.snapshot.json
+    @contextmanager
+    def batch(self):
+        with self._lock, super().batch():
+            yield self
+
+    def watched_paths(self):
+        return [self.snapshot_path, self.journal_path]
+
+    # Zwijanie w tle pisze migawkę - musi się skończyć przed przeniesieniem
+    def move_to(self, directory):
+        self.wait_for_compaction()
+        with self._lock:
+            super().move_to(directory)
+
+    def restore_from(self, directory):
+        self.wait_for_compaction()
+        with self._lock:
+            return super().restore_from(directory)
+
+    def _start_empty(self):
+        self._journal_entries = 0
+        self._journal_offset = 0
+        super()._start_empty()
+
+    # Gdy migawka jest ta sama, a dziennik tylko urósł (dopisała inna
+    # instancja), wczytujemy sam nowy ogon dziennika
+    def reload_if_changed(self):
+        with self._lock:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return False
+            old_snapshot, old_journal = self._signature
+            snapshot, journal = signature
+            if snapshot != old_snapshot or journal is None or old_journal is None or journal[0] != old_journal[0] or journal[2] < self._journal_offset:
+                self.reload()
+                return True
+            with span('store_reload', journal_tail=True):
+                self._signature = signature
+                records = {record['alias']: record for record in self._records}
+                self._replay_journal(records, truncate=False)
+                self._apply_records(list(records.values()))
+            return True
+
+    def _read_records(self):
+        records = {record['alias']: record for record in super()._read_records()}
+        self._journal_entries = 0
+        self._journal_offset = 0
+        self._replay_journal(records, truncate=True)
+        return list(records.values())
+
+    # Odtwarza wpisy dziennika od _journal_offset. Urwaną ostatnią linię
+    # ucinamy tylko przy pełnym wczytaniu - przy czytaniu ogona może to być
+    # wpis, który inna instancja właśnie dopisuje.
+    def _replay_journal(self, records, truncate):
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+
+        with f:
+            f.seek(self._journal_offset)
+            good_size = self._journal_offset
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Urwana ostatnia linia (awaria w trakcie dopisywania)
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise KeyStoreError(f"Dziennik {self.journal_path} jest uszkodzony: {e}", self.journal_path)
+                self._apply(records, entry)
+                self._journal_entries += 1
+                good_size += len(line)
+            torn = f.tell() != good_size
+        count('bytes_read', good_size - self._journal_offset)
+        self._journal_offset = good_size
+
+        if torn and truncate:
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_size)
+
+    @staticmethod
+    def _apply(records, entry):
+        if entry['op'] == 'add':
+            records[entry['record']['alias']] = entry['record']
+        elif entry['op'] == 'remove':
+            records.pop(entry['alias'], None)
+        elif entry['op'] == 'clear':
+            records.clear()
+
+    def _persist(self, ops):
+        lines = []
+        for op in ops:
+            # 'add' ustawia rekord pod aliasem, więc wystarcza też dla 'update'
+            if op[0] in ('add', 'update'):
+                entry = {'op': 'add', 'record': op[1]}
+            elif op[0] == 'remove':
+                entry = {'op': 'remove', 'alias': op[1]}
+            else:
+                entry = {'op': 'clear'}
+            lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+
+        data = ''.join(lines).encode('utf-8')
+        with self._lock, span('journal_append'):
+            with open(self.journal_path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                self._journal_offset = f.tell()
+            count('bytes_written', len(data))
+            self._journal_entries += len(lines)
+
+        if self._journal_entries >= self.compact_every:
+            self.compact_in_background()
+
+    def compact_in_background(self):
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return self._compactor
+            self._compactor = threading.Thread(target=self.compact, name='journal-compaction', daemon=True)
+            self._compactor.start()
+            return self._compactor
+
+    def compact(self):
+        with span('journal_compact'):
+            self._compact()
+
+    def _compact(self):
+        with self._lock:
+            # Wywołanie w trakcie paczki (ten sam wątek) - migawkę zrobi
+            # następne zwinięcie, dziennik nadal jest ponad progiem
+            if self._batch_depth:
+                return
+            records = list(self._records)
+            try:
+                journal_offset = os.path.getsize(self.journal_path)
+            except FileNotFoundError:
+                journal_offset = 0
+            entries_at_snapshot = self._journal_entries
+
+        # Najdroższa część (serializacja całej listy) bez trzymania blokady
+        write_json_atomic(self.snapshot_path, records)
+
+        with self._lock:
+            try:
+                with open(self.journal_path, 'rb') as f:
+                    f.seek(journal_offset)
+                    tail = f.read()
+            except FileNotFoundError:
+                tail = b''
+            directory = os.path.dirname(os.path.abspath(self.journal_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.journal-', suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            self._journal_offset = len(tail)
+            self._journal_entries -= entries_at_snapshot
+            self._signature = self._file_signature()
+
+    def wait_for_compaction(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+
+STORAGE_MODES = ('json', 'journal', 'sqlite')
+
+
+# Tworzy magazyn dla katalogu aplikacji. Tryb wybiera zmienna środowiskowa
+# SSHGEN_STORAGE (domyślnie zwykły keys.json).
+def open_store(base_dir, mode=None):
+    mode = mode or os.environ.get('SSHGEN_STORAGE', 'json')
+    keys_json_path = os.path.join(base_dir, 'keys.json')
+
+    if mode == 'json':
+        return KeyStore(keys_json_path)
+
+    if mode == 'journal':
+        snapshot_path = os.path.join(base_dir, 'keys.snapshot.json')
+        journal_path = os.path.join(base_dir, 'keys.journal')
+        if not os.path.exists(snapshot_path) and not os.path.exists(journal_path):
+            # Pierwsze uruchomienie w tym trybie - startujemy z obecnego keys.json
+            write_json_atomic(snapshot_path, KeyStore(keys_json_path).all())
+        return JournalKeyStore(snapshot_path, journal_path)
+
+    if mode == 'sqlite':
+        from sqlite_store import SqliteKeyStore, migrate_json_to_sqlite
+        db_path = os.path.join(base_dir, 'keys.db')
+        if not os.path.exists(db_path) and os.path.exists(keys_json_path):
+            migrate_json_to_sqlite(keys_json_path, db_path)
+        return SqliteKeyStore(db_path)
+
+    raise ValueError(f"Nieznany tryb magazynu: {mode} (dostępne: {', '.join(STORAGE_MODES)})")
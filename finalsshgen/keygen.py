@@ -0,0 +1,118 @@
+import os
+import re
+import subprocess
+from datetime import datetime
+
+import openssh_keys
+from tracing import span, count
+
+
+# Silniki generowania kluczy (zmienna środowiskowa SSHGEN_KEYGEN):
+#   auto       - w procesie, jeśli jest pakiet cryptography, inaczej ssh-keygen
+#   inprocess  - zawsze w procesie (cryptography albo czysty Python)
+#   subprocess - zawsze ssh-keygen
+KEYGEN_ENGINES = ('auto', 'inprocess', 'subprocess')
+
+# Klucz po rotacji (rotation.py) ma w nazwie czas: id_ed25519_<alias>.<RRRRMMDDggmmss>
+ROTATED_SUFFIX_RE = re.compile(r'\.\d{14}$')
+
+
+def key_name_for(alias):
+    return f"id_ed25519_{alias}"
+
+
+def rotated_key_name(alias, when):
+    return f"{key_name_for(alias)}.{when.strftime('%Y%m%d%H%M%S')}"
+
+
+# Alias z nazwy pliku klucza - także zrotowanego
+def alias_for_key_name(key_name):
+    return ROTATED_SUFFIX_RE.sub('', key_name)[len(key_name_for('')):]
+
+
+# Nazwa bloku Host dla klucza (część hosta po kropce jest obcinana)
+def host_alias_for(host, alias):
+    return f"{host.split('.')[0]}-{alias}"
+
+
+# Blok Host dla fragmentu configu jako (wzorzec, [(opcja, wartość), ...])
+def config_entry_for(host, alias, key_name):
+    return (host_alias_for(host, alias), [
+        ("HostName", host),
+        ("User", "git"),
+        ("IdentityFile", f"~/.ssh/{key_name}"),
+    ])
+
+
+def key_metadata_for(email, host, alias, key_name, key_path, fingerprint=None):
+    record = {
+        "key_name": key_name,
+        "email": email,
+        "hostname": host,
+        "alias": alias,
+        "key_path": key_path,
+        "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    # Odcisk SHA256 klucza publicznego (jak ssh-keygen -l) - patrz fingerprints
+    if fingerprint:
+        record["fingerprint"] = fingerprint
+    return record
+
+
+# Dodaje lub poprawia bloki Host - każdy we własnym fragmencie
+# (config_fragments.ConfigFragments); zapisywane są tylko zmienione
+def write_config_entries(fragments, entries):
+    with span('config_write', blocks=len(entries)):
+        return [pattern for pattern, options in entries if fragments.write(pattern, options)]
+
+
+def remove_config_entries(fragments, patterns):
+    with span('config_write', blocks=len(patterns)):
+        return [pattern for pattern in patterns if fragments.remove(pattern)]
+
+
+# Uruchamia ssh-keygen dla jednego klucza. Bez interfejsu graficznego,
+# więc można to wołać z wątku roboczego.
+def run_ssh_keygen(email, key_path):
+    try:
+        with span('ssh_keygen'):
+            subprocess.run(
+                ["ssh-keygen", "-t", "ed25519", "-C", email, "-f", key_path, "-N", ""],
+                check=True,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+            )
+            count('files_written', 2)
+    except FileNotFoundError:
+        raise RuntimeError("Nie znaleziono programu ssh-keygen.")
+    except subprocess.CalledProcessError as e:
+        details = e.stderr.decode(errors='replace').strip() if e.stderr else ""
+        raise RuntimeError(f"Nie udało się wygenerować klucza SSH. {details}".strip())
+    return key_path
+
+
+def generate_ed25519_inprocess(email, key_path):
+    try:
+        with span('keygen_inprocess'):
+            openssh_keys.write_ed25519_keypair(key_path, email)
+            count('files_written', 2)
+            return key_path
+    except FileExistsError:
+        raise RuntimeError(f"Nie udało się wygenerować klucza SSH. Plik {key_path} już istnieje.")
+    except OSError as e:
+        raise RuntimeError(f"Nie udało się wygenerować klucza SSH. {e}")
+
+
+def resolve_engine(engine=None):
+    engine = engine or os.environ.get('SSHGEN_KEYGEN', 'auto')
+    if engine not in KEYGEN_ENGINES:
+        raise ValueError(f"Nieznany silnik generowania kluczy: {engine} (dostępne: {', '.join(KEYGEN_ENGINES)})")
+    if engine == 'auto':
+        return 'inprocess' if openssh_keys.backend_name() == 'cryptography' else 'subprocess'
+    return engine
+
+
+def generate_key(email, key_path, engine=None):
+    if resolve_engine(engine) == 'inprocess':
+        return generate_ed25519_inprocess(email, key_path)
+    return run_ssh_keygen(email, key_path)
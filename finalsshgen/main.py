@@ -1,324 +1,697 @@
+import time
+startup_t0 = time.perf_counter()
+
 import sys
 import os
-import json
-import shutil
-import subprocess
-from datetime import datetime
-from pathlib import Path
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox
-
-# Ustalamy ścieżki
-if getattr(sys, 'frozen', False):
-    base_dir = os.path.dirname(sys.executable)
-else:
-    base_dir = os.path.dirname(os.path.realpath(__file__))
-
-keys_dir = os.path.join(base_dir, 'keys')
-config_path = os.path.join(base_dir, 'config')  # opcjonalny - nieużywany
-keys_json_path = os.path.join(base_dir, 'keys.json')
-shared_config_path = os.path.join(keys_dir, 'config')  # Wspólny plik konfiguracyjny
-
-# Tworzenie potrzebnych folderów/plików
-if not os.path.exists(keys_dir):
-    os.makedirs(keys_dir)
-
-if not os.path.exists(keys_json_path):
-    with open(keys_json_path, 'w') as f:
-        json.dump([], f)
-
-# Funkcja generująca nowy klucz SSH
+import re
+from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTableView, QHeaderView, QMessageBox, QFileDialog, QProgressBar
+from PyQt6.QtCore import QTimer
+
+from workers import submit
+from key_model import KeyTableModel
+
+# Cała logika kluczy siedzi w core.KeyManager; tu tylko okno i dialogi.
+# Okno powstaje tylko przy uruchomieniu jako program. Moduły logiki
+# (core, keygen, bulk, ...) importujemy leniwie - najpierw w wątku, który
+# wczytuje klucze, więc nie opóźniają pierwszego narysowania okna.
+
+# Funkcja generująca nowy klucz SSH. Samo generowanie idzie do puli wątków,
+# więc okno nie zamarza i można zlecić kilka kluczy naraz.
 def generate_ssh_key(email, host, alias):
-    if not email or not host or not alias:
-        QMessageBox.warning(window, "Błąd", "Wszystkie pola muszą być wypełnione!")
+    from core import KeyManagerError
+    from keygen import generate_key
+
+    try:
+        key_path = manager.prepare_key(email, host, alias)
+    except KeyManagerError as e:
+        QMessageBox.warning(window, "Błąd", str(e))
         return
 
-    key_name = f"id_ed25519_{alias}"
-    key_path = os.path.join(keys_dir, key_name)
+    manager.pending_aliases.add(alias)
+    submit(
+        generate_key, email, key_path,
+        on_finished=lambda key_path: key_generated(email, host, alias, key_path),
+        on_failed=lambda message: key_failed(alias, message),
+    )
+
+
+def key_failed(alias, message):
+    manager.pending_aliases.discard(alias)
+    QMessageBox.critical(window, "Błąd", message)
+
+
+# Wywoływane w wątku GUI po wygenerowaniu klucza. Gdy zapis metadanych
+# się nie uda, pliki klucza i blok Host nie mogą zostać bez wpisu.
+def key_generated(email, host, alias, key_path):
+    from core import KeyManagerError, remove_key_files
+    from key_store import KeyStoreError
+    from keygen import host_alias_for
+
+    manager.pending_aliases.discard(alias)
+    try:
+        manager.register_key(email, host, alias)
+    except (KeyManagerError, KeyStoreError, OSError) as e:
+        if alias not in manager.store:
+            # Przy usłudze (RemoteKeyManager) config zapisuje ona sama
+            if hasattr(manager, 'fragments'):
+                manager.fragments.remove(host_alias_for(host, alias))
+            submit(remove_key_files, [{'key_path': key_path}])
+        QMessageBox.critical(window, "Błąd", f"Nie udało się zapisać klucza {alias}: {e}")
+
+
+# Ile procesów ssh-keygen naraz przy imporcie manifestu
+BULK_CONCURRENCY = max(1, min(8, os.cpu_count() or 1))
+
 
-    if os.path.exists(key_path):
-        QMessageBox.critical(window, "Błąd", f"Klucz o nazwie {key_name} już istnieje!")
+# Import wielu kluczy z manifestu CSV/JSON (kolumny email, host, alias)
+def import_manifest():
+    from bulk import ManifestError, read_manifest, format_errors
+
+    path, _ = QFileDialog.getOpenFileName(window, "Wybierz manifest", "", "Manifest (*.csv *.json)")
+    if not path:
         return
 
     try:
-        subprocess.run(
-            ["ssh-keygen", "-t", "ed25519", "-C", email, "-f", key_path, "-N", ""],
-            check=True
-        )
-    except subprocess.CalledProcessError:
-        QMessageBox.critical(window, "Błąd", "Nie udało się wygenerować klucza SSH.")
+        rows = read_manifest(path)
+    except (OSError, ManifestError) as e:
+        QMessageBox.critical(window, "Błąd", f"Nie udało się wczytać manifestu: {e}")
         return
 
-    host_name = host.split('.')[0]
-    config_entry = f"""
-Host {host_name}-{alias}
-    HostName {host}
-    User git
-    IdentityFile ~/.ssh/{key_name}
-""".strip()
-
-    if os.path.exists(shared_config_path):
-        with open(shared_config_path, 'r') as f:
-            existing_config = f.read()
+    valid, errors = manager.validate_manifest(rows)
+
+    if not valid:
+        QMessageBox.critical(window, "Błąd", "Żaden wiersz manifestu nie jest poprawny.\n\n" + format_errors(errors))
+        return
+
+    if errors:
+        reply = QMessageBox.question(
+            window, "Import",
+            f"{len(errors)} wierszy ma błędy i zostanie pominiętych:\n\n{format_errors(errors)}\n\nKontynuować dla {len(valid)} poprawnych?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+    manager.pending_aliases.update(row['alias'] for row in valid)
+    import_button.setEnabled(False)
+    progress_bar.setRange(0, len(valid))
+    progress_bar.setValue(0)
+    progress_bar.show()
+
+    submit(
+        manager.generate_manifest_keys, valid, BULK_CONCURRENCY,
+        on_progress=lambda done, total: progress_bar.setValue(done),
+        on_finished=lambda result: manifest_generated(valid, errors, *result),
+        on_failed=lambda message: manifest_failed(valid, message),
+    )
+
+
+def manifest_finished(rows):
+    manager.pending_aliases.difference_update(row['alias'] for row in rows)
+    import_button.setEnabled(True)
+    progress_bar.hide()
+
+
+def manifest_failed(rows, message):
+    manifest_finished(rows)
+    QMessageBox.critical(window, "Błąd", f"Import przerwany: {message}")
+
+
+# W wątku GUI: metadane i config zapisujemy raz dla całej paczki
+def manifest_generated(rows, validation_errors, created, keygen_errors):
+    from bulk import format_errors
+
+    manifest_finished(rows)
+    records = manager.commit_manifest_keys(created)
+
+    errors = sorted(validation_errors + keygen_errors)
+    summary = f"Utworzono kluczy: {len(records)}."
+    if errors:
+        QMessageBox.warning(window, "Import", f"{summary}\nBłędy: {len(errors)}\n\n{format_errors(errors)}")
     else:
-        existing_config = ""
+        QMessageBox.information(window, "Import", summary)
 
-    if config_entry not in existing_config:
-        with open(shared_config_path, 'a') as f:
-            f.write("\n\n" + config_entry)
 
-    key_metadata = {
-        "key_name": key_name,
-        "email": email,
-        "hostname": host,
-        "alias": alias,
-        "key_path": key_path,
-        "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
+# Rotacja kluczy starszych niż SSHGEN_ROTATE_DAYS dni (bez zmiennej jest
+# wyłączona). Co ROTATION_CHECK_MINUTES sprawdzany jest początek kolejki
+# rotacji; nowe klucze powstają w tle paczkami, a config i metadane są
+# podmieniane w wątku GUI. Stare klucze czekają SSHGEN_ROTATE_GRACE_DAYS dni.
+ROTATION_CHECK_MINUTES = 60
 
+
+def env_days(name):
     try:
-        with open(keys_json_path, 'r') as f:
-            keys_data = json.load(f)
-    except json.JSONDecodeError:
-        keys_data = []
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return None
 
-    keys_data.append(key_metadata)
 
-    with open(keys_json_path, 'w') as f:
-        json.dump(keys_data, f, indent=4)
+def start_rotation():
+    if env_days('SSHGEN_ROTATE_DAYS') is None:
+        return
+    rotation_timer.start(ROTATION_CHECK_MINUTES * 60 * 1000)
+    rotate_due_keys()
 
-    update_table()
 
+def rotate_due_keys():
+    from core import KeyManagerError
+    from rotation import DEFAULT_GRACE_DAYS
 
-def copy_key_to_ssh():
-    alias = alias_input.text().strip()
-    if not alias:
-        QMessageBox.warning(window, "Błąd", "Podaj alias do skopiowania.")
+    global rotation_rows
+    max_age_days = env_days('SSHGEN_ROTATE_DAYS')
+    if rotation_rows is not None or max_age_days is None:
+        return
+    try:
+        rows = manager.plan_rotation(max_age_days, exclude=rotation_failed)
+    except KeyManagerError:
+        return
+    if not rows:
+        grace_days = env_days('SSHGEN_ROTATE_GRACE_DAYS')
+        submit(manager.purge_rotated, DEFAULT_GRACE_DAYS if grace_days is None else grace_days)
         return
 
-    with open(keys_json_path, 'r') as f:
-        keys_data = json.load(f)
+    rotation_rows = rows
+    manager.pending_aliases.update(row['alias'] for row in rows)
+    submit(
+        manager.generate_rotation_keys, rows, BULK_CONCURRENCY,
+        on_finished=lambda result: rotation_generated(*result),
+        on_failed=rotation_failed_batch,
+    )
 
-    key_entry = next((k for k in keys_data if k['alias'] == alias), None)
 
-    if not key_entry:
-        QMessageBox.warning(window, "Błąd", f"Nie znaleziono aliasu {alias}.")
-        return
+def rotation_finished():
+    global rotation_rows
+    rows, rotation_rows = rotation_rows, None
+    manager.pending_aliases.difference_update(row['alias'] for row in rows)
+    return rows
+
 
-    key_path = key_entry["key_path"]
-    public_key_path = f"{key_path}.pub"
-    destination = os.path.expanduser("~/.ssh/")
+def rotation_failed_batch(message):
+    rows = rotation_finished()
+    rotation_failed.update(row['alias'] for row in rows)
+    QMessageBox.warning(window, "Rotacja kluczy", f"Rotacja przerwana: {message}")
 
-    if not os.path.exists(destination):
-        os.makedirs(destination)
 
+# W wątku GUI: config i metadane całej paczki, potem następna paczka
+def rotation_generated(created, errors):
+    from bulk import format_errors
+    from core import KeyManagerError
+
+    rotation_finished()
     try:
-        shutil.copy(key_path, destination)
-        shutil.copy(public_key_path, destination)
+        manager.commit_rotation(created)
+    except (OSError, KeyError, KeyManagerError) as e:
+        rotation_failed.update(row['alias'] for row in created)
+        QMessageBox.warning(window, "Rotacja kluczy", f"Nie udało się podmienić kluczy: {e}")
+        return
+    if errors:
+        rotation_failed.update(alias for _, alias, _ in errors)
+        QMessageBox.warning(window, "Rotacja kluczy", f"Nie udało się wymienić kluczy: {len(errors)}\n\n{format_errors(errors)}")
+    QTimer.singleShot(0, rotate_due_keys)
+
+
+# Synchronizacja wszystkich kluczy i bloków Host z ~/.ssh. Najpierw w tle
+# liczony jest plan (co się zmieniło), użytkownik widzi podgląd zmian
+# i dopiero po potwierdzeniu pliki są podmieniane.
+def sync_to_ssh():
+    copy_button.setEnabled(False)
+    update_table()
+    submit(
+        manager.plan_sync, records=store.all(),
+        on_finished=sync_planned,
+        on_failed=sync_failed,
+    )
 
-        if os.path.exists(shared_config_path):
-            shutil.copy(shared_config_path, os.path.join(destination, "config"))
 
-        QMessageBox.information(window, "Sukces", f"Pliki skopiowane do {destination}")
-    except Exception as e:
-        QMessageBox.critical(window, "Błąd", f"Nie udało się skopiować: {e}")
+def sync_failed(message):
+    copy_button.setEnabled(True)
+    QMessageBox.critical(window, "Błąd", f"Nie udało się zsynchronizować: {message}")
+
+
+def sync_planned(plan):
+    if plan.empty():
+        copy_button.setEnabled(True)
+        details = f"\n\n{plan.describe()}" if plan.problems else ""
+        QMessageBox.information(window, "Synchronizacja", f"{plan.dest_dir} jest aktualny.{details}")
+        return
+
+    box = QMessageBox(
+        QMessageBox.Icon.Question, "Synchronizacja",
+        f"Zmiany w {plan.dest_dir}:\n\n{plan.describe()}\n\nZastosować?",
+        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, window,
+    )
+    diff = plan.config_diff()
+    if diff:
+        box.setDetailedText(diff)
+    if box.exec() != QMessageBox.StandardButton.Yes:
+        copy_button.setEnabled(True)
+        return
+
+    submit(
+        manager.apply_sync, plan,
+        on_finished=lambda count: sync_applied(plan, count),
+        on_failed=sync_failed,
+    )
+
+
+def sync_applied(plan, count):
+    copy_button.setEnabled(True)
+    QMessageBox.information(window, "Sukces", f"Zastosowano zmian: {count} w {plan.dest_dir}")
+
+
+# Pliki usuniętych kluczy czekają w koszu UNDO_SECONDS, potem kasuje je wątek w tle
+UNDO_SECONDS = 30
 
 
 def delete_all():
+    global pending_purge
     reply = QMessageBox.question(window, 'Usuwanie', 'Czy na pewno chcesz usunąć wszystkie klucze i pliki konfiguracyjne?', QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
     if reply == QMessageBox.StandardButton.Yes:
-        for key in os.listdir(keys_dir):
-            os.remove(os.path.join(keys_dir, key))
+        if pending_purge is not None:
+            purge_now()
+        pending_purge = manager.delete_all()
 
-        if os.path.exists(shared_config_path):
-            os.remove(shared_config_path)
+        update_table()
+        undo_button.show()
+        purge_timer.start(UNDO_SECONDS * 1000)
+        QMessageBox.information(window, "Sukces", f"Wszystkie dane zostały usunięte. Przez {UNDO_SECONDS} s można to cofnąć.")
 
-        with open(keys_json_path, 'w') as f:
-            json.dump([], f)
 
-        update_table()
-        QMessageBox.information(window, "Sukces", "Wszystkie dane zostały usunięte.")
+def undo_delete_all():
+    from core import KeyManagerError
+
+    global pending_purge
+    purge_timer.stop()
+    undo_button.hide()
+    trash_path, pending_purge = pending_purge, None
+    try:
+        records = manager.undo_delete_all(trash_path)
+    except KeyManagerError as e:
+        QMessageBox.warning(window, "Błąd", str(e))
+        submit(manager.purge_trash, trash_path)
+        return
+    QMessageBox.information(window, "Sukces", f"Przywrócono kluczy: {len(records)}.")
+
 
+def purge_now():
+    global pending_purge
+    purge_timer.stop()
+    undo_button.hide()
+    trash_path, pending_purge = pending_purge, None
+    if trash_path is not None:
+        submit(manager.purge_trash, trash_path)
 
+
+# Pole aliasu przyjmuje też listę: "jan, anna piotr"
 def delete_alias():
-    alias_to_delete = alias_input.text()
-    if not alias_to_delete:
+    aliases = [alias for alias in re.split(r'[,\s]+', alias_input.text()) if alias]
+    if not aliases:
         QMessageBox.warning(window, "Błąd", "Nie podano aliasu do usunięcia.")
         return
+    delete_keys(aliases)
 
-    with open(keys_json_path, 'r') as f:
-        keys_data = json.load(f)
-
-    keys_data_to_delete = [key for key in keys_data if key['alias'] == alias_to_delete]
 
-    if not keys_data_to_delete:
-        QMessageBox.warning(window, "Błąd", f"Nie znaleziono aliasu {alias_to_delete}.")
+def delete_selected():
+    rows = sorted({index.row() for index in table.selectionModel().selectedRows()})
+    if not rows:
+        QMessageBox.warning(window, "Błąd", "Nie zaznaczono żadnego klucza.")
         return
+    aliases = [table_model.record_at(row)['alias'] for row in rows]
+    reply = QMessageBox.question(window, 'Usuwanie', f'Czy na pewno chcesz usunąć zaznaczone klucze ({len(aliases)})?', QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+    if reply == QMessageBox.StandardButton.Yes:
+        delete_keys(aliases)
+
 
-    for key in keys_data_to_delete:
-        key_path = key['key_path']
-        key_pub_path = f"{key_path}.pub"
-        if os.path.exists(key_path):
-            os.remove(key_path)
-        if os.path.exists(key_pub_path):
-            os.remove(key_pub_path)
-
-    if os.path.exists(shared_config_path):
-        with open(shared_config_path, 'r') as f:
-            lines = f.readlines()
-
-        host_prefix = f"Host {keys_data_to_delete[0]['hostname'].split('.')[0]}-{alias_to_delete}"
-        new_lines = []
-        skip = False
-        for line in lines:
-            if line.strip().startswith("Host ") and line.strip() == host_prefix:
-                skip = True
-                continue
-            if skip and line.strip().startswith("Host "):
-                skip = False
-            if not skip:
-                new_lines.append(line)
-
-        with open(shared_config_path, 'w') as f:
-            f.writelines(new_lines)
-
-    keys_data = [key for key in keys_data if key['alias'] != alias_to_delete]
-
-    with open(keys_json_path, 'w') as f:
-        json.dump(keys_data, f, indent=4)
+# Metadane i config zmieniane od razu, jednym zapisem każde;
+# pliki kluczy usuwa wątek roboczy, potem jedno podsumowanie
+def delete_keys(aliases):
+    from core import remove_key_files
 
+    deleted, missing = manager.delete_aliases(aliases, remove_files=False)
     update_table()
-    QMessageBox.information(window, "Sukces", f"Alias {alias_to_delete} został usunięty.")
+    if not deleted:
+        QMessageBox.warning(window, "Błąd", f"Nie znaleziono aliasu {', '.join(missing)}.")
+        return
+    submit(
+        remove_key_files, deleted,
+        on_finished=lambda removed: keys_deleted(deleted, missing),
+        on_failed=lambda message: QMessageBox.warning(window, "Błąd", f"Klucze usunięto z listy, ale nie wszystkie pliki: {message}"),
+    )
 
 
-def show_config():
-    if not os.path.exists(shared_config_path):
-        QMessageBox.critical(window, "Błąd", "Plik config nie istnieje.")
+def keys_deleted(deleted, missing):
+    if len(deleted) == 1 and not missing:
+        QMessageBox.information(window, "Sukces", f"Alias {deleted[0]['alias']} został usunięty.")
         return
+    message = f"Usunięto kluczy: {len(deleted)}."
+    if missing:
+        message += f"\n\nNie znaleziono: {', '.join(missing)}"
+    QMessageBox.information(window, "Sukces", message)
 
-    with open(shared_config_path, 'r') as f:
-        full_config = f.read()
 
-    if not full_config.strip():
+# Config i keys.json w podglądzie stronicowanym (text_viewer) - okno
+# pokazuje tylko widoczne linie, z wyszukiwaniem i skokiem do aliasu
+def show_config():
+    from core import KeyManagerError
+    from keygen import host_alias_for
+    from text_viewer import PagedText, TextViewer, locate_host_block
+
+    try:
+        config_view = manager.config_view()
+    except KeyManagerError as e:
+        QMessageBox.critical(window, "Błąd", str(e))
+        return
+
+    if not len(config_view):
         QMessageBox.information(window, "Config SSH", "Plik config jest pusty.")
-    else:
-        QMessageBox.information(window, "Config SSH", full_config.strip())
+        return
 
+    def locate(text, alias):
+        record = manager.get(alias)
+        if record is None:
+            return None
+        return locate_host_block(text, host_alias_for(record['hostname'], alias))
+
+    TextViewer(PagedText(config_view), "Config SSH", locate, window).exec()
 
-def show_keys_json():
-    with open(keys_json_path, 'r') as f:
-        keys_data = json.load(f)
 
-    if not keys_data:
+# Przy dzienniku i SQLite keys.json trzeba najpierw wyeksportować - w tle
+def show_keys_json():
+    if not len(store):
         QMessageBox.critical(window, "Błąd", "Brak danych do wyświetlenia.")
         return
 
-    json_content = json.dumps(keys_data, indent=4)
-    QMessageBox.information(window, "keys.json", json_content)
+    show_keys_json_button.setEnabled(False)
+    update_table()
+    submit(
+        manager.current_keys_json, records=store.all(),
+        on_finished=keys_json_ready,
+        on_failed=lambda message: (show_keys_json_button.setEnabled(True), QMessageBox.critical(window, "Błąd", message)),
+    )
+
+
+def keys_json_ready(path):
+    from text_viewer import PagedText, TextViewer, locate_json_record
+
+    show_keys_json_button.setEnabled(True)
+    try:
+        text = PagedText.open(path)
+    except OSError as e:
+        QMessageBox.critical(window, "Błąd", f"Nie udało się otworzyć {path}: {e}")
+        return
+    TextViewer(text, "keys.json", locate_json_record, window).exec()
 
 
+# Model tabeli sam śledzi zmiany magazynu; tu tylko wyłapujemy zmiany
+# pliku zrobione poza aplikacją. Tylko w wątku GUI - wątki robocze dostają
+# kopię store.all() zamiast same wczytywać zmiany.
 def update_table():
-    with open(keys_json_path, 'r') as f:
-        try:
-            keys_data = json.load(f)
-        except json.JSONDecodeError:
-            keys_data = []
+    from tracing import span
+
+    with span('update_table'):
+        store.reload_if_changed()
+
+
+# Przegląd katalogu kluczy w tle: duplikaty, sieroty .pub, brakujące pliki
+def check_keys():
+    check_button.setEnabled(False)
+    update_table()
+    submit(
+        manager.check_keys, records=store.all(),
+        on_finished=keys_checked,
+        on_failed=lambda message: (check_button.setEnabled(True), QMessageBox.critical(window, "Błąd", f"Nie udało się sprawdzić kluczy: {message}")),
+    )
+
 
-    table.setRowCount(0)
+def keys_checked(report):
+    from fingerprints import format_check
 
-    for key in keys_data:
-        row_position = table.rowCount()
-        table.insertRow(row_position)
-        table.setItem(row_position, 0, QTableWidgetItem(key['key_name']))
-        table.setItem(row_position, 1, QTableWidgetItem(key['hostname']))
-        table.setItem(row_position, 2, QTableWidgetItem(key['alias']))
-        table.setItem(row_position, 3, QTableWidgetItem(key['email']))
+    check_button.setEnabled(True)
+    text = format_check(report)
+    if not text:
+        QMessageBox.information(window, "Sprawdzanie kluczy", "Nie znaleziono problemów.")
+        return
+    box = QMessageBox(QMessageBox.Icon.Warning, "Sprawdzanie kluczy", f"Znaleziono problemów: {len(text.splitlines())}.", QMessageBox.StandardButton.Ok, window)
+    box.setDetailedText(text)
+    box.exec()
+
+
+def show_debug_panel():
+    from debug_panel import DebugPanel
+
+    panel = DebugPanel(manager.trace_log_path if manager else None, window)
+    panel.exec()
+
+
+# W wątku roboczym: katalog kluczy, wczytanie metadanych i indeks wyszukiwania.
+# Gdy działa usługa (daemon.py) dla tego katalogu, GUI jest jej klientem.
+# SSHGEN_DAEMON=0 wymusza pracę bezpośrednio na plikach.
+def load_keys():
+    from core import KeyManager, app_base_dir
+    from search_index import SearchIndex
+
+    client = None
+    if os.environ.get('SSHGEN_DAEMON', '1') != '0':
+        from daemon_client import connect
+        client = connect(app_base_dir())
+    if client is not None:
+        from remote_manager import RemoteKeyManager
+        loaded_manager = RemoteKeyManager(client)
+    else:
+        loaded_manager = KeyManager()
+    return loaded_manager, SearchIndex(loaded_manager.store)
+
+
+# W wątku GUI, gdy klucze są wczytane - od tej chwili aplikacja jest gotowa
+def keys_loaded(result):
+    from file_watcher import StoreWatcher
+    from workers import MainThreadCall
+
+    global manager, store, store_watcher
+    manager, search_index = result
+    store = manager.store
+    table_model.attach(store, search_index)
+    # Klient usługi: zdarzenia z gniazda nakładane w wątku GUI
+    if hasattr(store, 'drain'):
+        store.wake = MainThreadCall(store.drain, window)
+        store.drain()
+    table_model.set_query(search_input.text())
+    # Zmiany plików z zewnątrz (inna instancja, skrypt) trafiają do tabeli same
+    store_watcher = StoreWatcher(manager, window)
+    # Kosz z poprzedniego uruchomienia - okno cofania już minęło
+    submit(manager.purge_trash)
+
+    for widget in manager_widgets:
+        widget.setEnabled(True)
+
+    if manager.store_warning:
+        QMessageBox.warning(window, "Uwaga", manager.store_warning)
+
+    # Spójność metadanych, plików kluczy i bloków Host - w tle przy każdym
+    # starcie; rotacja dopiero po niej, żeby nie zmieniać stanu pod naprawą
+    submit(manager.fsck, records=store.all(), on_finished=lambda report: (fsck_checked(report), start_rotation()))
+
+    # W trybie dziennika i SQLite keys.json zostaje jako eksport aktualnego stanu
+    if manager.exports_json():
+        app.aboutToQuit.connect(manager.export_json_if_changed)
+
+    startup_interactive()
+
+
+def fsck_checked(report):
+    if report.empty():
+        return
+    if not report.repairable():
+        box = QMessageBox(QMessageBox.Icon.Warning, "Spójność kluczy", f"Znaleziono problemów: {len(report.problems)}.", QMessageBox.StandardButton.Ok, window)
+        box.setDetailedText(report.describe())
+        box.exec()
+        return
+    box = QMessageBox(
+        QMessageBox.Icon.Question, "Spójność kluczy",
+        f"Metadane, pliki kluczy i bloki Host nie są spójne (problemów: {len(report.problems)}).\n\nNaprawić? Usuwane pliki trafią do kosza.",
+        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, window,
+    )
+    box.setDetailedText(report.describe())
+    if box.exec() != QMessageBox.StandardButton.Yes:
+        return
+    from core import KeyManagerError
+
+    # Zmiany magazynu w wątku GUI - model tabeli dostaje je od razu
+    try:
+        repaired = manager.repair(report)
+    except (OSError, KeyError, KeyManagerError) as e:
+        QMessageBox.critical(window, "Błąd", f"Naprawa nie powiodła się, nic nie zmieniono: {e}")
+        return
+    QMessageBox.information(window, "Spójność kluczy", f"Naprawiono problemów: {repaired}.")
+
+
+def keys_failed(message):
+    QMessageBox.critical(window, "Błąd", f"Nie udało się wczytać kluczy: {message}")
+    startup_interactive()
+
+
+def startup_interactive():
+    if profiler is None:
+        return
+    profiler.mark('interactive')
+    profiler.report()
+    app.quit()
 
 
 # GUI setup
-app = QApplication(sys.argv)
-
-app.setStyleSheet("""
-    QWidget {
-        background-color: #2e2e2e;
-        color: white;
-        font-size: 14px;
-    }
-    QLineEdit, QPushButton, QTableWidget {
-        background-color: #444444;
-        border: 1px solid #888888;
-        color: white;
-    }
-    QPushButton:hover {
-        background-color: #555555;
-    }
-    QTableWidget {
-        color: white;
-        border: 1px solid #888888;
-    }
-    QHeaderView::section {
-        background-color: #333333;
-        color: white;
-        font-weight: bold;
-    }
-""")
-
-window = QWidget()
-window.setWindowTitle("SSH Key Manager")
-layout = QVBoxLayout()
-
-form_layout = QVBoxLayout()
-
-email_input = QLineEdit()
-email_input.setPlaceholderText("Email")
-form_layout.addWidget(email_input)
-
-host_input = QLineEdit()
-host_input.setPlaceholderText("Host")
-form_layout.addWidget(host_input)
-
-alias_input = QLineEdit()
-alias_input.setPlaceholderText("Alias/Użytkownik")
-form_layout.addWidget(alias_input)
-
-layout.addLayout(form_layout)
-
-button_layout = QHBoxLayout()
-
-generate_button = QPushButton("Generuj klucz")
-generate_button.clicked.connect(lambda: generate_ssh_key(email_input.text(), host_input.text(), alias_input.text()))
-button_layout.addWidget(generate_button)
-
-copy_button = QPushButton("Kopiuj do ~/.ssh")
-copy_button.clicked.connect(copy_key_to_ssh)
-button_layout.addWidget(copy_button)
-
-delete_all_button = QPushButton("Usuń wszystko")
-delete_all_button.clicked.connect(delete_all)
-button_layout.addWidget(delete_all_button)
-
-delete_alias_button = QPushButton("Usuń alias")
-delete_alias_button.clicked.connect(delete_alias)
-button_layout.addWidget(delete_alias_button)
-
-show_config_button = QPushButton("Pokaż config")
-show_config_button.clicked.connect(show_config)
-button_layout.addWidget(show_config_button)
-
-show_keys_json_button = QPushButton("Pokaż keys.json")
-show_keys_json_button.clicked.connect(show_keys_json)
-button_layout.addWidget(show_keys_json_button)
-
-layout.addLayout(button_layout)
-
-table = QTableWidget()
-table.setColumnCount(4)
-table.setHorizontalHeaderLabels(["Nazwa Klucza", "Host", "Alias", "Email"])
-table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-
-layout.addWidget(table)
-
-window.setLayout(layout)
-update_table()
-window.show()
-
-sys.exit(app.exec())
+if __name__ == '__main__':
+    manager = None
+    store = None
+    store_watcher = None
+    pending_purge = None
+    # Paczka kluczy w trakcie rotacji i aliasy, których nie udało się zrotować
+    rotation_rows = None
+    rotation_failed = set()
+
+    # --profile-startup: wypisz czasy startu i zakończ program
+    profiler = None
+    if '--profile-startup' in sys.argv:
+        sys.argv.remove('--profile-startup')
+        from startup_profile import StartupProfiler
+        profiler = StartupProfiler(startup_t0)
+        profiler.mark('imports')
+
+    app = QApplication(sys.argv)
+
+    app.setStyleSheet("""
+        QWidget {
+            background-color: #2e2e2e;
+            color: white;
+            font-size: 14px;
+        }
+        QLineEdit, QPushButton, QTableView {
+            background-color: #444444;
+            border: 1px solid #888888;
+            color: white;
+        }
+        QPushButton:hover {
+            background-color: #555555;
+        }
+        QTableView {
+            color: white;
+            border: 1px solid #888888;
+        }
+        QHeaderView::section {
+            background-color: #333333;
+            color: white;
+            font-weight: bold;
+        }
+    """)
+
+    window = QWidget()
+    window.setWindowTitle("SSH Key Manager")
+    layout = QVBoxLayout()
+
+    form_layout = QVBoxLayout()
+
+    email_input = QLineEdit()
+    email_input.setPlaceholderText("Email")
+    form_layout.addWidget(email_input)
+
+    host_input = QLineEdit()
+    host_input.setPlaceholderText("Host")
+    form_layout.addWidget(host_input)
+
+    alias_input = QLineEdit()
+    alias_input.setPlaceholderText("Alias/Użytkownik")
+    form_layout.addWidget(alias_input)
+
+    layout.addLayout(form_layout)
+
+    button_layout = QHBoxLayout()
+
+    generate_button = QPushButton("Generuj klucz")
+    generate_button.clicked.connect(lambda: generate_ssh_key(email_input.text(), host_input.text(), alias_input.text()))
+    button_layout.addWidget(generate_button)
+
+    import_button = QPushButton("Importuj manifest")
+    import_button.clicked.connect(import_manifest)
+    button_layout.addWidget(import_button)
+
+    copy_button = QPushButton("Synchronizuj ~/.ssh")
+    copy_button.clicked.connect(sync_to_ssh)
+    button_layout.addWidget(copy_button)
+
+    delete_all_button = QPushButton("Usuń wszystko")
+    delete_all_button.clicked.connect(delete_all)
+    button_layout.addWidget(delete_all_button)
+
+    undo_button = QPushButton("Cofnij usuwanie")
+    undo_button.clicked.connect(undo_delete_all)
+    undo_button.hide()
+    button_layout.addWidget(undo_button)
+    purge_timer = QTimer(window)
+    purge_timer.setSingleShot(True)
+    purge_timer.timeout.connect(purge_now)
+    # Przy zamknięciu okna kosz zostaje - opróżni go następne uruchomienie
+    rotation_timer = QTimer(window)
+    rotation_timer.timeout.connect(rotate_due_keys)
+
+    delete_alias_button = QPushButton("Usuń alias")
+    delete_alias_button.clicked.connect(delete_alias)
+    button_layout.addWidget(delete_alias_button)
+
+    delete_selected_button = QPushButton("Usuń zaznaczone")
+    delete_selected_button.clicked.connect(delete_selected)
+    button_layout.addWidget(delete_selected_button)
+
+    show_config_button = QPushButton("Pokaż config")
+    show_config_button.clicked.connect(show_config)
+    button_layout.addWidget(show_config_button)
+
+    show_keys_json_button = QPushButton("Pokaż keys.json")
+    show_keys_json_button.clicked.connect(show_keys_json)
+    button_layout.addWidget(show_keys_json_button)
+
+    check_button = QPushButton("Sprawdź klucze")
+    check_button.clicked.connect(check_keys)
+    button_layout.addWidget(check_button)
+
+    debug_button = QPushButton("Diagnostyka")
+    debug_button.clicked.connect(show_debug_panel)
+    button_layout.addWidget(debug_button)
+
+    layout.addLayout(button_layout)
+
+    progress_bar = QProgressBar()
+    progress_bar.hide()
+    layout.addWidget(progress_bar)
+
+    search_input = QLineEdit()
+    search_input.setPlaceholderText("Szukaj (alias, host, email, nazwa klucza)")
+    layout.addWidget(search_input)
+
+    # Model startuje pusty; magazyn i indeks podpina keys_loaded
+    table_model = KeyTableModel()
+    search_input.textChanged.connect(table_model.set_query)
+    table = QTableView()
+    table.setModel(table_model)
+    table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+    # Stała wysokość wierszy - widok nie musi mierzyć każdego wiersza
+    table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+    table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+
+    layout.addWidget(table)
+
+    window.setLayout(layout)
+
+    # Do czasu wczytania kluczy działa tylko samo okno
+    manager_widgets = [
+        generate_button, import_button, copy_button, delete_all_button,
+        delete_alias_button, delete_selected_button, show_config_button, show_keys_json_button, check_button, search_input,
+    ]
+    for widget in manager_widgets:
+        widget.setEnabled(False)
+
+    if profiler is not None:
+        profiler.watch_first_paint(window)
+    window.show()
+
+    submit(load_keys, on_finished=keys_loaded, on_failed=keys_failed)
+
+    sys.exit(app.exec())
@@ -0,0 +1,256 @@
+import os
+import threading
+
+from core import KeyManagerError
+from daemon_client import DaemonError
+from keygen import key_name_for
+from bulk import generate_keys
+from fsck import FsckReport
+from rotation import DEFAULT_BATCH
+
+
+# GUI jako klient usługi (daemon.py): te same metody co KeyManager, ale
+# stan trzyma usługa. Pliki kluczy GUI nadal generuje i usuwa samo w wątkach
+# roboczych - usługa działa na tym samym katalogu - a metadane i config
+# zmienia już tylko usługa.
+
+class RemoteStore:
+    # Kopia listy kluczy usługi z interfejsem odczytu KeyStore. Zdarzenia
+    # z gniazda trafiają do kolejki (wątek czytający), a drain() w wątku
+    # GUI nakłada je na kopię i powiadamia słuchaczy (model tabeli, indeks).
+    def __init__(self, client):
+        self._client = client
+        self._records = []
+        self._by_alias = {}
+        self._listeners = []
+        self._events = []
+        self._events_lock = threading.Lock()
+        # Wołane z wątku czytającego po każdym zdarzeniu - GUI podpina tu
+        # wywołanie drain() w swoim wątku
+        self.wake = None
+        self.path = None
+
+    def load(self, records):
+        self._records = records
+        self._by_alias = {record['alias']: record for record in records}
+
+    def enqueue(self, message):
+        with self._events_lock:
+            self._events.append(message)
+        if self.wake is not None:
+            self.wake()
+
+    def drain(self):
+        with self._events_lock:
+            events, self._events = self._events, []
+        for message in events:
+            self._apply(message)
+
+    def _apply(self, message):
+        event = message['event']
+        record = message.get('record')
+        row = message.get('row')
+        if event == 'add':
+            self._records.append(record)
+            self._by_alias[record['alias']] = record
+            self._notify('add', record, len(self._records) - 1)
+        elif event == 'remove':
+            old = self._by_alias.pop(record['alias'], None)
+            if old is None:
+                return
+            row = next(i for i, r in enumerate(self._records) if r is old)
+            del self._records[row]
+            self._notify('remove', old, row)
+        elif event == 'update':
+            old = self._by_alias.get(record['alias'])
+            if old is None:
+                return
+            row = next(i for i, r in enumerate(self._records) if r is old)
+            self._records[row] = record
+            self._by_alias[record['alias']] = record
+            self._notify('update', record, row)
+        else:
+            # Lista przychodzi w zdarzeniu - bez wywołania usługi z wątku GUI
+            self.load(message['records'])
+            self._notify('reset')
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event, record=None, row=None):
+        for listener in list(self._listeners):
+            listener(event, record, row)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __contains__(self, alias):
+        return alias in self._by_alias
+
+    def all(self):
+        return list(self._records)
+
+    def record_at(self, row):
+        return self._records[row]
+
+    def get(self, alias):
+        return self._by_alias.get(alias)
+
+    # Zmiany z zewnątrz zgłasza usługa
+    def reload_if_changed(self):
+        return False
+
+    def watched_paths(self):
+        return []
+
+
+# Podgląd synchronizacji policzony przez usługę (SyncPlan bez akcji)
+class RemoteSyncPlan:
+    def __init__(self, data, aliases=None):
+        self.dest_dir = data['dest_dir']
+        self.problems = data['problems']
+        # Do apply_sync: te same aliasy i skrót planu z podglądu
+        self.aliases = aliases
+        self.digest = data['digest']
+        self._data = data
+
+    def empty(self):
+        return self._data['empty']
+
+    def describe(self):
+        return self._data['describe']
+
+    def config_diff(self):
+        return self._data['config_diff']
+
+
+class RemoteKeyManager:
+    def __init__(self, client):
+        self.client = client
+        self.store = RemoteStore(client)
+        client.on_event = self.store.enqueue
+        state = self._call('subscribe')
+        self.store.load(state['records'])
+        self.base_dir = state['base_dir']
+        self.keys_dir = state['keys_dir']
+        self.config_dir = state['config_dir']
+        self.trace_log_path = state['trace_log_path']
+        self.store_warning = state['store_warning']
+        self.pending_aliases = set()
+
+    def _call(self, method, **params):
+        try:
+            return self.client.call(method, **params)
+        except DaemonError as e:
+            raise KeyManagerError(str(e))
+
+    # --- generowanie ---
+
+    def prepare_key(self, email, host, alias):
+        if not email or not host or not alias:
+            raise KeyManagerError("Wszystkie pola muszą być wypełnione!")
+
+        key_name = key_name_for(alias)
+        key_path = os.path.join(self.keys_dir, key_name)
+        if os.path.exists(key_path) or alias in self.pending_aliases or alias in self.store:
+            raise KeyManagerError(f"Klucz o nazwie {key_name} już istnieje!")
+        return key_path
+
+    def register_key(self, email, host, alias):
+        return self._call('register', email=email, host=host, alias=alias)
+
+    def validate_manifest(self, rows):
+        result = self._call('validate_manifest', rows=rows, taken_aliases=sorted(self.pending_aliases))
+        return result['valid'], [tuple(error) for error in result['errors']]
+
+    def generate_manifest_keys(self, rows, concurrency=4, progress=None, engine=None):
+        return generate_keys(rows, self.keys_dir, concurrency, progress, engine)
+
+    def commit_manifest_keys(self, rows):
+        return self._call('commit', rows=rows)
+
+    # --- rotacja ---
+
+    def plan_rotation(self, max_age_days, limit=DEFAULT_BATCH, exclude=()):
+        return self._call('plan_rotation', max_age_days=max_age_days, limit=limit, exclude=sorted(exclude))
+
+    def generate_rotation_keys(self, rows, concurrency=4, progress=None, engine=None):
+        return generate_keys(rows, self.keys_dir, concurrency, progress, engine)
+
+    def commit_rotation(self, rows):
+        return self._call('commit_rotation', rows=rows)
+
+    def purge_rotated(self, grace_days=None):
+        return self._call('purge_rotated', grace_days=grace_days)
+
+    # --- usuwanie ---
+
+    def delete_aliases(self, aliases, remove_files=True):
+        result = self._call('delete', aliases=list(aliases), remove_files=remove_files)
+        return result['deleted'], result['missing']
+
+    def delete_all(self):
+        return self._call('delete_all')
+
+    def undo_delete_all(self, trash_path):
+        return self._call('undo_delete_all', trash_path=trash_path)
+
+    def purge_trash(self, trash_path=None):
+        return self._call('purge_trash', trash_path=trash_path)
+
+    # --- odczyt ---
+
+    def list_keys(self):
+        return self.store.all()
+
+    def get(self, alias):
+        return self.store.get(alias)
+
+    def config_text(self):
+        return self._call('config')
+
+    # Usługa i tak przysyła cały tekst
+    def config_view(self):
+        return self.config_text().encode('utf-8')
+
+    # records (kopia z wątku GUI) pomijane - usługa pracuje na własnym stanie
+
+    # Ścieżka keys.json aktualnego na chwilę wywołania
+    def current_keys_json(self, records=None):
+        return self._call('keys_json')
+
+    def check_keys(self, records=None):
+        return self._call('check')
+
+    def fsck(self, records=None):
+        report = FsckReport()
+        for problem in self._call('fsck')['problems']:
+            report.add(problem['kind'], problem['subject'], problem['message'], problem['repair'])
+        return report
+
+    # Usługa liczy plan od nowa i naprawia w jednym przebiegu
+    def repair(self, report):
+        return self._call('repair')['repaired']
+
+    # --- ~/.ssh ---
+
+    def plan_sync(self, aliases=None, dest_dir=None, records=None):
+        aliases = list(aliases) if aliases is not None else None
+        return RemoteSyncPlan(self._call('sync', aliases=aliases, dest_dir=dest_dir, dry_run=True), aliases)
+
+    # Usługa wykonuje plan tylko, gdy zgadza się z podglądem (digest)
+    def apply_sync(self, plan):
+        return self._call('sync', aliases=plan.aliases, dest_dir=plan.dest_dir, digest=plan.digest)['applied']
+
+    # keys.json eksportuje usługa
+    def exports_json(self):
+        return False
+
+    def export_json(self, path=None):
+        pass
@@ -0,0 +1,220 @@
+import os
+import time
+import heapq
+import shutil
+from datetime import datetime
+
+from keygen import rotated_key_name, config_entry_for, write_config_entries
+from key_store import write_json_atomic
+from tracing import span, count
+
+
+# Rotacja kluczy starszych niż N dni. Kolejka to kopiec min po czasie
+# utworzenia (pole 'created'), więc "co jest do rotacji" czyta tylko
+# początek kopca zamiast przeglądać wszystkie wpisy. Kopiec powstaje przy
+# pierwszym pytaniu, a potem nadąża za magazynem przez jego zdarzenia;
+# nieaktualne pozycje (usunięte albo już zrotowane klucze) są odrzucane
+# dopiero, gdy trafią na początek.
+#
+# Rotacja jednej paczki:
+#   1. nowe pary kluczy pod nową nazwą (id_ed25519_<alias>.<czas>) - poza
+#      wątkiem GUI, najwyżej concurrency naraz (bulk.generate_keys),
+#   2. fragmenty configu z nowym IdentityFile - każdy podmieniany atomowo,
+#   3. metadane jednym batch(),
+#   4. stare pliki kluczy do .rotated/<czas>/ na okres karencji
+#      (purge_rotated kasuje je później).
+# Przerwanie między krokami zostawia stan, który fsck rozpozna i naprawi.
+
+CREATED_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Ile kluczy rotować w jednej paczce (jedna transakcja metadanych)
+DEFAULT_BATCH = 50
+DEFAULT_GRACE_DAYS = 7
+DAY_SECONDS = 24 * 60 * 60
+
+
+# Czas utworzenia jako znacznik czasu; dla starych albo ręcznie
+# poprawianych wpisów bez poprawnej daty - czas modyfikacji pliku klucza
+def created_timestamp(record):
+    try:
+        return datetime.fromisoformat(record['created']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        return os.path.getmtime(record['key_path'])
+    except (KeyError, OSError):
+        return 0.0
+
+
+class RotationSchedule:
+    def __init__(self, store):
+        self.store = store
+        # (czas utworzenia, alias, nazwa klucza); None - do zbudowania
+        self._heap = None
+        self._stale = 0
+        store.subscribe(self._store_changed)
+
+    def _build(self):
+        with span('rotation_schedule', keys=len(self.store)):
+            self._heap = [(created_timestamp(record), record['alias'], record['key_name']) for record in self.store.all()]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _ensure_built(self):
+        if self._heap is None:
+            self._build()
+
+    def _store_changed(self, event, record, row):
+        if self._heap is None:
+            return
+        if event == 'reset':
+            self._heap = None
+            return
+        if event in ('update', 'remove'):
+            self._stale += 1
+        if event in ('add', 'update'):
+            heapq.heappush(self._heap, (created_timestamp(record), record['alias'], record['key_name']))
+        # Więcej nieaktualnych pozycji niż aktualnych - taniej zbudować od nowa
+        if self._stale > len(self._heap) // 2 + 64:
+            self._heap = None
+
+    # Rekord, jeśli pozycja kopca wciąż go opisuje
+    def _current(self, entry):
+        timestamp, alias, key_name = entry
+        record = self.store.get(alias)
+        if record is None or record['key_name'] != key_name or created_timestamp(record) != timestamp:
+            return None
+        return record
+
+    # Klucze utworzone przed now - max_age_days, od najstarszego.
+    # Koszt zależy od liczby zwróconych kluczy, nie od wielkości magazynu.
+    def due(self, max_age_days, now=None, limit=None, exclude=()):
+        self._ensure_built()
+        cutoff = (now if now is not None else time.time()) - max_age_days * DAY_SECONDS
+        heap = self._heap
+        records = []
+        keep = []
+        seen = set()
+        while heap and heap[0][0] <= cutoff and (limit is None or len(records) < limit):
+            entry = heapq.heappop(heap)
+            alias = entry[1]
+            # Po aktualizacji bez zmiany klucza (np. odcisk) alias bywa w kopcu dwa razy
+            if alias in seen:
+                self._stale = max(0, self._stale - 1)
+                continue
+            record = self._current(entry)
+            if record is None:
+                self._stale = max(0, self._stale - 1)
+                continue
+            seen.add(alias)
+            keep.append(entry)
+            if alias not in exclude:
+                records.append(record)
+        for entry in keep:
+            heapq.heappush(heap, entry)
+        return records
+
+    # Kiedy najbliższy klucz osiągnie max_age_days (znacznik czasu) albo None
+    def next_due(self, max_age_days):
+        self._ensure_built()
+        heap = self._heap
+        while heap:
+            if self._current(heap[0]) is not None:
+                return heap[0][0] + max_age_days * DAY_SECONDS
+            heapq.heappop(heap)
+            self._stale = max(0, self._stale - 1)
+        return None
+
+
+# Wiersze dla bulk.generate_keys: nowa ścieżka klucza i stary rekord
+def plan_rotation(records, keys_dir, now=None):
+    when = now or datetime.now()
+    rows = []
+    for number, record in enumerate(records, start=1):
+        key_name = rotated_key_name(record['alias'], when)
+        rows.append({
+            'row': number,
+            'alias': record['alias'],
+            'email': record['email'],
+            'host': record['hostname'],
+            'key_name': key_name,
+            'key_path': os.path.join(keys_dir, key_name),
+            'old': record,
+        })
+    return rows
+
+
+def _move_if_exists(src, dest):
+    try:
+        os.replace(src, dest)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+# Po wygenerowaniu nowych kluczy: config, metadane, stare pliki do karencji.
+# Klucze usunięte albo zmienione w międzyczasie są pomijane, a ich nowe
+# pliki usuwane. Zwraca nowe rekordy.
+def commit_rotation(rows, store, fragments, fingerprints, rotated_dir):
+    with span('commit_rotation', keys=len(rows)):
+        store.reload_if_changed()
+        current = []
+        for row in rows:
+            record = store.get(row['alias'])
+            if record is not None and record['key_name'] == row['old']['key_name']:
+                current.append(row)
+                continue
+            for path in (row['key_path'], f"{row['key_path']}.pub"):
+                if os.path.exists(path):
+                    os.remove(path)
+                    count('files_removed')
+        if not current:
+            return []
+
+        created = datetime.now().strftime(CREATED_FORMAT)
+        records = []
+        for row in current:
+            record = dict(row['old'], key_name=row['key_name'], key_path=row['key_path'], created=created)
+            fingerprint = fingerprints.update(f"{row['key_path']}.pub")
+            if fingerprint:
+                record['fingerprint'] = fingerprint
+            else:
+                record.pop('fingerprint', None)
+            records.append(record)
+
+        # write_config_entries podmienia każdy fragment przez rename
+        write_config_entries(fragments, [config_entry_for(record['hostname'], record['alias'], record['key_name']) for record in records])
+        with store.batch():
+            for record in records:
+                store.update(record)
+
+        grace_path = os.path.join(rotated_dir, datetime.now().strftime('%Y%m%d%H%M%S%f'))
+        os.makedirs(grace_path)
+        write_json_atomic(os.path.join(grace_path, 'keys.json'), [row['old'] for row in current])
+        for row in current:
+            old_path = row['old']['key_path']
+            name = os.path.basename(old_path)
+            _move_if_exists(old_path, os.path.join(grace_path, name))
+            _move_if_exists(f"{old_path}.pub", os.path.join(grace_path, f"{name}.pub"))
+            fingerprints.forget(f"{old_path}.pub")
+        count('keys_rotated', len(records))
+        return records
+
+
+# Kasuje stare klucze, których okres karencji minął. Zwraca liczbę paczek.
+def purge_rotated(rotated_dir, grace_days=DEFAULT_GRACE_DAYS, now=None):
+    with span('purge_rotated'):
+        cutoff = (now if now is not None else time.time()) - grace_days * DAY_SECONDS
+        try:
+            names = os.listdir(rotated_dir)
+        except FileNotFoundError:
+            return 0
+        purged = 0
+        for name in names:
+            try:
+                rotated_at = datetime.strptime(name, '%Y%m%d%H%M%S%f').timestamp()
+            except ValueError:
+                continue
+            if rotated_at <= cutoff:
+                shutil.rmtree(os.path.join(rotated_dir, name), ignore_errors=True)
+                purged += 1
+        return purged
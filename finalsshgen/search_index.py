@@ -0,0 +1,207 @@
+import re
+import bisect
+import itertools
+
+
+SEARCH_FIELDS = ('alias', 'hostname', 'email', 'key_name')
+
+# Pola dzielone są na słowa: "jan.kowalski@firma.pl" daje "jan", "kowalski", "firma", "pl"
+_WORD_SPLIT = re.compile(r'[^0-9a-z]+')
+
+# Słowo zapytania, które jest prefiksem więcej tokenów albo pasuje do więcej
+# niż 1/BROAD_SHARE rekordów, sprawdzamy rekord po rekordzie zamiast
+# sumować listy aliasów wszystkich jego tokenów
+BROAD_TOKENS = 64
+BROAD_SHARE = 8
+# Separator tokenów w tekście rekordu - nie występuje w żadnym tokenie
+_SEP = '\x00'
+
+
+def record_tokens(record):
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        value = str(record.get(field) or '').lower()
+        if not value:
+            continue
+        tokens.update(word for word in _WORD_SPLIT.split(value) if word)
+    return tokens
+
+
+def query_words(query):
+    return [word for word in _WORD_SPLIT.split(query.lower()) if word]
+
+
+# Indeks prefiksowy do wyszukiwania kluczy w trakcie pisania.
+# Posortowana lista tokenów (słów z pól) pozwala znaleźć wszystkie tokeny
+# z danym prefiksem bisekcją, a każdy token wskazuje zbiór aliasów.
+# Indeks jest aktualizowany przyrostowo na zdarzeniach magazynu.
+#
+# Wyniki są liczone leniwie (iter_records), więc model tabeli pobiera je
+# stronami i krótkie zapytanie pasujące do prawie wszystkiego kosztuje tyle,
+# co jedna strona, a nie cały magazyn.
+class SearchIndex:
+    def __init__(self, store):
+        self._store = store
+        self._sorted_tokens = []
+        self._postings = {}
+        self._records = {}
+        self._order = {}
+        # alias -> tokeny rekordu jako "\0tok\0tok" dla szerokich słów
+        self._texts = {}
+        self._counter = itertools.count()
+        self.rebuild()
+        store.subscribe(self._store_changed)
+
+    def rebuild(self):
+        self._sorted_tokens = []
+        self._postings = {}
+        self._records = {}
+        self._order = {}
+        self._texts = {}
+        for record in self._store:
+            alias = record['alias']
+            self._records[alias] = record
+            self._order[alias] = next(self._counter)
+            tokens = record_tokens(record)
+            self._texts[alias] = _SEP + _SEP.join(tokens)
+            for token in tokens:
+                posting = self._postings.get(token)
+                if posting is None:
+                    self._postings[token] = {alias}
+                else:
+                    posting.add(alias)
+        self._sorted_tokens = sorted(self._postings)
+
+    def _add_tokens(self, alias, tokens):
+        self._texts[alias] = _SEP + _SEP.join(tokens)
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                self._postings[token] = {alias}
+                bisect.insort(self._sorted_tokens, token)
+            else:
+                posting.add(alias)
+
+    def _remove_tokens(self, alias, tokens):
+        for token in tokens:
+            posting = self._postings[token]
+            posting.discard(alias)
+            if not posting:
+                del self._postings[token]
+                del self._sorted_tokens[bisect.bisect_left(self._sorted_tokens, token)]
+
+    def add(self, record):
+        alias = record['alias']
+        self._records[alias] = record
+        self._order[alias] = next(self._counter)
+        self._add_tokens(alias, record_tokens(record))
+
+    def remove(self, record):
+        alias = record['alias']
+        if self._order.pop(alias, None) is None:
+            return
+        del self._records[alias]
+        del self._texts[alias]
+        self._remove_tokens(alias, record_tokens(record))
+
+    # Nowa treść rekordu o tym samym aliasie - miejsce w kolejności zostaje
+    def update(self, record):
+        alias = record['alias']
+        old = self._records.get(alias)
+        if old is None:
+            return self.add(record)
+        self._records[alias] = record
+        self._remove_tokens(alias, record_tokens(old))
+        self._add_tokens(alias, record_tokens(record))
+
+    def _store_changed(self, event, record, row):
+        if event == 'add':
+            self.add(record)
+        elif event == 'remove':
+            self.remove(record)
+        elif event == 'update':
+            self.update(record)
+        else:
+            self.rebuild()
+
+    # Zbiór aliasów, w których każde słowo zapytania jest prefiksem
+    # któregoś tokena (słowa łączone przez AND)
+    def search(self, query):
+        words = query_words(query)
+        if not words:
+            return None
+        result = None
+        for word in sorted(words, key=len, reverse=True):
+            matches = self._prefix_matches(word)
+            result = matches if result is None else result & matches
+            if not result:
+                return set()
+        return result
+
+    def _token_range(self, prefix):
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        end = bisect.bisect_left(self._sorted_tokens, prefix + '\uffff', start)
+        return start, end
+
+    def _prefix_matches(self, prefix):
+        start, end = self._token_range(prefix)
+        if end - start == 1:
+            return set(self._postings[self._sorted_tokens[start]])
+        return set().union(*(self._postings[token] for token in self._sorted_tokens[start:end]))
+
+    # Rekordy pasujące do zapytania w kolejności magazynu, leniwie
+    # (None = bez filtra). Wąskie słowa dają małe zbiory aliasów, których
+    # część wspólna jest sortowana od razu; szerokie słowa sprawdzane są
+    # w tekście rekordu dopiero wtedy, gdy ktoś poprosi o kolejne wyniki.
+    # Bez wąskiego słowa przeglądana jest kopia kolejności magazynu, więc
+    # zmiany magazynu w trakcie pobierania wyników jej nie psują.
+    def iter_records(self, query):
+        words = query_words(query)
+        if not words:
+            return None
+        limit = len(self._order) // BROAD_SHARE
+        sets = []
+        needles = []
+        for word in words:
+            start, end = self._token_range(word)
+            if start == end:
+                return iter(())
+            postings = [self._postings[token] for token in self._sorted_tokens[start:end]] if end - start <= BROAD_TOKENS else None
+            if postings is None or sum(map(len, postings)) > limit:
+                needles.append(_SEP + word)
+            else:
+                sets.append(postings[0] if len(postings) == 1 else set().union(*postings))
+
+        if sets:
+            sets.sort(key=len)
+            aliases = sorted(sets[0].intersection(*sets[1:]), key=self._order.__getitem__)
+        else:
+            aliases = list(self._records)
+        return self._matching(aliases, needles)
+
+    def _matching(self, aliases, needles):
+        records = self._records
+        texts = self._texts
+        for alias in aliases:
+            record = records.get(alias)
+            # Usunięty, odkąd zaczęło się pobieranie wyników
+            if record is None:
+                continue
+            text = texts[alias]
+            for needle in needles:
+                if needle not in text:
+                    break
+            else:
+                yield record
+
+    # Wszystkie wyniki naraz; None = bez filtra
+    def search_records(self, query):
+        records = self.iter_records(query)
+        return None if records is None else list(records)
+
+    # Sprawdzenie pojedynczego rekordu bez indeksu (dla nowo dodanych)
+    @staticmethod
+    def matches(record, query):
+        words = query_words(query)
+        tokens = record_tokens(record)
+        return all(any(token.startswith(word) for token in tokens) for word in words)
@@ -0,0 +1,340 @@
+import os
+import sys
+import json
+import bisect
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from key_store import KeyStore, KeyStoreError
+
+
+FIELDS = ('key_name', 'email', 'hostname', 'alias', 'key_path', 'created')
+
+# Pola spoza FIELDS (np. dodane w przyszłości) trafiają do kolumny extra jako JSON
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keys (
+    id INTEGER PRIMARY KEY,
+    key_name TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    hostname TEXT NOT NULL,
+    alias TEXT NOT NULL UNIQUE,
+    key_path TEXT NOT NULL,
+    created TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS keys_hostname ON keys(hostname);
+CREATE INDEX IF NOT EXISTS keys_email ON keys(email);
+"""
+
+SELECT = f"SELECT {', '.join(FIELDS)}, extra FROM keys"
+ITER_CHUNK = 1000
+
+
+# Magazyn metadanych w SQLite z tym samym interfejsem co KeyStore.
+# Tryb WAL pozwala kilku instancjom czytać równolegle z jednym piszącym,
+# a batch() to jedna transakcja obejmująca wiele zmian.
+#
+# Numer wiersza (dla słuchaczy i record_at) to pozycja id na posortowanej
+# liście id trzymanej w pamięci - bisekcja zamiast COUNT(*) i OFFSET, które
+# przeglądają tabelę przy każdej zmianie. Lista jest wczytywana od nowa
+# tylko po zmianach z innych połączeń i po wycofanej transakcji.
+class SqliteKeyStore:
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._listeners = []
+        self.timeout = timeout
+        # Posortowane id wierszy; None - do wczytania
+        self._ids = None
+        self._connect()
+
+    def _connect(self):
+        try:
+            self._conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._data_version = self._read_data_version()
+        except sqlite3.DatabaseError as e:
+            raise KeyStoreError(f"Baza {self.path} jest uszkodzona: {e}", self.path)
+
+    def close(self):
+        self._conn.close()
+
+    # Słuchacze jak w KeyStore: (zdarzenie, rekord, wiersz)
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event, record=None, row=None):
+        for listener in list(self._listeners):
+            listener(event, record, row)
+
+    # --- odczyt ---
+
+    def __len__(self):
+        with self._lock:
+            return len(self._row_ids())
+
+    # Rekordy po kolei, paczkami po ITER_CHUNK (po id) - bez listy wszystkich
+    def __iter__(self):
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(f"SELECT id, {', '.join(FIELDS)}, extra FROM keys WHERE id > ? ORDER BY id LIMIT ?", (last_id, ITER_CHUNK)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._to_record(row[1:])
+            last_id = rows[-1][0]
+
+    def __contains__(self, alias):
+        return self._query_one("SELECT 1 FROM keys WHERE alias = ?", (alias,)) is not None
+
+    def all(self):
+        return self._query(f"{SELECT} ORDER BY id")
+
+    def record_at(self, row):
+        with self._lock:
+            rows = self._query(f"{SELECT} WHERE id = ?", (self._row_ids()[row],))
+        if not rows:
+            raise IndexError(row)
+        return rows[0]
+
+    def get(self, alias):
+        rows = self._query(f"{SELECT} WHERE alias = ?", (alias,))
+        return rows[0] if rows else None
+
+    def find_by_key_name(self, key_name):
+        rows = self._query(f"{SELECT} WHERE key_name = ?", (key_name,))
+        return rows[0] if rows else None
+
+    def find_by_hostname(self, hostname):
+        return self._query(f"{SELECT} WHERE hostname = ? ORDER BY id", (hostname,))
+
+    def find_by_email(self, email):
+        return self._query(f"{SELECT} WHERE email = ? ORDER BY id", (email,))
+
+    # --- zmiany ---
+
+    def add(self, record):
+        extra = {k: v for k, v in record.items() if k not in FIELDS}
+        values = [record[field] for field in FIELDS]
+        values.append(json.dumps(extra) if extra else None)
+        with self._lock:
+            # Lista id sprzed zmiany - wczytana po niej miałaby już nowy wiersz
+            ids = self._row_ids()
+            try:
+                row_id = self._conn.execute(
+                    f"INSERT INTO keys ({', '.join(FIELDS)}, extra) VALUES ({', '.join('?' * (len(FIELDS) + 1))})",
+                    values,
+                ).lastrowid
+            except sqlite3.IntegrityError:
+                raise KeyError(f"Alias {record['alias']} już istnieje")
+            # Nowe id jest zwykle największe - wtedy to zwykłe dopisanie
+            row = len(ids) if not ids or row_id > ids[-1] else bisect.bisect_left(ids, row_id)
+            ids.insert(row, row_id)
+        self._notify('add', record, row)
+
+    def update(self, record):
+        extra = {k: v for k, v in record.items() if k not in FIELDS}
+        values = [record[field] for field in FIELDS if field != 'alias']
+        values.append(json.dumps(extra) if extra else None)
+        with self.batch():
+            row_id, old = self._find(record['alias'])
+            if old is None:
+                raise KeyError(f"Alias {record['alias']} nie istnieje")
+            row = bisect.bisect_left(self._row_ids(), row_id)
+            self._execute(
+                f"UPDATE keys SET {', '.join(f'{field} = ?' for field in FIELDS if field != 'alias')}, extra = ? WHERE alias = ?",
+                values + [record['alias']],
+            )
+        self._notify('update', record, row)
+        return old
+
+    def remove(self, alias):
+        with self.batch():
+            row_id, record = self._find(alias)
+            if record is None:
+                return None
+            ids = self._row_ids()
+            self._execute("DELETE FROM keys WHERE id = ?", (row_id,))
+            row = bisect.bisect_left(ids, row_id)
+            del ids[row]
+        self._notify('remove', record, row)
+        return record
+
+    def remove_many(self, aliases):
+        with self.batch():
+            removed = [self.remove(alias) for alias in aliases]
+        return [record for record in removed if record is not None]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM keys")
+            self._ids = []
+        self._notify('reset')
+
+    # Jak KeyStore.move_to: plik bazy idzie do kosza jednym rename, a na jego
+    # miejscu powstaje pusta baza. Przed zamknięciem WAL jest wgrywany do
+    # bazy, żeby przeniesiony plik był kompletny.
+    def move_to(self, directory):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+            for path in self._files():
+                if os.path.exists(path):
+                    os.replace(path, os.path.join(directory, os.path.basename(path)))
+            self._connect()
+            self._ids = []
+        self._notify('reset')
+
+    def restore_from(self, directory):
+        with self._lock:
+            if not os.path.exists(os.path.join(directory, os.path.basename(self.path))):
+                return False
+            self._conn.close()
+            for path in self._files():
+                moved = os.path.join(directory, os.path.basename(path))
+                if os.path.exists(moved):
+                    os.replace(moved, path)
+                elif os.path.exists(path):
+                    os.remove(path)
+            self._connect()
+            self._ids = None
+        self._notify('reset')
+        return True
+
+    def _files(self):
+        return [self.path, f"{self.path}-wal", f"{self.path}-shm"]
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            if self._batch_depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._conn.execute("ROLLBACK")
+                    self._ids = None
+                    self._notify('reset')
+                raise
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._conn.execute("COMMIT")
+                self._data_version = self._read_data_version()
+
+    def flush(self):
+        pass
+
+    # --- synchronizacja z innymi instancjami ---
+
+    # data_version zmienia się tylko po zatwierdzeniu zmian przez inne połączenie
+    def reload_if_changed(self):
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._ids = None
+            self._notify('reset')
+            return True
+        return False
+
+    def reload(self):
+        self._data_version = self._read_data_version()
+        self._ids = None
+        self._notify('reset')
+
+    def watched_paths(self):
+        return [self.path, f"{self.path}-wal"]
+
+    # --- pomocnicze ---
+
+    # Wołane pod self._lock
+    def _row_ids(self):
+        if self._ids is None:
+            self._ids = [row[0] for row in self._conn.execute("SELECT id FROM keys ORDER BY id")]
+        return self._ids
+
+    # (id, rekord) po aliasie; (None, None), gdy go nie ma
+    def _find(self, alias):
+        with self._lock:
+            row = self._conn.execute(f"SELECT id, {', '.join(FIELDS)}, extra FROM keys WHERE alias = ?", (alias,)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], self._to_record(row[1:])
+
+    def _read_data_version(self):
+        return self._query_one("PRAGMA data_version")[0]
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def _query_one(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    @staticmethod
+    def _to_record(row):
+        record = dict(zip(FIELDS, row))
+        if row[-1]:
+            record.update(json.loads(row[-1]))
+        return record
+
+
+# Jednorazowe przeniesienie keys.json do bazy. Baza, która już ma wpisy,
+# nie jest ruszana (chyba że force=True) i zwracane jest None, więc
+# migrację można puszczać wielokrotnie.
+def migrate_json_to_sqlite(json_path, db_path, force=False):
+    records = KeyStore(json_path).all()
+    store = SqliteKeyStore(db_path)
+    try:
+        if len(store) and not force:
+            return None
+        with store.batch():
+            store.clear()
+            for record in records:
+                store.add(record)
+        return len(records)
+    finally:
+        store.close()
+
+
+# Katalogi trzech wersji aplikacji w repozytorium
+def default_app_dirs():
+    repo_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    return [os.path.join(repo_dir, name) for name in ('finalsshgen', 'sshkeygen', 'zajecia')]
+
+
+def main(argv):
+    force = '--force' in argv
+    app_dirs = [arg for arg in argv if arg != '--force'] or default_app_dirs()
+
+    for app_dir in app_dirs:
+        json_path = os.path.join(app_dir, 'keys.json')
+        db_path = os.path.join(app_dir, 'keys.db')
+        if not os.path.exists(json_path):
+            print(f"{app_dir}: brak keys.json, pomijam")
+            continue
+        migrated = migrate_json_to_sqlite(json_path, db_path, force=force)
+        if migrated is None:
+            print(f"{app_dir}: {db_path} już zawiera dane, pomijam (--force nadpisuje)")
+            continue
+        print(f"{app_dir}: przeniesiono {migrated} kluczy do {db_path}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
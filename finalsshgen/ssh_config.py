@@ -0,0 +1,206 @@
+import os
+import re
+import tempfile
+
+from tracing import count
+
+
+# Parser pliku ~/.ssh/config, który zachowuje oryginalny tekst.
+# Plik dzielony jest na wstęp (linie przed pierwszym Host/Match) i bloki.
+# Każdy blok trzyma swoje surowe linie, więc komentarze i bloki, których
+# nie ruszamy, zapisują się bajt w bajt tak, jak były.
+
+_KEYWORD = re.compile(r'\s*([A-Za-z]+)\s*(?:=\s*|\s+)(.*?)\s*$')
+
+
+def _parse_option(line):
+    stripped = line.strip()
+    if not stripped or stripped.startswith('#'):
+        return None
+    match = _KEYWORD.match(stripped)
+    if not match:
+        return (stripped, '')
+    return (match.group(1), match.group(2))
+
+
+class HostBlock:
+    def __init__(self, lines, leading=None):
+        # leading - komentarze i puste linie bezpośrednio nad "Host ..."
+        self.leading = leading or []
+        self.lines = lines
+        keyword, value = _parse_option(lines[0])
+        self.keyword = keyword.lower()
+        self.patterns = value.split()
+        self.options = [option for option in map(_parse_option, lines[1:]) if option is not None]
+
+    def get(self, name):
+        name = name.lower()
+        for key, value in self.options:
+            if key.lower() == name:
+                return value
+        return None
+
+    # Porównanie po treści, nie po białych znakach
+    def same_options(self, options):
+        normalized = [(key.lower(), value) for key, value in self.options]
+        return normalized == [(key.lower(), value) for key, value in options]
+
+    def text(self):
+        return ''.join(self.leading) + ''.join(self.lines)
+
+
+class SshConfig:
+    def __init__(self, text='', path=None):
+        self.path = path
+        self.newline = '\r\n' if '\r\n' in text else '\n'
+        self.preamble = []
+        self.blocks = []
+        self._by_pattern = {}
+        self.original_text = text
+        self._parse(text)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, 'r', newline='') as f:
+                text = f.read()
+        except FileNotFoundError:
+            text = ''
+        count('bytes_read', len(text))
+        return cls(text, path)
+
+    def _parse(self, text):
+        current = None
+        pending = []
+        for line in text.splitlines(keepends=True):
+            option = _parse_option(line)
+            if option is not None and option[0].lower() in ('host', 'match'):
+                current = HostBlock([line], pending)
+                pending = []
+                self.blocks.append(current)
+            elif option is None:
+                # Komentarze/puste linie czekają - należą do następnego bloku,
+                # chyba że po nich przyjdzie jeszcze opcja bieżącego
+                pending.append(line)
+            elif current is None:
+                self.preamble.extend(pending)
+                self.preamble.append(line)
+                pending = []
+            else:
+                current.lines.extend(pending)
+                current.lines.append(line)
+                current.options.append(option)
+                pending = []
+        if current is None:
+            self.preamble.extend(pending)
+        else:
+            current.lines.extend(pending)
+        self._reindex()
+
+    def _reindex(self):
+        self._by_pattern = {}
+        for block in self.blocks:
+            if block.keyword != 'host':
+                continue
+            for pattern in block.patterns:
+                self._by_pattern.setdefault(pattern, block)
+
+    def __contains__(self, pattern):
+        return pattern in self._by_pattern
+
+    def find(self, pattern):
+        return self._by_pattern.get(pattern)
+
+    def host_patterns(self):
+        return list(self._by_pattern)
+
+    # Linia "Include wzorzec" na początku pliku (przed pierwszym Host działa
+    # dla wszystkich hostów). Zwraca True, jeśli trzeba było ją dodać.
+    def ensure_include(self, pattern):
+        for line in self.preamble:
+            option = _parse_option(line)
+            if option is not None and option[0].lower() == 'include' and pattern in option[1].split():
+                return False
+        nl = self.newline
+        lines = [f"Include {pattern}{nl}"]
+        if self.blocks or any(line.strip() for line in self.preamble):
+            lines.append(nl)
+        self.preamble[:0] = lines
+        return True
+
+    def _format_block(self, pattern, options):
+        nl = self.newline
+        lines = [f"Host {pattern}{nl}"]
+        lines += [f"    {key} {value}{nl}" for key, value in options]
+        return lines
+
+    def add_block(self, pattern, options):
+        if pattern in self._by_pattern:
+            raise KeyError(f"Blok Host {pattern} już istnieje")
+        nl = self.newline
+        last_lines = self.blocks[-1].lines if self.blocks else self.preamble
+        if last_lines and not last_lines[-1].endswith(('\n', '\r')):
+            last_lines[-1] += nl
+        leading = [nl] if self.blocks or any(line.strip() for line in self.preamble) else []
+        block = HostBlock(self._format_block(pattern, options), leading)
+        self.blocks.append(block)
+        self._by_pattern[pattern] = block
+        return block
+
+    def remove_block(self, pattern):
+        block = self._by_pattern.get(pattern)
+        if block is None:
+            return False
+        self.blocks.remove(block)
+        self._reindex()
+        return True
+
+    # Podmienia opcje bloku, zostawiając jego komentarze nad nim w spokoju
+    def update_block(self, pattern, options):
+        block = self._by_pattern.get(pattern)
+        if block is None:
+            return self.add_block(pattern, options)
+        if block.same_options(options):
+            return block
+        index = self.blocks.index(block)
+        updated = HostBlock(self._format_block(pattern, options), block.leading)
+        self.blocks[index] = updated
+        self._reindex()
+        return updated
+
+    def text(self):
+        return ''.join(self.preamble) + ''.join(block.text() for block in self.blocks)
+
+    def changed(self):
+        return self.text() != self.original_text
+
+    # Zapis tylko przy zmianie, atomowo (plik tymczasowy + rename)
+    def save(self, path=None):
+        path = path or self.path
+        text = self.text()
+        if text == self.original_text and os.path.exists(path):
+            return False
+        write_text_atomic(path, text)
+        self.original_text = text
+        return True
+
+
+def write_text_atomic(path, text, mode=None):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.config-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+            count('bytes_written', f.tell())
+            count('files_written')
+        if mode is None and os.path.exists(path):
+            mode = os.stat(path).st_mode & 0o777
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,232 @@
+import os
+import glob
+import stat
+import locale
+import shutil
+import difflib
+import hashlib
+import tempfile
+
+from keygen import host_alias_for
+from ssh_config import SshConfig
+from config_fragments import fragment_name, FRAGMENT_SUFFIX
+from tracing import span, count
+
+
+PRIVATE_MODE = 0o600
+PUBLIC_MODE = 0o644
+CONFIG_MODE = 0o600
+
+# Fragmenty configu lądują w ~/.ssh/sshgen.d, a ~/.ssh/config dostaje
+# jedną linię Include (ścieżki względne liczą się od ~/.ssh)
+FRAGMENTS_DIR = 'sshgen.d'
+INCLUDE_PATTERN = f"{FRAGMENTS_DIR}/*.conf"
+
+
+def default_ssh_dir():
+    return os.path.expanduser("~/.ssh")
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+# Powód kopiowania albo None, jeśli plik w ~/.ssh jest aktualny.
+# Ten sam rozmiar i mtime wystarczą (kopiujemy z zachowaniem mtime),
+# hash liczymy tylko gdy metadane się różnią.
+def _copy_reason(src, dest):
+    try:
+        dest_st = os.stat(dest)
+    except FileNotFoundError:
+        return "nowy plik"
+    src_st = os.stat(src)
+    if src_st.st_size != dest_st.st_size:
+        return "inna zawartość"
+    if src_st.st_mtime_ns == dest_st.st_mtime_ns:
+        return None
+    if _file_hash(src) != _file_hash(dest):
+        return "inna zawartość"
+    return None
+
+
+def _wrong_mode(path, mode):
+    if os.name != 'posix' or not os.path.exists(path):
+        return False
+    return stat.S_IMODE(os.stat(path).st_mode) != mode
+
+
+class SyncAction:
+    def __init__(self, kind, dest, src=None, mode=None, reason=''):
+        self.kind = kind
+        self.dest = dest
+        self.src = src
+        self.mode = mode
+        self.reason = reason
+
+    def describe(self):
+        name = os.path.basename(self.dest)
+        if self.kind == 'copy':
+            return f"kopiuj {name} ({self.reason})"
+        if self.kind == 'chmod':
+            return f"uprawnienia {name} -> {self.mode:o}"
+        if self.kind == 'remove':
+            return f"usuń {name} ({self.reason})"
+        return f"config: {self.reason}"
+
+
+# Plan synchronizacji - nic nie zmienia na dysku, dopóki nie wywołamy apply_sync
+class SyncPlan:
+    def __init__(self, dest_dir, config):
+        self.dest_dir = dest_dir
+        self.config = config
+        self.actions = []
+        self.problems = []
+
+    def empty(self):
+        return not self.actions
+
+    def describe(self):
+        lines = [action.describe() for action in self.actions]
+        lines += [f"pominięto: {problem}" for problem in self.problems]
+        return "\n".join(lines)
+
+    def config_diff(self):
+        before = self.config.original_text.splitlines(keepends=True)
+        after = self.config.text().splitlines(keepends=True)
+        config_path = os.path.join(self.dest_dir, 'config')
+        return ''.join(difflib.unified_diff(before, after, config_path, f"{config_path} (po synchronizacji)"))
+
+
+# Porównuje zarządzane klucze i fragmenty configu (ConfigFragments)
+# z katalogiem ~/.ssh. aliases=None oznacza wszystkie klucze z magazynu.
+def plan_sync(records, fragments, dest_dir=None, aliases=None):
+    with span('sync_plan'):
+        return _plan_sync(records, fragments, dest_dir, aliases)
+
+
+def _plan_sync(records, fragments, dest_dir=None, aliases=None):
+    dest_dir = dest_dir or default_ssh_dir()
+    user_config = SshConfig.load(os.path.join(dest_dir, 'config'))
+    managed_config = fragments.config()
+    plan = SyncPlan(dest_dir, user_config)
+
+    wanted = set(aliases) if aliases is not None else None
+    synced = 0
+    moved_blocks = []
+    known_fragments = set()
+    for record in records:
+        try:
+            known_fragments.add(fragment_name(host_alias_for(record['hostname'], record['alias'])))
+        except ValueError:
+            pass
+        if wanted is not None and record['alias'] not in wanted:
+            continue
+
+        key_path = record['key_path']
+        for src, mode in ((key_path, PRIVATE_MODE), (f"{key_path}.pub", PUBLIC_MODE)):
+            dest = os.path.join(dest_dir, os.path.basename(src))
+            if not os.path.exists(src):
+                plan.problems.append(f"{record['alias']}: brak pliku {src}")
+                continue
+            reason = _copy_reason(src, dest)
+            if reason:
+                plan.actions.append(SyncAction('copy', dest, src, mode, reason))
+            elif _wrong_mode(dest, mode):
+                plan.actions.append(SyncAction('chmod', dest, mode=mode))
+
+        pattern = host_alias_for(record['hostname'], record['alias'])
+        src = fragments.fragment_path(pattern)
+        block = managed_config.find(pattern)
+        if block is None or not os.path.exists(src):
+            plan.problems.append(f"{record['alias']}: brak fragmentu configu dla Host {pattern}")
+            continue
+        synced += 1
+        dest = os.path.join(dest_dir, FRAGMENTS_DIR, os.path.basename(src))
+        reason = _copy_reason(src, dest)
+        if reason:
+            plan.actions.append(SyncAction('copy', dest, src, CONFIG_MODE, reason))
+        elif _wrong_mode(dest, CONFIG_MODE):
+            plan.actions.append(SyncAction('chmod', dest, mode=CONFIG_MODE))
+
+        # Blok wpisany do ~/.ssh/config przez starszą wersję jest teraz we
+        # fragmencie; zmieniony ręcznie zostawiamy użytkownikowi
+        existing = user_config.find(pattern)
+        if existing is not None:
+            if existing.same_options(block.options):
+                user_config.remove_block(pattern)
+                moved_blocks.append(pattern)
+            else:
+                plan.problems.append(f"{record['alias']}: blok Host {pattern} w {dest_dir}/config różni się od zarządzanego")
+
+    # Fragmenty po kluczach usuniętych z magazynu - inaczej ssh dalej
+    # czytałby ich bloki Host przez Include
+    for dest in sorted(glob.glob(os.path.join(dest_dir, FRAGMENTS_DIR, '*' + FRAGMENT_SUFFIX))):
+        if os.path.basename(dest) not in known_fragments:
+            plan.actions.append(SyncAction('remove', dest, reason="brak klucza w magazynie"))
+
+    reasons = []
+    if synced and user_config.ensure_include(INCLUDE_PATTERN):
+        reasons.append(f"Include {INCLUDE_PATTERN}")
+    if moved_blocks:
+        reasons.append(f"bloki Host przeniesione do {FRAGMENTS_DIR}: {', '.join(moved_blocks)}")
+
+    config_path = os.path.join(dest_dir, 'config')
+    if reasons:
+        plan.actions.append(SyncAction('config', config_path, mode=CONFIG_MODE, reason='; '.join(reasons)))
+    elif _wrong_mode(config_path, CONFIG_MODE):
+        plan.actions.append(SyncAction('chmod', config_path, mode=CONFIG_MODE))
+    return plan
+
+
+# Wykonuje plan w dwóch fazach: najpierw wszystko trafia do plików
+# tymczasowych w ~/.ssh, potem szybka seria rename. Błąd w pierwszej fazie
+# nie zostawia w ~/.ssh żadnej zmiany.
+def apply_sync(plan):
+    with span('file_copy', actions=len(plan.actions)):
+        return _apply_sync(plan)
+
+
+def _apply_sync(plan):
+    os.makedirs(plan.dest_dir, mode=0o700, exist_ok=True)
+    staged = []
+    try:
+        for action in plan.actions:
+            if action.kind in ('chmod', 'remove'):
+                continue
+            os.makedirs(os.path.dirname(action.dest), mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=plan.dest_dir, prefix='.sync-', suffix='.tmp')
+            staged.append((tmp_path, action))
+            with os.fdopen(fd, 'wb') as f:
+                if action.kind == 'copy':
+                    with open(action.src, 'rb') as src:
+                        shutil.copyfileobj(src, f)
+                else:
+                    # To samo kodowanie, którym SshConfig.load czyta config
+                    f.write(plan.config.text().encode(locale.getpreferredencoding(False)))
+                f.flush()
+                os.fsync(f.fileno())
+                count('bytes_written', f.tell())
+                count('files_written')
+            os.chmod(tmp_path, action.mode)
+            if action.kind == 'copy':
+                src_st = os.stat(action.src)
+                os.utime(tmp_path, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
+    except BaseException:
+        for tmp_path, _ in staged:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    for tmp_path, action in staged:
+        os.replace(tmp_path, action.dest)
+    for action in plan.actions:
+        if action.kind == 'chmod':
+            os.chmod(action.dest, action.mode)
+        elif action.kind == 'remove' and os.path.exists(action.dest):
+            os.remove(action.dest)
+    plan.config.original_text = plan.config.text()
+    return len(plan.actions)
@@ -0,0 +1,35 @@
+import sys
+import json
+import time
+
+from PyQt6.QtCore import QObject, QEvent
+
+
+# Pomiar startu aplikacji (--profile-startup): czas do pierwszego
+# narysowania okna i do chwili, gdy klucze są wczytane i przyciski działają.
+# Czasy liczone od t0 - pierwszej linii main.py.
+class StartupProfiler(QObject):
+    def __init__(self, t0, parent=None):
+        super().__init__(parent)
+        self.t0 = t0
+        self.marks = {}
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = (time.perf_counter() - self.t0) * 1000
+
+    def watch_first_paint(self, widget):
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint and 'first_paint' not in self.marks:
+            self.mark('first_paint')
+            obj.removeEventFilter(self)
+        return False
+
+    def report(self, stream=None):
+        stream = stream or sys.stderr
+        for name, ms in sorted(self.marks.items(), key=lambda item: item[1]):
+            print(f"{name:<16} {ms:8.1f} ms", file=stream)
+        # Jedna linia JSON na stdout - wygodna do porównywania buildów w CI
+        print(json.dumps({f"{name}_ms": round(ms, 1) for name, ms in self.marks.items()}))
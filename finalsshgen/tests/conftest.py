@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# Moduły aplikacji importują się nawzajem bez pakietu (jak main.py i cli.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import KeyManager
+from key_store import STORAGE_MODES
+
+
+@pytest.fixture(autouse=True)
+def no_trace_log(monkeypatch):
+    monkeypatch.setenv('SSHGEN_TRACE', '0')
+
+
+@pytest.fixture(params=STORAGE_MODES)
+def storage(request):
+    return request.param
+
+
+@pytest.fixture
+def manager(tmp_path, storage):
+    return KeyManager(str(tmp_path / 'app'), storage)
+
+
+# Klucze generowane w procesie - testy nie potrzebują ssh-keygen
+@pytest.fixture
+def generate(manager):
+    def generate(alias, host='github.com'):
+        return manager.generate(f"{alias}@firma.pl", host, alias, engine='inprocess')
+    return generate
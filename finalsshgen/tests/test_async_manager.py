@@ -0,0 +1,41 @@
+import os
+import asyncio
+import threading
+
+import async_manager
+from async_manager import AsyncKeyManager
+
+
+def test_cancelled_inprocess_generation_leaves_no_key_files(manager, tmp_path, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    # Para kluczy zapisana dopiero po anulowaniu korutyny
+    def slow_generate(email, key_path):
+        started.set()
+        release.wait(5)
+        for path in (key_path, f"{key_path}.pub"):
+            with open(path, 'w') as f:
+                f.write(email)
+        return key_path
+
+    monkeypatch.setattr(async_manager, 'generate_ed25519_inprocess', slow_generate)
+    key_path = str(tmp_path / 'id_jan')
+
+    async def scenario():
+        async with AsyncKeyManager(manager=manager) as keys:
+            task = asyncio.create_task(keys.generate_key('jan@firma.pl', key_path, 'inprocess'))
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, started.wait, 5)
+            task.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+    assert asyncio.run(scenario())
+    assert not os.path.exists(key_path)
+    assert not os.path.exists(f"{key_path}.pub")
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+from core import KeyManagerError
+from daemon import KeyDaemon
+from daemon_client import DaemonClient, DaemonError
+from remote_manager import RemoteKeyManager
+
+
+# Usługa w wątku tego procesu; gniazdo w krótkim katalogu (limit długości ścieżki)
+@pytest.fixture
+def daemon(manager):
+    socket_dir = tempfile.mkdtemp(prefix='sshgen-')
+    daemon = KeyDaemon(manager, os.path.join(socket_dir, 'sock'))
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(daemon.socket_path):
+            break
+        threading.Event().wait(0.01)
+    yield daemon
+    daemon.stop()
+    thread.join(5)
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def remote(daemon):
+    client = DaemonClient(daemon.socket_path)
+    yield RemoteKeyManager(client)
+    client.close()
+
+
+def generate(remote, alias):
+    return remote.client.call('generate', email=f"{alias}@firma.pl", host='github.com', alias=alias, engine='inprocess', timeout=10)
+
+
+# Zdarzenia przychodzą w wątku czytającym; odpowiedź na kolejne żądanie
+# przychodzi po nich, więc po ping wystarczy drain()
+def settle(remote):
+    remote.client.ping()
+    remote.store.drain()
+
+
+def test_round_trip_events(remote, manager):
+    record = generate(remote, 'jan')
+    settle(remote)
+    assert remote.list_keys() == [record] == manager.list_keys()
+
+    remote.delete_aliases(['jan'])
+    settle(remote)
+    assert remote.list_keys() == []
+    assert not os.path.exists(record['key_path'])
+
+
+# 'reset' niesie listę - klient nie pyta o nią z wątku GUI
+def test_reset_event_carries_records(remote):
+    generate(remote, 'jan')
+    generate(remote, 'anna')
+    settle(remote)
+    remote.client.call = None
+    remote.store._apply({'event': 'reset', 'records': []})
+    assert remote.list_keys() == []
+
+
+def test_unexpected_error_keeps_connection(remote, manager, monkeypatch):
+    generate(remote, 'jan')
+
+    def broken(alias):
+        raise RuntimeError("awaria")
+    monkeypatch.setattr(manager, 'get', broken)
+
+    first, second = remote.client.submit_many([('get', {'alias': 'jan'}), ('list', {})])
+    with pytest.raises(DaemonError) as error:
+        first.result(5)
+    assert error.value.kind == 'RuntimeError'
+    assert [record['alias'] for record in second.result(5)] == ['jan']
+    assert remote.client.ping()['pid'] == os.getpid()
+
+
+def test_sync_applies_previewed_aliases(remote, tmp_path):
+    generate(remote, 'jan')
+    generate(remote, 'anna')
+    dest_dir = str(tmp_path / 'ssh')
+
+    plan = remote.plan_sync(['jan'], dest_dir)
+    assert remote.apply_sync(plan) > 0
+    names = set(os.listdir(dest_dir))
+    assert 'id_ed25519_jan' in names and 'id_ed25519_anna' not in names
+
+
+def test_sync_refuses_changed_plan(remote, tmp_path):
+    generate(remote, 'jan')
+    generate(remote, 'anna')
+    dest_dir = str(tmp_path / 'ssh')
+
+    plan = remote.plan_sync(['jan'], dest_dir)
+    remote.delete_aliases(['jan'])
+    with pytest.raises(KeyManagerError):
+        remote.apply_sync(plan)
+    assert not os.path.exists(dest_dir)
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from core import KeyManager, KeyManagerError
+
+
+def test_delete_all_and_undo(manager, generate, storage):
+    records = [generate(alias) for alias in ('jan', 'anna', 'piotr')]
+    config = manager.config_text()
+
+    trash_path = manager.delete_all()
+    assert manager.list_keys() == []
+    assert os.listdir(manager.keys_dir) == []
+    assert all(not os.path.exists(record['key_path']) for record in records)
+    # Pusty magazyn także po ponownym otwarciu
+    assert KeyManager(manager.base_dir, storage).list_keys() == []
+
+    restored = manager.undo_delete_all(trash_path)
+    assert restored == records
+    assert manager.list_keys() == records
+    assert all(os.path.exists(record['key_path']) for record in records)
+    assert manager.config_text() == config
+    assert not os.path.exists(trash_path)
+    assert KeyManager(manager.base_dir, storage).list_keys() == records
+
+
+def test_undo_refused_after_new_key(manager, generate):
+    generate('jan')
+    trash_path = manager.delete_all()
+    generate('anna')
+
+    with pytest.raises(KeyManagerError):
+        manager.undo_delete_all(trash_path)
+    assert [record['alias'] for record in manager.list_keys()] == ['anna']
+
+
+def test_purge_trash(manager, generate):
+    generate('jan')
+    trash_path = manager.delete_all()
+
+    assert manager.purge_trash(trash_path) == 1
+    assert not os.path.exists(trash_path)
+    with pytest.raises(KeyManagerError):
+        manager.undo_delete_all(trash_path)
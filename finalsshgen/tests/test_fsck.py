@@ -0,0 +1,73 @@
+import os
+
+from core import KeyManager
+from keygen import host_alias_for, config_entry_for, write_config_entries
+
+
+def kinds(report):
+    return sorted(problem.kind for problem in report.problems)
+
+
+def test_clean_tree_has_no_problems(manager, generate):
+    generate('jan')
+    generate('anna')
+    assert manager.fsck().empty()
+
+
+def test_missing_key_removes_record_and_block(manager, generate, storage):
+    record = generate('jan')
+    generate('anna')
+    os.remove(record['key_path'])
+
+    report = manager.fsck()
+    assert kinds(report) == ['missing_key']
+    manager.repair(report)
+
+    assert [r['alias'] for r in manager.list_keys()] == ['anna']
+    assert host_alias_for(record['hostname'], 'jan') not in manager.fragments.patterns()
+    # .pub bez klucza prywatnego trafia do kosza, nie jest kasowany
+    assert not os.path.exists(f"{record['key_path']}.pub")
+    assert manager.fsck().empty()
+    assert [r['alias'] for r in KeyManager(manager.base_dir, storage).list_keys()] == ['anna']
+
+
+def test_moved_key_fixes_path_instead_of_deleting(manager, generate):
+    record = generate('jan')
+    manager.store.update(dict(record, key_path=os.path.join('/nie/ma/takiego/katalogu', record['key_name'])))
+
+    report = manager.fsck()
+    assert kinds(report) == ['moved_key']
+    assert not report.store_removes
+    manager.repair(report)
+
+    assert manager.get('jan')['key_path'] == record['key_path']
+    assert os.path.exists(record['key_path'])
+    assert manager.fsck().empty()
+
+
+def test_missing_pub_is_recreated(manager, generate):
+    record = generate('jan')
+    with open(f"{record['key_path']}.pub") as f:
+        public_key = f.read().split()[:2]
+    os.remove(f"{record['key_path']}.pub")
+
+    report = manager.fsck()
+    assert kinds(report) == ['missing_pub']
+    manager.repair(report)
+
+    with open(f"{record['key_path']}.pub") as f:
+        assert f.read().split()[:2] == public_key
+    assert manager.fsck().empty()
+
+
+def test_orphan_block_is_removed(manager, generate):
+    generate('jan')
+    write_config_entries(manager.fragments, [config_entry_for('gitlab.com', 'duch', 'id_ed25519_duch')])
+    manager.fragments.changed()
+
+    report = manager.fsck()
+    assert kinds(report) == ['orphan_block']
+    manager.repair(report)
+
+    assert manager.fragments.patterns() == [host_alias_for('github.com', 'jan')]
+    assert manager.fsck().empty()
@@ -0,0 +1,72 @@
+import io
+import os
+
+import pytest
+
+from core import KeyManager, KeyManagerError
+
+
+def without_paths(records):
+    return [{k: v for k, v in record.items() if k != 'key_path'} for record in records]
+
+
+@pytest.fixture
+def source(generate, manager):
+    for alias in ('jan', 'anna', 'piotr', 'ewa', 'adam'):
+        generate(alias)
+    return manager
+
+
+def export(manager, **options):
+    out = io.BytesIO()
+    manager.export_inventory(out, **options)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_import_with_keys(tmp_path, source, storage, compress):
+    data = export(source, with_keys=True, compress=compress)
+    target = KeyManager(str(tmp_path / 'nowy'), storage)
+
+    stats = target.import_inventory(io.BytesIO(data), chunk_size=2)
+    assert (stats.records, stats.files, stats.errors) == (5, 10, [])
+    assert without_paths(target.list_keys()) == without_paths(source.list_keys())
+    for record in target.list_keys():
+        assert record['key_path'] == os.path.join(target.keys_dir, record['key_name'])
+        assert os.path.exists(record['key_path'])
+    assert target.fsck().empty()
+    assert without_paths(KeyManager(target.base_dir, storage).list_keys()) == without_paths(source.list_keys())
+
+
+def test_import_skips_existing_aliases(source):
+    data = export(source, with_keys=True)
+    source.delete_alias('anna')
+
+    stats = source.import_inventory(io.BytesIO(data))
+    assert (stats.records, stats.skipped) == (1, 4)
+    assert source.get('anna') is not None
+    assert source.fsck().empty()
+
+
+def test_import_lines_needs_key_files(tmp_path, source, storage):
+    target = KeyManager(str(tmp_path / 'nowy'), storage)
+
+    stats = target.import_inventory(io.BytesIO(export(source)))
+    assert stats.records == 0
+    assert len(stats.errors) == 5
+    assert target.list_keys() == []
+
+
+# Uszkodzony strumień: zapisane paczki zostają (także na dysku),
+# pliki z przerwanej paczki są usuwane
+def test_import_keeps_committed_chunks_on_error(tmp_path, source, storage):
+    data = export(source, with_keys=True)
+    target = KeyManager(str(tmp_path / 'nowy'), storage)
+
+    with pytest.raises(KeyManagerError):
+        target.import_inventory(io.BytesIO(data[:len(data) * 3 // 4]), chunk_size=2)
+
+    imported = target.list_keys()
+    assert len(imported) in (2, 4)
+    assert KeyManager(target.base_dir, storage).list_keys() == imported
+    assert sorted(os.listdir(target.keys_dir)) == sorted(['config.d'] + [name for record in imported for name in (record['key_name'], f"{record['key_name']}.pub")])
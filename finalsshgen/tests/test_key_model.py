@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QCoreApplication, Qt
+
+from key_model import KeyTableModel
+from search_index import SearchIndex
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def model(app, manager):
+    index = SearchIndex(manager.store)
+    return KeyTableModel(manager.store, index)
+
+
+def aliases(model):
+    while model.canFetchMore():
+        model.fetchMore()
+    return [model.data(model.index(row, 2), Qt.ItemDataRole.DisplayRole) for row in range(model.rowCount())]
+
+
+def test_rows_follow_store(model, manager, generate):
+    generate('jan')
+    generate('anna')
+    assert aliases(model) == ['jan', 'anna']
+    manager.delete_alias('jan')
+    assert aliases(model) == ['anna']
+
+
+def test_remove_with_filter(model, manager, generate):
+    for alias in ('jan', 'janek', 'anna'):
+        generate(alias)
+    model.set_query('jan')
+    assert aliases(model) == ['jan', 'janek']
+
+    manager.delete_alias('jan')
+    assert aliases(model) == ['janek']
+    manager.delete_alias('anna')
+    assert aliases(model) == ['janek']
+
+
+def test_add_and_update_with_filter(model, manager, generate):
+    generate('jan')
+    model.set_query('jan')
+    generate('anna')
+    generate('janek')
+    assert aliases(model) == ['jan', 'janek']
+
+    manager.store.update(dict(manager.get('jan'), alias='jan', hostname='gitlab.com'))
+    assert aliases(model) == ['jan', 'janek']
+    model.set_query('gitlab')
+    assert aliases(model) == ['jan']
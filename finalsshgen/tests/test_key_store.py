@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from key_store import JournalKeyStore
+
+
+def record(alias):
+    return {'key_name': f"id_ed25519_{alias}", 'email': f"{alias}@firma.pl", 'hostname': 'github.com', 'alias': alias, 'key_path': f"/k/id_ed25519_{alias}", 'created': '2024-01-01 12:00:00'}
+
+
+def open_journal(tmp_path):
+    return JournalKeyStore(str(tmp_path / 'keys.snapshot.json'), str(tmp_path / 'keys.journal'))
+
+
+def aliases(store):
+    return [r['alias'] for r in store]
+
+
+# Zwinięcie dziennika w trakcie paczki, która potem jest wycofana, nie może
+# zapisać jej zmian do migawki
+def test_compaction_skips_rolled_back_batch(tmp_path):
+    store = open_journal(tmp_path)
+    store.add(record('jan'))
+
+    compactor = None
+    with pytest.raises(RuntimeError):
+        with store.batch():
+            store.add(record('duch'))
+            compactor = threading.Thread(target=store.compact)
+            compactor.start()
+            compactor.join(0.2)
+            raise RuntimeError("przerwana paczka")
+    compactor.join(5)
+
+    assert aliases(store) == ['jan']
+    assert aliases(open_journal(tmp_path)) == ['jan']
+
+
+def test_compaction_inside_batch_is_postponed(tmp_path):
+    store = open_journal(tmp_path)
+    store.add(record('jan'))
+    with pytest.raises(RuntimeError):
+        with store.batch():
+            store.add(record('duch'))
+            store.compact()
+            raise RuntimeError("przerwana paczka")
+
+    assert aliases(open_journal(tmp_path)) == ['jan']
+    store.compact()
+    assert aliases(open_journal(tmp_path)) == ['jan']
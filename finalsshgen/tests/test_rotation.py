@@ -0,0 +1,65 @@
+import os
+
+from keygen import host_alias_for
+from rotation import CREATED_FORMAT
+
+
+def age(manager, alias, created='2020-01-01 12:00:00'):
+    manager.store.update(dict(manager.get(alias), created=created))
+
+
+def test_rotate_replaces_old_keys(manager, generate, storage):
+    old = generate('jan')
+    generate('anna')
+    age(manager, 'jan')
+
+    assert [record['alias'] for record in manager.due_for_rotation(30)] == ['jan']
+    records, errors = manager.rotate(30, engine='inprocess')
+
+    assert errors == []
+    assert [record['alias'] for record in records] == ['jan']
+    new = manager.get('jan')
+    assert new['key_name'] != old['key_name']
+    assert new['created'] != '2020-01-01 12:00:00'
+    assert new['fingerprint'] and new['fingerprint'] != old['fingerprint']
+    assert os.path.exists(new['key_path'])
+    # Stary klucz czeka w .rotated przez okres karencji
+    assert not os.path.exists(old['key_path'])
+    (grace,) = os.listdir(manager.rotated_dir)
+    assert os.path.exists(os.path.join(manager.rotated_dir, grace, old['key_name']))
+
+    with open(manager.fragments.fragment_path(host_alias_for('github.com', 'jan'))) as f:
+        block = f.read()
+    (identity,) = [line.split()[1] for line in block.splitlines() if line.split()[:1] == ['IdentityFile']]
+    assert os.path.basename(identity) == new['key_name']
+    assert manager.due_for_rotation(30) == []
+    assert manager.fsck().empty()
+
+
+def test_rotate_in_batches(manager, generate):
+    for alias in ('a', 'b', 'c', 'd', 'e'):
+        generate(alias)
+        age(manager, alias)
+
+    records, errors = manager.rotate(30, batch_size=2, engine='inprocess')
+    assert errors == []
+    assert sorted(record['alias'] for record in records) == ['a', 'b', 'c', 'd', 'e']
+    assert len(os.listdir(manager.rotated_dir)) == 3
+
+
+def test_purge_rotated_keeps_grace_period(manager, generate):
+    generate('jan')
+    age(manager, 'jan')
+    manager.rotate(30, engine='inprocess')
+
+    assert manager.purge_rotated(grace_days=7) == 0
+    assert manager.purge_rotated(grace_days=0) == 1
+    assert os.listdir(manager.rotated_dir) == []
+
+
+def test_created_format_is_parsed(manager, generate):
+    from datetime import datetime, timedelta
+    generate('jan')
+    age(manager, 'jan', (datetime.now() - timedelta(days=10)).strftime(CREATED_FORMAT))
+    assert manager.due_for_rotation(30) == []
+    assert [record['alias'] for record in manager.due_for_rotation(5)] == ['jan']
@@ -0,0 +1,35 @@
+import os
+
+from ssh_sync import FRAGMENTS_DIR
+
+
+def test_sync_removes_fragment_of_deleted_key(manager, generate, tmp_path):
+    generate('jan')
+    generate('anna')
+    dest_dir = str(tmp_path / 'ssh')
+    manager.sync(dest_dir=dest_dir)
+    fragments_dir = os.path.join(dest_dir, FRAGMENTS_DIR)
+    assert len(os.listdir(fragments_dir)) == 2
+
+    manager.delete_aliases(['anna'])
+    plan = manager.plan_sync(dest_dir=dest_dir)
+    removed = [action for action in plan.actions if action.kind == 'remove']
+    assert len(removed) == 1
+    assert 'anna' in os.path.basename(removed[0].dest)
+
+    manager.apply_sync(plan)
+    remaining = os.listdir(fragments_dir)
+    assert len(remaining) == 1 and 'jan' in remaining[0]
+    assert manager.plan_sync(dest_dir=dest_dir).empty()
+
+
+def test_partial_sync_removes_only_orphaned_fragments(manager, generate, tmp_path):
+    generate('jan')
+    generate('anna')
+    dest_dir = str(tmp_path / 'ssh')
+    manager.sync(dest_dir=dest_dir)
+
+    manager.delete_aliases(['anna'])
+    plan = manager.sync(['jan'], dest_dir)
+    assert [action.kind for action in plan.actions] == ['remove']
+    assert len(os.listdir(os.path.join(dest_dir, FRAGMENTS_DIR))) == 1
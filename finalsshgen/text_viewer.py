@@ -0,0 +1,270 @@
+import re
+import json
+import mmap
+
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QScrollBar, QLineEdit, QPushButton, QLabel
+from PyQt6.QtCore import Qt, QEvent
+from PyQt6.QtGui import QTextCursor, QFontDatabase
+
+
+# Podgląd dużych plików (keys.json, config) bez wczytywania całości: plik
+# jest mapowany w pamięć (mmap), a okno pokazuje tylko linie, które się
+# mieszczą. Pozycja w pliku to przesunięcie w bajtach - nie trzeba liczyć
+# linii, więc otwarcie trwa tyle samo dla 1 KB i 1 GB. Wyszukiwanie
+# (re na mapowanym buforze) i skok do aliasu też nie kopiują pliku.
+# Zamiast pliku może to być dowolny bufor z len, wycinkami, find/rfind
+# i search (config_fragments.FragmentsView - config bez sklejania).
+
+# Dłuższe linie (np. JSON bez wcięć) są dzielone przy wyświetlaniu
+MAX_LINE_BYTES = 4096
+WHEEL_LINES = 3
+
+
+class PagedText:
+    def __init__(self, data, mapped=None):
+        self._buffer = data
+        self._mapped = mapped
+        self.size = len(data)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Pusty plik nie daje się zmapować
+                return cls(b'')
+        return cls(mapped, mapped)
+
+    # Zamknięcie mapy zwalnia plik (Windows nie pozwala go wtedy podmienić)
+    def close(self):
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+            self._buffer = b''
+            self.size = 0
+
+    # Początek linii, w której leży offset; w środku bardzo długiej linii
+    # (bez końca linii w zasięgu MAX_LINE_BYTES) sam offset
+    def line_start(self, offset):
+        offset = max(0, min(offset, self.size))
+        window = max(0, offset - MAX_LINE_BYTES)
+        newline = self._buffer.rfind(b'\n', window, offset)
+        if newline >= 0:
+            return newline + 1
+        return 0 if window == 0 else offset
+
+    def next_line(self, offset):
+        end = min(self.size, offset + MAX_LINE_BYTES)
+        newline = self._buffer.find(b'\n', offset, end)
+        return end if newline < 0 else newline + 1
+
+    def previous_line(self, offset):
+        if offset <= 0:
+            return 0
+        window = max(0, offset - MAX_LINE_BYTES)
+        newline = self._buffer.rfind(b'\n', window, offset - 1)
+        return newline + 1 if newline >= 0 else window
+
+    # Linie od offsetu: (lista tekstów, offset za ostatnią)
+    def lines(self, offset, limit):
+        lines = []
+        while offset < self.size and len(lines) < limit:
+            end = self.next_line(offset)
+            lines.append(self._buffer[offset:end].decode('utf-8', errors='replace').rstrip('\r\n'))
+            offset = end
+        return lines, offset
+
+    # Offset linii, od której widać ostatnie limit linii pliku
+    def last_page(self, limit):
+        offset = self.size
+        for _ in range(limit):
+            if offset == 0:
+                break
+            offset = self.previous_line(offset)
+        return offset
+
+    def decode(self, start, end):
+        return self._buffer[start:end].decode('utf-8', errors='replace')
+
+    # Pierwsze wystąpienie tekstu od start (bez rozróżniania wielkości liter),
+    # z zawinięciem na początek pliku; zwraca (offset, długość) albo None.
+    # W keys.json znaki spoza ASCII są zapisane jako \uXXXX - szukamy obu postaci.
+    def search(self, text, start=0):
+        if not text:
+            return None
+        forms = set()
+        for variant in (text, text.lower(), text.upper()):
+            forms.add(re.escape(variant.encode('utf-8')))
+            forms.add(re.escape(json.dumps(variant)[1:-1].encode('ascii')))
+        pattern = re.compile(b'|'.join(sorted(forms)), re.IGNORECASE)
+        match = self._match(pattern, start) or self._match(pattern, 0)
+        if match is None:
+            return None
+        return match[0], match[1] - match[0]
+
+    def rfind(self, sub, end):
+        return self._buffer.rfind(sub, 0, end)
+
+    def find_pattern(self, pattern):
+        match = self._match(pattern)
+        return None if match is None else (match[0], match[1] - match[0])
+
+    # (początek, koniec) dopasowania od pos albo None
+    def _match(self, pattern, pos=0):
+        if hasattr(self._buffer, 'search'):
+            return self._buffer.search(pattern, pos)
+        match = pattern.search(self._buffer, pos)
+        return None if match is None else match.span()
+
+
+# Skok do aliasu: w keys.json na początek rekordu, w configu na blok Host
+def locate_json_record(text, alias):
+    found = text.find_pattern(re.compile(b'"alias": ' + re.escape(json.dumps(alias).encode('ascii'))))
+    if found is None:
+        return None
+    start = text.rfind(b'{', found[0])
+    return (text.line_start(start) if start >= 0 else text.line_start(found[0])), 0
+
+
+def locate_host_block(text, pattern):
+    return text.find_pattern(re.compile(rb'^Host[ \t]+' + re.escape(pattern.encode('utf-8')) + rb'[ \t]*\r?$', re.MULTILINE))
+
+
+class TextViewer(QDialog):
+    # locate(tekst, alias) -> (offset, długość) albo None
+    def __init__(self, text, title, locate=None, parent=None):
+        super().__init__(parent)
+        self.text = text
+        self.locate = locate
+        self.top = 0
+        self.match = None
+        self.setWindowTitle(title)
+        self.resize(800, 600)
+
+        layout = QVBoxLayout(self)
+        tools = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Szukaj w pliku")
+        self.search_input.returnPressed.connect(self.find_next)
+        tools.addWidget(self.search_input)
+        find_button = QPushButton("Dalej")
+        find_button.clicked.connect(self.find_next)
+        tools.addWidget(find_button)
+        if locate is not None:
+            self.alias_input = QLineEdit()
+            self.alias_input.setPlaceholderText("Alias")
+            self.alias_input.returnPressed.connect(self.jump_to_alias)
+            tools.addWidget(self.alias_input)
+            jump_button = QPushButton("Przejdź")
+            jump_button.clicked.connect(self.jump_to_alias)
+            tools.addWidget(jump_button)
+        layout.addLayout(tools)
+
+        view = QHBoxLayout()
+        self.view = QPlainTextEdit()
+        self.view.setReadOnly(True)
+        self.view.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.view.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self.view.installEventFilter(self)
+        self.view.viewport().installEventFilter(self)
+        view.addWidget(self.view)
+
+        # Suwak po bajtach; duże pliki w jednostkach 2^shift bajtów (zakres int)
+        self.shift = max(0, text.size.bit_length() - 30)
+        self.scroll = QScrollBar(Qt.Orientation.Vertical)
+        self.scroll.setRange(0, text.size >> self.shift)
+        self.scroll.valueChanged.connect(lambda value: self.show_at(value << self.shift, from_scroll=True))
+        view.addWidget(self.scroll)
+        layout.addLayout(view)
+
+        self.status = QLabel()
+        layout.addWidget(self.status)
+
+    def page_lines(self):
+        return max(1, self.view.viewport().height() // max(1, self.view.fontMetrics().lineSpacing()))
+
+    # Skok w dowolne miejsce - widok zaczyna się od początku linii
+    def show_at(self, offset, from_scroll=False):
+        self.set_top(self.text.line_start(offset), from_scroll)
+
+    def set_top(self, offset, from_scroll=False):
+        self.top = offset
+        self.render()
+        if not from_scroll:
+            self.scroll.blockSignals(True)
+            self.scroll.setValue(self.top >> self.shift)
+            self.scroll.blockSignals(False)
+
+    def render(self):
+        lines, end = self.text.lines(self.top, self.page_lines())
+        self.view.setPlainText('\n'.join(lines))
+        if self.match is not None and self.top <= self.match[0] < end:
+            cursor = self.view.textCursor()
+            start = len(self.text.decode(self.top, self.match[0]))
+            cursor.setPosition(start)
+            cursor.setPosition(start + len(self.text.decode(self.match[0], self.match[0] + self.match[1])), QTextCursor.MoveMode.KeepAnchor)
+            self.view.setTextCursor(cursor)
+        percent = 100 * end // self.text.size if self.text.size else 100
+        self.status.setText(f"{self.text.size} B, {percent}%")
+
+    def scroll_lines(self, count):
+        offset = self.top
+        for _ in range(abs(count)):
+            offset = self.text.next_line(offset) if count > 0 else self.text.previous_line(offset)
+        self.set_top(min(offset, self.text.last_page(self.page_lines())) if count > 0 else offset)
+
+    def find_next(self):
+        start = self.match[0] + 1 if self.match is not None else self.top
+        self.match = self.text.search(self.search_input.text(), start)
+        if self.match is None:
+            self.status.setText("Nie znaleziono.")
+            return
+        self.show_at(self.match[0])
+
+    def jump_to_alias(self):
+        alias = self.alias_input.text().strip()
+        found = self.locate(self.text, alias) if alias else None
+        if found is None:
+            self.status.setText(f"Nie znaleziono aliasu {alias}.")
+            return
+        self.match = found if found[1] else None
+        self.show_at(found[0])
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Wheel:
+            steps = event.angleDelta().y() // 120
+            if steps:
+                self.scroll_lines(-steps * WHEEL_LINES)
+            return True
+        if event.type() == QEvent.Type.KeyPress and obj is self.view:
+            key = event.key()
+            page = self.page_lines()
+            step = max(1, page - 1)
+            moves = {
+                Qt.Key.Key_Down: 1, Qt.Key.Key_Up: -1,
+                Qt.Key.Key_PageDown: step, Qt.Key.Key_PageUp: -step,
+            }
+            if key in moves:
+                self.scroll_lines(moves[key])
+                return True
+            if key == Qt.Key.Key_Home:
+                self.set_top(0)
+                return True
+            if key == Qt.Key.Key_End:
+                self.set_top(self.text.last_page(page))
+                return True
+        return super().eventFilter(obj, event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.render()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.render()
+
+    def done(self, result):
+        self.text.close()
+        super().done(result)
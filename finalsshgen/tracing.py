@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+
+# Śledzenie operacji: każda operacja (generowanie, usuwanie, synchronizacja...)
+# to span z czasem trwania, licznikami (bajty, pliki) i zagnieżdżonymi
+# krokami (wczytanie JSON, ssh-keygen, zapis configu, kopiowanie plików).
+#
+#   with span('delete_alias', alias=alias):
+#       ...
+#       count('files_removed')
+#
+# Zakończone operacje najwyższego poziomu trafiają do dziennika (jedna linia
+# JSON, pliki rotowane), do bufora ostatnich operacji (panel diagnostyczny)
+# i do zagregowanych metryk (format tekstowy Prometheusa).
+# Bez Qt - z modułu korzysta GUI, CLI i benchmarki.
+
+RECENT_LIMIT = 200
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 5
+
+# Kubełki histogramu czasu trwania (sekundy)
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+_logger = logging.getLogger('sshgen.trace')
+_logger.propagate = False
+_local = threading.local()
+_lock = threading.Lock()
+_recent = deque(maxlen=RECENT_LIMIT)
+_metrics = {}
+
+
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.counters = {}
+        self.children = []
+        self.error = None
+        self.started = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    # Liczniki sumują się w górę drzewa - operacja widzi bajty swoich kroków
+    def totals(self):
+        totals = dict(self.counters)
+        for child in self.children:
+            for key, value in child.totals().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def to_dict(self):
+        data = {
+            'name': self.name,
+            'start': datetime.fromtimestamp(self.started).isoformat(timespec='milliseconds'),
+            'duration_ms': round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            data['attrs'] = self.attrs
+        totals = self.totals()
+        if totals:
+            data['counters'] = totals
+        if self.error:
+            data['error'] = self.error
+        if self.children:
+            data['steps'] = [child.to_dict() for child in self.children]
+        return data
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def span(name, **attrs):
+    current = Span(name, attrs)
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    stack.append(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._start
+        stack.pop()
+        _record_metrics(current)
+        if parent is not None:
+            parent.children.append(current)
+        else:
+            _finish(current)
+
+
+# Licznik bieżącego spanu (bytes_read, bytes_written, files_read,
+# files_written, files_removed...). Poza spanem nic nie robi.
+def count(counter, value=1):
+    stack = _stack()
+    if stack:
+        counters = stack[-1].counters
+        counters[counter] = counters.get(counter, 0) + value
+
+
+def _record_metrics(finished):
+    with _lock:
+        metric = _metrics.get(finished.name)
+        if metric is None:
+            metric = _metrics[finished.name] = {
+                'count': 0, 'errors': 0, 'seconds': 0.0,
+                'buckets': [0] * len(DURATION_BUCKETS), 'counters': {},
+            }
+        metric['count'] += 1
+        metric['seconds'] += finished.duration
+        if finished.error:
+            metric['errors'] += 1
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if finished.duration <= bound:
+                metric['buckets'][i] += 1
+        # Tylko własne liczniki - sumy z kroków policzą ich własne metryki
+        for key, value in finished.counters.items():
+            metric['counters'][key] = metric['counters'].get(key, 0) + value
+
+
+def _finish(finished):
+    data = finished.to_dict()
+    with _lock:
+        _recent.append(data)
+    if _logger.handlers:
+        _logger.info(json.dumps(data, ensure_ascii=False))
+
+
+# --- konfiguracja i odczyt ---
+
+# Dziennik operacji w pliku rotowanym; wywołanie ponowne z tą samą ścieżką
+# nic nie zmienia. SSHGEN_TRACE=0 wyłącza zapis do pliku.
+def configure_log(log_path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    if os.environ.get('SSHGEN_TRACE', '1') == '0':
+        return None
+    log_path = os.path.abspath(log_path)
+    for handler in _logger.handlers:
+        if getattr(handler, 'baseFilename', None) == log_path:
+            return handler
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    return handler
+
+
+def recent():
+    with _lock:
+        return list(_recent)
+
+
+def slowest(limit=20):
+    return sorted(recent(), key=lambda data: data['duration_ms'], reverse=True)[:limit]
+
+
+def reset():
+    with _lock:
+        _recent.clear()
+        _metrics.clear()
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text():
+    with _lock:
+        metrics = {name: dict(metric, buckets=list(metric['buckets']), counters=dict(metric['counters']))
+                   for name, metric in _metrics.items()}
+
+    lines = [
+        "# HELP sshgen_operation_duration_seconds Czas trwania operacji i ich kroków",
+        "# TYPE sshgen_operation_duration_seconds histogram",
+    ]
+    for name, metric in sorted(metrics.items()):
+        label = f'operation="{_label(name)}"'
+        for bound, bucket in zip(DURATION_BUCKETS, metric['buckets']):
+            lines.append(f'sshgen_operation_duration_seconds_bucket{{{label},le="{bound}"}} {bucket}')
+        lines.append(f'sshgen_operation_duration_seconds_bucket{{{label},le="+Inf"}} {metric["count"]}')
+        lines.append(f'sshgen_operation_duration_seconds_sum{{{label}}} {metric["seconds"]:.6f}')
+        lines.append(f'sshgen_operation_duration_seconds_count{{{label}}} {metric["count"]}')
+
+    lines += [
+        "# HELP sshgen_operation_errors_total Operacje zakończone wyjątkiem",
+        "# TYPE sshgen_operation_errors_total counter",
+    ]
+    for name, metric in sorted(metrics.items()):
+        lines.append(f'sshgen_operation_errors_total{{operation="{_label(name)}"}} {metric["errors"]}')
+
+    counter_names = sorted({key for metric in metrics.values() for key in metric['counters']})
+    for counter in counter_names:
+        lines.append(f"# TYPE sshgen_{counter}_total counter")
+        for name, metric in sorted(metrics.items()):
+            if counter in metric['counters']:
+                lines.append(f'sshgen_{counter}_total{{operation="{_label(name)}"}} {metric["counters"][counter]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    with open(path, 'w') as f:
+        f.write(prometheus_text())
@@ -0,0 +1,57 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+# Sygnały muszą żyć w QObject - QRunnable nim nie jest.
+# Emitowane z wątku roboczego trafiają do wątku GUI przez kolejkę zdarzeń.
+class WorkerSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+
+
+# Zadanie dla QThreadPool: wywołuje fn(*args) poza wątkiem GUI
+# i odsyła wynik albo treść błędu sygnałem. Z report_progress=True
+# funkcja dostaje argument progress(zrobione, wszystkie).
+class Worker(QRunnable):
+    def __init__(self, fn, *args, report_progress=False, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        if report_progress:
+            self.kwargs['progress'] = self.signals.progress.emit
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+# Wrzuca zadanie do wspólnej puli wątków i podpina callbacki
+def submit(fn, *args, on_finished=None, on_failed=None, on_progress=None, pool=None, **kwargs):
+    worker = Worker(fn, *args, report_progress=on_progress is not None, **kwargs)
+    if on_progress is not None:
+        worker.signals.progress.connect(on_progress)
+    if on_finished is not None:
+        worker.signals.finished.connect(on_finished)
+    if on_failed is not None:
+        worker.signals.failed.connect(on_failed)
+    (pool or QThreadPool.globalInstance()).start(worker)
+    return worker
+
+
+# Wywołanie fn w wątku GUI na żądanie z dowolnego wątku (np. wątku, który
+# czyta gniazdo usługi). Obiekt trzeba utworzyć w wątku GUI.
+class MainThreadCall(QObject):
+    called = pyqtSignal()
+
+    def __init__(self, fn, parent=None):
+        super().__init__(parent)
+        self.called.connect(fn)
+
+    def __call__(self):
+        self.called.emit()
@@ -24,15 +24,21 @@ if not os.path.exists(keys_json_path):
     with open(keys_json_path, 'w') as f:
         json.dump([], f)
 
-# Funkcja generująca nowy klucz SSH
-def generate_ssh_key(email, host, alias):
+class KeyManagerError(Exception):
+    pass
+
+
+# Logika generowania i usuwania nie dotyka Qt - błędy zgłasza przez
+# KeyManagerError, a komunikaty pokazują funkcje podpięte pod przyciski
+
+# Tworzy parę kluczy, fragment configu i wpis w keys.json; zwraca metadane
+def create_ssh_key(email, host, alias):
     key_name = f"id_ed25519_{alias}"
     key_path = os.path.join(keys_dir, key_name)
     
     # Sprawdzamy, czy klucz już istnieje
     if os.path.exists(key_path):
-        QMessageBox.critical(window, "Błąd", f"Klucz o nazwie {key_name} już istnieje!")
-        return
+        raise KeyManagerError(f"Klucz o nazwie {key_name} już istnieje!")
     
     # Generowanie klucza
     try:
@@ -41,8 +47,7 @@ def generate_ssh_key(email, host, alias):
             check=True
         )
     except subprocess.CalledProcessError:
-        QMessageBox.critical(window, "Błąd", "Nie udało się wygenerować klucza SSH.")
-        return
+        raise KeyManagerError("Nie udało się wygenerować klucza SSH.")
 
     # Tworzymy config z poprawionym Hostem (usuwamy część po kropce w host)
     host_name = host.split('.')[0]  # Usuwamy część po kropce
@@ -76,10 +81,38 @@ Host {host_name}-{alias}
     
     with open(keys_json_path, 'w') as f:
         json.dump(keys_data, f, indent=4)
+    return key_metadata
+
+
+# Funkcja generująca nowy klucz SSH
+def generate_ssh_key(email, host, alias):
+    try:
+        create_ssh_key(email, host, alias)
+    except KeyManagerError as e:
+        QMessageBox.critical(window, "Błąd", str(e))
+        return
 
     # Aktualizacja tabeli
     update_table()
 
+# Fragment configu trafia do ~/.ssh/sshgen.d, a ~/.ssh/config dostaje
+# jedną linię Include - reszta pliku użytkownika zostaje nietknięta
+SSH_INCLUDE = "Include sshgen.d/*.conf"
+
+
+def ensure_ssh_include(ssh_dir):
+    ssh_config = os.path.join(ssh_dir, "config")
+    content = ""
+    if os.path.exists(ssh_config):
+        with open(ssh_config, 'r') as f:
+            content = f.read()
+    if any(line.strip() == SSH_INCLUDE for line in content.splitlines()):
+        return
+    with open(ssh_config, 'w') as f:
+        f.write(f"{SSH_INCLUDE}\n\n{content}" if content else f"{SSH_INCLUDE}\n")
+    os.chmod(ssh_config, 0o600)
+
+
 def copy_key_to_ssh():
     alias = alias_input.text().strip()
     if not alias:
@@ -110,7 +143,10 @@ def copy_key_to_ssh():
         config_filename = f"{key_entry['hostname'].split('.')[0]}_{alias}_config"
         src_config_path = os.path.join(config_path, config_filename)
         if os.path.exists(src_config_path):
-            shutil.copy(src_config_path, destination)
+            fragments_dir = os.path.join(destination, "sshgen.d")
+            os.makedirs(fragments_dir, exist_ok=True)
+            shutil.copy(src_config_path, os.path.join(fragments_dir, f"{config_filename}.conf"))
+            ensure_ssh_include(destination)
 
         QMessageBox.information(window, "Sukces", f"Pliki skopiowane do {destination}")
     except Exception as e:
@@ -118,23 +154,28 @@ def copy_key_to_ssh():
 
 
 
+# Usuwa wszystkie klucze, pliki konfiguracyjne i wpisy w keys.json
+def remove_all_keys():
+    # Usuwamy wszystkie klucze SSH z folderu keys
+    for key in os.listdir(keys_dir):
+        key_path = os.path.join(keys_dir, key)
+        os.remove(key_path)
+
+    # Usuwamy wszystkie pliki konfiguracyjne z folderu config
+    for config_file in os.listdir(config_path):
+        config_file_path = os.path.join(config_path, config_file)
+        os.remove(config_file_path)
+
+    # Usuwamy zawartość keys.json
+    with open(keys_json_path, 'w') as f:
+        json.dump([], f)
+
+
 # Funkcja usuwająca wszystko
 def delete_all():
     reply = QMessageBox.question(window, 'Usuwanie', 'Czy na pewno chcesz usunąć wszystkie klucze i pliki konfiguracyjne?', QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
     if reply == QMessageBox.StandardButton.Yes:
-        # Usuwamy wszystkie klucze SSH z folderu keys
-        for key in os.listdir(keys_dir):
-            key_path = os.path.join(keys_dir, key)
-            os.remove(key_path)
-
-        # Usuwamy wszystkie pliki konfiguracyjne z folderu config
-        for config_file in os.listdir(config_path):
-            config_file_path = os.path.join(config_path, config_file)
-            os.remove(config_file_path)
-
-        # Usuwamy zawartość keys.json
-        with open(keys_json_path, 'w') as f:
-            json.dump([], f)
+        remove_all_keys()
 
         # Aktualizujemy tabelę
         update_table()
@@ -142,13 +183,9 @@ def delete_all():
         QMessageBox.information(window, "Sukces", "Wszystkie klucze i pliki konfiguracyjne zostały usunięte.")
 
 
-# Funkcja usuwająca alias
-def delete_alias():
-    alias_to_delete = alias_input.text()  # Używamy tego samego pola 'alias_input'
-    if not alias_to_delete:
-        QMessageBox.warning(window, "Błąd", "Nie podano aliasu do usunięcia.")
-        return
-    
+# Usuwa pliki klucza i configu aliasu oraz jego wpis w keys.json;
+# zwraca listę usuniętych plików
+def remove_alias(alias_to_delete):
     with open(keys_json_path, 'r') as f:
         keys_data = json.load(f)
     
@@ -156,46 +193,50 @@ def delete_alias():
     keys_data_to_delete = [key for key in keys_data if key['alias'] == alias_to_delete]
 
     if not keys_data_to_delete:
-        QMessageBox.warning(window, "Błąd", f"Nie znaleziono aliasu {alias_to_delete}.")
-        return
+        raise KeyManagerError(f"Nie znaleziono aliasu {alias_to_delete}.")
     
     # Usuwamy odpowiednie pliki klucza i plik konfiguracyjny
+    removed = []
     for key in keys_data_to_delete:
         key_path = key['key_path']
         key_pub_path = f"{key_path}.pub"  # Ścieżka do klucza publicznego (z rozszerzeniem .pub)
         host_name = key['hostname'].split('.')[0]  # Usuwamy część po kropce w host
         config_file_path = os.path.join(config_path, f"{host_name}_{alias_to_delete}_config")
 
-        # Logowanie pełnej ścieżki do pliku konfiguracyjnego
-        print(f"Ścieżka do pliku konfiguracyjnego: {config_file_path}")
-        
         # Sprawdzamy, czy pliki istnieją i usuwamy je
-        if os.path.exists(key_path):
-            print(f"Usuwam klucz prywatny: {key_path}")  # Logowanie do konsoli
-            os.remove(key_path)
-        
-        if os.path.exists(key_pub_path):
-            print(f"Usuwam klucz publiczny: {key_pub_path}")  # Logowanie do konsoli
-            os.remove(key_pub_path)
-        
-        if os.path.exists(config_file_path):
-            print(f"Usuwam plik konfiguracyjny: {config_file_path}")  # Logowanie do konsoli
-            os.remove(config_file_path)
-        else:
-            print(f"Plik konfiguracyjny nie istnieje: {config_file_path}")  # Logowanie do konsoli
-        
+        for file_path in (key_path, key_pub_path, config_file_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                removed.append(file_path)
+
     # Filtrujemy dane z pliku keys.json, usuwając wpisy dla tego aliasu
     keys_data = [key for key in keys_data if key['alias'] != alias_to_delete]
 
     # Zapisujemy zmienione dane z powrotem do pliku
     with open(keys_json_path, 'w') as f:
         json.dump(keys_data, f, indent=4)
-    
+    return removed
+
+
+# Funkcja usuwająca alias
+def delete_alias():
+    alias_to_delete = alias_input.text()  # Używamy tego samego pola 'alias_input'
+    if not alias_to_delete:
+        QMessageBox.warning(window, "Błąd", "Nie podano aliasu do usunięcia.")
+        return
+
+    try:
+        removed = remove_alias(alias_to_delete)
+    except KeyManagerError as e:
+        QMessageBox.warning(window, "Błąd", str(e))
+        return
+
     # Aktualizujemy tabelę po usunięciu aliasu
     update_table()
 
     # Wyświetlamy komunikat o sukcesie
-    QMessageBox.information(window, "Sukces", f"Alias {alias_to_delete} został usunięty oraz wszystkie powiązane pliki.")
+    files = "\n".join(removed) or "brak plików na dysku"
+    QMessageBox.information(window, "Sukces", f"Alias {alias_to_delete} został usunięty oraz wszystkie powiązane pliki:\n{files}")
 
 
 def show_config():
@@ -241,96 +282,97 @@ def update_table():
         table.setItem(row_position, 2, QTableWidgetItem(key['alias']))
         table.setItem(row_position, 3, QTableWidgetItem(key['email']))
 
-# Główna aplikacja GUI
-app = QApplication(sys.argv)
-
-# Ustawienie czarnego motywu
-app.setStyleSheet("""
-    QWidget {
-        background-color: #2e2e2e;
-        color: white;
-        font-size: 14px;
-    }
-    QLineEdit, QPushButton, QTableWidget {
-        background-color: #444444;
-        border: 1px solid #888888;
-        color: white;
-    }
-    QPushButton:hover {
-        background-color: #555555;
-    }
-    QTableWidget {
-        color: white;
-        border: 1px solid #888888;
-    }
-    QHeaderView::section {
-        background-color: #333333;
-        color: white;
-        font-weight: bold;
-    }
-""")
-
-window = QWidget()
-window.setWindowTitle("SSH Key Manager")
-layout = QVBoxLayout()
-
-# Wprowadzenie danych
-form_layout = QVBoxLayout()
-
-email_input = QLineEdit()
-email_input.setPlaceholderText("Email")
-form_layout.addWidget(email_input)
-
-host_input = QLineEdit()
-host_input.setPlaceholderText("Host")
-form_layout.addWidget(host_input)
-
-alias_input = QLineEdit()
-alias_input.setPlaceholderText("Alias/Użytkownik")
-form_layout.addWidget(alias_input)
-
-layout.addLayout(form_layout)
-
-# Przyciski
-button_layout = QHBoxLayout()
-
-generate_button = QPushButton("Generuj klucz")
-generate_button.clicked.connect(lambda: generate_ssh_key(email_input.text(), host_input.text(), alias_input.text()))
-button_layout.addWidget(generate_button)
-
-copy_button = QPushButton("Kopiuj do ~/.ssh")
-copy_button.clicked.connect(copy_key_to_ssh)
-button_layout.addWidget(copy_button)
-
-delete_all_button = QPushButton("Usuń wszystko")
-delete_all_button.clicked.connect(delete_all)
-button_layout.addWidget(delete_all_button)
-
-delete_alias_button = QPushButton("Usuń alias")
-delete_alias_button.clicked.connect(delete_alias)
-button_layout.addWidget(delete_alias_button)
-
-show_config_button = QPushButton("Pokaż config")
-show_config_button.clicked.connect(show_config)
-button_layout.addWidget(show_config_button)
-
-show_keys_json_button = QPushButton("Pokaż keys.json")
-show_keys_json_button.clicked.connect(show_keys_json)
-button_layout.addWidget(show_keys_json_button)
-
-layout.addLayout(button_layout)
-
-# Tabela do wyświetlania kluczy
-table = QTableWidget()
-table.setColumnCount(4)
-table.setHorizontalHeaderLabels(["Nazwa Klucza", "Host", "Alias", "Email"])
-table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-
-layout.addWidget(table)
-
-# Inicjalizacja widoku
-window.setLayout(layout)
-update_table()
-window.show()
+# Główna aplikacja GUI - tylko przy uruchomieniu jako program, nie przy imporcie
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+
+    # Ustawienie czarnego motywu
+    app.setStyleSheet("""
+        QWidget {
+            background-color: #2e2e2e;
+            color: white;
+            font-size: 14px;
+        }
+        QLineEdit, QPushButton, QTableWidget {
+            background-color: #444444;
+            border: 1px solid #888888;
+            color: white;
+        }
+        QPushButton:hover {
+            background-color: #555555;
+        }
+        QTableWidget {
+            color: white;
+            border: 1px solid #888888;
+        }
+        QHeaderView::section {
+            background-color: #333333;
+            color: white;
+            font-weight: bold;
+        }
+    """)
+
+    window = QWidget()
+    window.setWindowTitle("SSH Key Manager")
+    layout = QVBoxLayout()
+
+    # Wprowadzenie danych
+    form_layout = QVBoxLayout()
+
+    email_input = QLineEdit()
+    email_input.setPlaceholderText("Email")
+    form_layout.addWidget(email_input)
+
+    host_input = QLineEdit()
+    host_input.setPlaceholderText("Host")
+    form_layout.addWidget(host_input)
+
+    alias_input = QLineEdit()
+    alias_input.setPlaceholderText("Alias/Użytkownik")
+    form_layout.addWidget(alias_input)
+
+    layout.addLayout(form_layout)
+
+    # Przyciski
+    button_layout = QHBoxLayout()
+
+    generate_button = QPushButton("Generuj klucz")
+    generate_button.clicked.connect(lambda: generate_ssh_key(email_input.text(), host_input.text(), alias_input.text()))
+    button_layout.addWidget(generate_button)
+
+    copy_button = QPushButton("Kopiuj do ~/.ssh")
+    copy_button.clicked.connect(copy_key_to_ssh)
+    button_layout.addWidget(copy_button)
+
+    delete_all_button = QPushButton("Usuń wszystko")
+    delete_all_button.clicked.connect(delete_all)
+    button_layout.addWidget(delete_all_button)
+
+    delete_alias_button = QPushButton("Usuń alias")
+    delete_alias_button.clicked.connect(delete_alias)
+    button_layout.addWidget(delete_alias_button)
+
+    show_config_button = QPushButton("Pokaż config")
+    show_config_button.clicked.connect(show_config)
+    button_layout.addWidget(show_config_button)
+
+    show_keys_json_button = QPushButton("Pokaż keys.json")
+    show_keys_json_button.clicked.connect(show_keys_json)
+    button_layout.addWidget(show_keys_json_button)
+
+    layout.addLayout(button_layout)
+
+    # Tabela do wyświetlania kluczy
+    table = QTableWidget()
+    table.setColumnCount(4)
+    table.setHorizontalHeaderLabels(["Nazwa Klucza", "Host", "Alias", "Email"])
+    table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+
+    layout.addWidget(table)
+
+    # Inicjalizacja widoku
+    window.setLayout(layout)
+    update_table()
+    window.show()
 
-sys.exit(app.exec())
+    sys.exit(app.exec())